@@ -0,0 +1,372 @@
+"""Benchmarks for calling hooks, using the sample backends from the tests.
+
+Run this with ``nox -s benchmark``, or with ``python benchmarks/bench_hooks.py``
+in an environment where pyproject_hooks is installed. It doesn't need network
+access. The results are written as JSON, which can be given to ``--compare``
+in a later run to check for regressions.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from os.path import abspath, dirname
+from os.path import join as pjoin
+from typing import Callable, Dict, List, Tuple
+
+import pyproject_hooks
+from pyproject_hooks import (
+    BuildBackendHookCaller,
+    HookForkServer,
+    HookWorkerPool,
+    quiet_subprocess_runner,
+)
+
+SAMPLES_DIR = pjoin(dirname(dirname(abspath(__file__))), "tests", "samples")
+BUILDSYS_PKGS = pjoin(SAMPLES_DIR, "buildsys_pkgs")
+
+# Sample project -> (build backend, backend path)
+# Hooks are called with empty config_settings, which the sample backends expect.
+SAMPLES = {
+    "pkg1": ("buildsys", None),
+    "pkg2": ("buildsys_minimal", None),
+    "pkg_intree": ("intree_backend", ["backend"]),
+}
+
+# Name -> (function returning measurements, unit, whether higher is better)
+BENCHMARKS: Dict[str, Tuple[Callable[..., List[float]], str, bool]] = {}
+
+
+def benchmark(name, unit="s", higher_is_better=False):
+    """Register a function returning a list of measurements"""
+
+    def decorator(func):
+        BENCHMARKS[name] = (func, unit, higher_is_better)
+        return func
+
+    return decorator
+
+
+def get_hooks(pkg, **kwargs):
+    backend, backend_path = SAMPLES[pkg]
+    return BuildBackendHookCaller(
+        pjoin(SAMPLES_DIR, pkg),
+        backend,
+        backend_path,
+        runner=quiet_subprocess_runner,
+        **kwargs,
+    )
+
+
+def time_calls(call, repeat):
+    """Time *call* several times, giving it a new empty directory each time"""
+    samples = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as td:
+            start = time.perf_counter()
+            call(td)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+HOOK_CALLS = {
+    "get_requires_for_build_wheel": lambda hooks, td: (
+        hooks.get_requires_for_build_wheel({})
+    ),
+    "prepare_metadata_for_build_wheel": lambda hooks, td: (
+        hooks.prepare_metadata_for_build_wheel(td, {})
+    ),
+    "build_wheel": lambda hooks, td: hooks.build_wheel(td, {}),
+    "build_sdist": lambda hooks, td: hooks.build_sdist(td, {}),
+}
+
+
+def _register_latency_benchmarks(hook_name, hook_call):
+    @benchmark(f"cold/{hook_name}")
+    def cold(args):
+        # Each call starts a new subprocess and imports the backend
+        hooks = get_hooks("pkg1")
+        return time_calls(lambda td: hook_call(hooks, td), args.repeat)
+
+    @benchmark(f"fast_start/{hook_name}")
+    def fast_start(args):
+        # Like cold, but the subprocess skips importing site
+        hooks = get_hooks("pkg1", fast_start=True)
+        return time_calls(lambda td: hook_call(hooks, td), args.repeat)
+
+    @benchmark(f"warm/{hook_name}")
+    def warm(args):
+        # The backend is already imported in a persistent worker
+        with get_hooks("pkg1", persistent_worker=True) as hooks:
+            time_calls(lambda td: hook_call(hooks, td), 1)
+            return time_calls(lambda td: hook_call(hooks, td), args.repeat)
+
+    if hasattr(os, "fork"):
+
+        @benchmark(f"fork_server/{hook_name}")
+        def fork_server(args):
+            # Each call runs in a process forked after importing the backend
+            with HookForkServer() as server:
+                hooks = get_hooks("pkg1", fork_server=server)
+                time_calls(lambda td: hook_call(hooks, td), 1)
+                return time_calls(lambda td: hook_call(hooks, td), args.repeat)
+
+
+for _hook_name, _hook_call in HOOK_CALLS.items():
+    _register_latency_benchmarks(_hook_name, _hook_call)
+
+
+def calls_per_second(make_hooks, args):
+    """Call get_requires_for_build_wheel from several threads at once"""
+    calls = args.concurrency * 4
+    callers = [make_hooks() for _ in range(args.concurrency)]
+    samples = []
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            futures = [
+                executor.submit(callers[i % len(callers)].get_requires_for_build_wheel)
+                for i in range(calls)
+            ]
+            for future in futures:
+                future.result()
+            samples.append(calls / (time.perf_counter() - start))
+    return samples
+
+
+@benchmark("throughput/subprocess", unit="calls/s", higher_is_better=True)
+def throughput_subprocess(args):
+    return calls_per_second(lambda: get_hooks("pkg1"), args)
+
+
+@benchmark("throughput/worker_pool", unit="calls/s", higher_is_better=True)
+def throughput_worker_pool(args):
+    with HookWorkerPool(max_workers=args.concurrency) as pool:
+        return calls_per_second(lambda: get_hooks("pkg1", worker_pool=pool), args)
+
+
+def metadata_then_wheel(pkg, args):
+    hooks = get_hooks(pkg)
+
+    def call(td):
+        metadata_dir = pjoin(td, "metadata")
+        wheel_dir = pjoin(td, "wheel")
+        os.mkdir(metadata_dir)
+        os.mkdir(wheel_dir)
+        hooks.prepare_metadata_for_build_wheel(metadata_dir, {})
+        # The pkg1 backend doesn't return the name of the .dist-info folder
+        (distinfo,) = glob(pjoin(metadata_dir, "*.dist-info"))
+        hooks.build_wheel(wheel_dir, {}, distinfo)
+
+    return time_calls(call, args.repeat)
+
+
+@benchmark("metadata_then_wheel/backend_hooks")
+def metadata_then_wheel_backend(args):
+    # The backend has prepare_metadata_for_build_wheel
+    return metadata_then_wheel("pkg1", args)
+
+
+@benchmark("metadata_then_wheel/fallback")
+def metadata_then_wheel_fallback(args):
+    # Metadata comes from building a wheel, which build_wheel then reuses
+    return metadata_then_wheel("pkg2", args)
+
+
+def requires_and_metadata(speculative, args):
+    hooks = get_hooks("pkg2", speculative_metadata=speculative)
+    return time_calls(
+        lambda td: hooks.get_requires_and_metadata_for_build_wheel(
+            td, lambda reqs: True, lambda reqs: None, {}
+        ),
+        args.repeat,
+    )
+
+
+@benchmark("requires_and_metadata/sequential")
+def requires_and_metadata_sequential(args):
+    return requires_and_metadata(False, args)
+
+
+@benchmark("requires_and_metadata/speculative")
+def requires_and_metadata_speculative(args):
+    # Both hooks in one subprocess, as the requirements are already installed
+    return requires_and_metadata(True, args)
+
+
+@benchmark("incremental/unchanged")
+def incremental_unchanged(args):
+    # Checking the manifest for a wheel which was already built
+    hooks = get_hooks("pkg1", incremental=True)
+    with tempfile.TemporaryDirectory() as wheel_dir:
+        hooks.build_wheel(wheel_dir, {})
+        return time_calls(lambda td: hooks.build_wheel(wheel_dir, {}), args.repeat)
+
+
+@benchmark("import/pyproject_hooks")
+def import_package(args):
+    # A new interpreter importing the package, as a frontend does on startup
+    cmd = [sys.executable, "-c", "import pyproject_hooks"]
+    baseline = [sys.executable, "-c", "pass"]
+
+    def timed(argv):
+        start = time.perf_counter()
+        subprocess.check_call(argv)
+        return time.perf_counter() - start
+
+    # Interpreter startup is subtracted as the median of its own runs: taking
+    # it off each sample in turn made the noise of both runs add up.
+    startup = statistics.median(timed(baseline) for _ in range(args.repeat))
+    return [timed(cmd) - startup for _ in range(args.repeat)]
+
+
+@benchmark("backend_path/installed")
+def backend_installed(args):
+    hooks = get_hooks("pkg1")
+    return time_calls(lambda td: hooks.get_requires_for_build_sdist({}), args.repeat)
+
+
+@benchmark("backend_path/in_tree")
+def backend_in_tree(args):
+    hooks = get_hooks("pkg_intree")
+    return time_calls(lambda td: hooks.get_requires_for_build_sdist({}), args.repeat)
+
+
+def summarise(samples):
+    return {
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "min": min(samples),
+        "max": max(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def run(args):
+    results = {}
+    for name, (func, unit, higher_is_better) in BENCHMARKS.items():
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        samples = func(args)
+        results[name] = {
+            "unit": unit,
+            "higher_is_better": higher_is_better,
+            "samples": samples,
+            **summarise(samples),
+        }
+        print(f"{name:45} {format_value(results[name]['median'], unit)}")
+
+    return {
+        "pyproject_hooks_version": pyproject_hooks.__version__,
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.time(),
+        "repeat": args.repeat,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+
+
+def format_value(value, unit):
+    if unit == "s":
+        return f"{value * 1000:10.2f} ms"
+    return f"{value:10.1f} {unit}"
+
+
+def compare(baseline, current, threshold):
+    """Print the change from a baseline, and return the names that got worse
+
+    Positive changes are slower (or fewer calls per second) than the baseline.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["median"]
+        after = result["median"]
+        if result["higher_is_better"]:
+            before, after = -before, -after
+        if before == 0:
+            # No relative change from nothing, so show the absolute one
+            print(f"{name:45} {after:+8.3g} {result['unit']} (baseline 0)")
+            continue
+        change = (after - before) / abs(before)
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:45} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="JSON file to write results to "
+        "(default: benchmarks/results/<version>-<python>.json)",
+    )
+    parser.add_argument(
+        "-n", "--repeat", type=int, default=10, help="measurements per benchmark"
+    )
+    parser.add_argument(
+        "-j",
+        "--concurrency",
+        type=int,
+        default=min(os.cpu_count() or 1, 8),
+        help="threads for the throughput benchmarks",
+    )
+    parser.add_argument(
+        "-k",
+        "--filter",
+        action="append",
+        help="only run benchmarks with this in their name (may be repeated)",
+    )
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative slowdown counted as a regression (default: 0.2)",
+    )
+    args = parser.parse_args(argv)
+
+    # The sample backends are importable from here, like in the tests
+    os.environ["PYTHONPATH"] = BUILDSYS_PKGS
+
+    report = run(args)
+
+    output = args.output
+    if output is None:
+        impl = platform.python_implementation().lower()
+        py_version = "".join(platform.python_version_tuple()[:2])
+        output = pjoin(
+            dirname(abspath(__file__)),
+            "results",
+            f"{pyproject_hooks.__version__}-{impl}{py_version}.json",
+        )
+    os.makedirs(dirname(abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
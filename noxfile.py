@@ -13,6 +13,12 @@ def test(session: nox.Session) -> None:
     session.run("pytest", *session.posargs)
 
 
+@nox.session
+def benchmark(session: nox.Session) -> None:
+    session.install(".")
+    session.run("python", "benchmarks/bench_hooks.py", *session.posargs)
+
+
 @nox.session
 def docs(session: nox.Session) -> None:
     session.install("-e", ".")
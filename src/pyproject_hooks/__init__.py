@@ -1,33 +1,133 @@
 """Wrappers to call pyproject.toml-based build backend hooks.
 """
 
-from typing import TYPE_CHECKING
-
-from ._impl import (
-    BuildBackendWarning,
-    BackendUnavailable,
-    BuildBackendHookCaller,
-    HookMissing,
-    UnsupportedOperation,
-    default_subprocess_runner,
-    quiet_subprocess_runner,
-)
+# Importing typing takes a while, and this is all it's needed for
+TYPE_CHECKING = False
 
 __version__ = "1.2.0"
 __all__ = [
     "BuildBackendWarning",
     "BackendUnavailable",
     "BackendInvalid",
+    "HookFailed",
     "HookMissing",
+    "HookTimeout",
+    "ResourceLimitExceeded",
+    "MemoryAdmission",
+    "HookCallStats",
+    "TraceSpan",
+    "ChromeTraceExporter",
+    "HookWorkerPool",
+    "HookForkServer",
     "UnsupportedOperation",
     "default_subprocess_runner",
     "quiet_subprocess_runner",
+    "StreamingSubprocessRunner",
     "BuildBackendHookCaller",
+    "AsyncBuildBackendHookCaller",
+    "default_async_subprocess_runner",
+    "quiet_async_subprocess_runner",
+    "RequiresCache",
+    "MetadataCache",
+    "WheelCache",
+    "interpreter_abi",
+    "source_tree_fingerprint",
+    "ProjectSpec",
+    "ProjectResult",
+    "build_projects",
 ]
 
-BackendInvalid = BackendUnavailable  # Deprecated alias, previously a separate exception
+# The public names are imported from their modules when they're first used, so
+# that importing the package is quick for tools which may not call any hooks.
+# Name -> (module, name in that module)
+_LAZY_NAMES = {
+    "AsyncBuildBackendHookCaller": ("._async", "AsyncBuildBackendHookCaller"),
+    "default_async_subprocess_runner": (
+        "._async",
+        "default_async_subprocess_runner",
+    ),
+    "quiet_async_subprocess_runner": ("._async", "quiet_async_subprocess_runner"),
+    "MetadataCache": ("._cache", "MetadataCache"),
+    "RequiresCache": ("._cache", "RequiresCache"),
+    "WheelCache": ("._cache", "WheelCache"),
+    "interpreter_abi": ("._cache", "interpreter_abi"),
+    "source_tree_fingerprint": ("._cache", "source_tree_fingerprint"),
+    "BuildBackendWarning": ("._impl", "BuildBackendWarning"),
+    "BackendUnavailable": ("._impl", "BackendUnavailable"),
+    # Deprecated alias, previously a separate exception
+    "BackendInvalid": ("._impl", "BackendUnavailable"),
+    "BuildBackendHookCaller": ("._impl", "BuildBackendHookCaller"),
+    "HookCallStats": ("._impl", "HookCallStats"),
+    "HookFailed": ("._impl", "HookFailed"),
+    "HookMissing": ("._impl", "HookMissing"),
+    "HookTimeout": ("._impl", "HookTimeout"),
+    "ResourceLimitExceeded": ("._impl", "ResourceLimitExceeded"),
+    "StreamingSubprocessRunner": ("._impl", "StreamingSubprocessRunner"),
+    "UnsupportedOperation": ("._impl", "UnsupportedOperation"),
+    "default_subprocess_runner": ("._impl", "default_subprocess_runner"),
+    "quiet_subprocess_runner": ("._impl", "quiet_subprocess_runner"),
+    "MemoryAdmission": ("._limits", "MemoryAdmission"),
+    "ProjectResult": ("._scheduler", "ProjectResult"),
+    "ProjectSpec": ("._scheduler", "ProjectSpec"),
+    "build_projects": ("._scheduler", "build_projects"),
+    "ChromeTraceExporter": ("._trace", "ChromeTraceExporter"),
+    "TraceSpan": ("._trace", "TraceSpan"),
+    "HookForkServer": ("._worker", "HookForkServer"),
+    "HookWorkerPool": ("._worker", "HookWorkerPool"),
+}
+
 
 if TYPE_CHECKING:
-    from ._impl import SubprocessRunner
+    from ._async import (
+        AsyncBuildBackendHookCaller,
+        AsyncSubprocessRunner,
+        default_async_subprocess_runner,
+        quiet_async_subprocess_runner,
+    )
+    from ._cache import (
+        MetadataCache,
+        RequiresCache,
+        WheelCache,
+        interpreter_abi,
+        source_tree_fingerprint,
+    )
+    from ._impl import (
+        BackendUnavailable,
+        BackendUnavailable as BackendInvalid,
+        BuildBackendHookCaller,
+        BuildBackendWarning,
+        HookCallStats,
+        HookFailed,
+        HookMissing,
+        HookTimeout,
+        ResourceLimitExceeded,
+        StreamingSubprocessRunner,
+        SubprocessRunner,
+        UnsupportedOperation,
+        default_subprocess_runner,
+        quiet_subprocess_runner,
+    )
+    from ._limits import MemoryAdmission
+    from ._scheduler import ProjectResult, ProjectSpec, build_projects
+    from ._trace import ChromeTraceExporter, TraceSpan
+    from ._worker import HookForkServer, HookWorkerPool
+
+    __all__ += ["SubprocessRunner", "AsyncSubprocessRunner"]
+
+else:
+    # Type checkers see the imports above instead, so they still catch typos
+    def __getattr__(name):
+        try:
+            module_name, attr = _LAZY_NAMES[name]
+        except KeyError:
+            msg = f"module {__name__!r} has no attribute {name!r}"
+            raise AttributeError(msg) from None
+
+        from importlib import import_module
+
+        value = getattr(import_module(module_name, __name__), attr)
+        globals()[name] = value  # Later lookups don't need __getattr__
+        return value
 
-    __all__ += ["SubprocessRunner"]
+    def __dir__():
+        return sorted(set(globals()) | set(_LAZY_NAMES))
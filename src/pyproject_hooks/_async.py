@@ -0,0 +1,291 @@
+"""An asyncio interface for calling build backend hooks."""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from os.path import abspath
+from os.path import join as pjoin
+from subprocess import PIPE, STDOUT, CalledProcessError
+from typing import TYPE_CHECKING, Any, Iterator, Mapping, Optional, Sequence
+
+from ._impl import (
+    _backend_environ,
+    hook_result,
+    norm_and_check,
+    read_json,
+    write_json,
+)
+from ._in_process import _in_proc_script_path
+
+if TYPE_CHECKING:
+    from typing import Awaitable, Protocol
+
+    class AsyncSubprocessRunner(Protocol):
+        """A protocol for the asynchronous subprocess runner."""
+
+        def __call__(
+            self,
+            cmd: Sequence[str],
+            cwd: Optional[str] = None,
+            extra_environ: Optional[Mapping[str, str]] = None,
+        ) -> Awaitable[None]:
+            ...
+
+
+async def _wait_or_kill(
+    proc: "asyncio.subprocess.Process", waiting: "Awaitable[Any]"
+) -> Any:
+    """Wait for the process, killing it if the task is cancelled, like
+    :func:`subprocess.call` does on an exception.
+
+    The hook caller removes the control files when the task is cancelled, so
+    the backend mustn't be left running.
+    """
+    try:
+        return await waiting
+    except BaseException:
+        proc.kill()
+        await proc.wait()
+        raise
+
+
+async def default_async_subprocess_runner(
+    cmd: Sequence[str],
+    cwd: Optional[str] = None,
+    extra_environ: Optional[Mapping[str, str]] = None,
+) -> None:
+    """The default method of calling the wrapper subprocess from asyncio.
+
+    This uses :func:`asyncio.create_subprocess_exec` under the hood, and raises
+    :exc:`subprocess.CalledProcessError` if the process fails.
+    """
+    env = os.environ.copy()
+    if extra_environ:
+        env.update(extra_environ)
+
+    proc = await asyncio.create_subprocess_exec(*cmd, cwd=cwd, env=env)
+    returncode = await _wait_or_kill(proc, proc.wait())
+    if returncode:
+        raise CalledProcessError(returncode, cmd)
+
+
+async def quiet_async_subprocess_runner(
+    cmd: Sequence[str],
+    cwd: Optional[str] = None,
+    extra_environ: Optional[Mapping[str, str]] = None,
+) -> None:
+    """Call the subprocess from asyncio while suppressing output.
+
+    The output is attached to the :exc:`subprocess.CalledProcessError` raised
+    if the process fails.
+    """
+    env = os.environ.copy()
+    if extra_environ:
+        env.update(extra_environ)
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, cwd=cwd, env=env, stdout=PIPE, stderr=STDOUT
+    )
+    output, _ = await _wait_or_kill(proc, proc.communicate())
+    if proc.returncode:
+        raise CalledProcessError(proc.returncode, cmd, output)
+
+
+class AsyncBuildBackendHookCaller:
+    """A wrapper to call the build backend hooks for a source directory from
+    asyncio code.
+
+    The hook methods are coroutines, but otherwise work like those of
+    :class:`BuildBackendHookCaller`, including the fallbacks.
+    """
+
+    def __init__(
+        self,
+        source_dir: str,
+        build_backend: str,
+        backend_path: Optional[Sequence[str]] = None,
+        runner: Optional["AsyncSubprocessRunner"] = None,
+        python_executable: Optional[str] = None,
+    ) -> None:
+        """
+        :param source_dir: The source directory to invoke the build backend for
+        :param build_backend: The build backend spec
+        :param backend_path: Additional path entries for the build backend spec
+        :param runner: The :ref:`async subprocess runner <Async Subprocess Runners>`
+            to use
+        :param python_executable:
+            The Python executable used to invoke the build backend
+        """
+        if runner is None:
+            runner = default_async_subprocess_runner
+
+        self.source_dir = abspath(source_dir)
+        self.build_backend = build_backend
+        if backend_path:
+            backend_path = [norm_and_check(self.source_dir, p) for p in backend_path]
+        self.backend_path = backend_path
+        self._subprocess_runner = runner
+        if not python_executable:
+            python_executable = sys.executable
+        self.python_executable = python_executable
+
+    @contextmanager
+    def subprocess_runner(self, runner: "AsyncSubprocessRunner") -> Iterator[None]:
+        """A context manager for temporarily overriding the default
+        :ref:`async subprocess runner <Async Subprocess Runners>`.
+        """
+        prev = self._subprocess_runner
+        self._subprocess_runner = runner
+        try:
+            yield
+        finally:
+            self._subprocess_runner = prev
+
+    async def _supported_features(self) -> Sequence[str]:
+        """Return the list of optional features supported by the backend."""
+        return await self._call_hook("_supported_features", {})
+
+    async def get_requires_for_build_wheel(
+        self,
+        config_settings: Optional[Mapping[str, Any]] = None,
+    ) -> Sequence[str]:
+        """See :meth:`BuildBackendHookCaller.get_requires_for_build_wheel`."""
+        return await self._call_hook(
+            "get_requires_for_build_wheel", {"config_settings": config_settings}
+        )
+
+    async def prepare_metadata_for_build_wheel(
+        self,
+        metadata_directory: str,
+        config_settings: Optional[Mapping[str, Any]] = None,
+        _allow_fallback: bool = True,
+    ) -> str:
+        """See :meth:`BuildBackendHookCaller.prepare_metadata_for_build_wheel`."""
+        return await self._call_hook(
+            "prepare_metadata_for_build_wheel",
+            {
+                "metadata_directory": abspath(metadata_directory),
+                "config_settings": config_settings,
+                "_allow_fallback": _allow_fallback,
+            },
+        )
+
+    async def build_wheel(
+        self,
+        wheel_directory: str,
+        config_settings: Optional[Mapping[str, Any]] = None,
+        metadata_directory: Optional[str] = None,
+    ) -> str:
+        """See :meth:`BuildBackendHookCaller.build_wheel`."""
+        if metadata_directory is not None:
+            metadata_directory = abspath(metadata_directory)
+        return await self._call_hook(
+            "build_wheel",
+            {
+                "wheel_directory": abspath(wheel_directory),
+                "config_settings": config_settings,
+                "metadata_directory": metadata_directory,
+            },
+        )
+
+    async def get_requires_for_build_editable(
+        self,
+        config_settings: Optional[Mapping[str, Any]] = None,
+    ) -> Sequence[str]:
+        """See :meth:`BuildBackendHookCaller.get_requires_for_build_editable`."""
+        return await self._call_hook(
+            "get_requires_for_build_editable", {"config_settings": config_settings}
+        )
+
+    async def prepare_metadata_for_build_editable(
+        self,
+        metadata_directory: str,
+        config_settings: Optional[Mapping[str, Any]] = None,
+        _allow_fallback: bool = True,
+    ) -> str:
+        """See :meth:`BuildBackendHookCaller.prepare_metadata_for_build_editable`."""
+        return await self._call_hook(
+            "prepare_metadata_for_build_editable",
+            {
+                "metadata_directory": abspath(metadata_directory),
+                "config_settings": config_settings,
+                "_allow_fallback": _allow_fallback,
+            },
+        )
+
+    async def build_editable(
+        self,
+        wheel_directory: str,
+        config_settings: Optional[Mapping[str, Any]] = None,
+        metadata_directory: Optional[str] = None,
+    ) -> str:
+        """See :meth:`BuildBackendHookCaller.build_editable`."""
+        if metadata_directory is not None:
+            metadata_directory = abspath(metadata_directory)
+        return await self._call_hook(
+            "build_editable",
+            {
+                "wheel_directory": abspath(wheel_directory),
+                "config_settings": config_settings,
+                "metadata_directory": metadata_directory,
+            },
+        )
+
+    async def get_requires_for_build_sdist(
+        self,
+        config_settings: Optional[Mapping[str, Any]] = None,
+    ) -> Sequence[str]:
+        """See :meth:`BuildBackendHookCaller.get_requires_for_build_sdist`."""
+        return await self._call_hook(
+            "get_requires_for_build_sdist", {"config_settings": config_settings}
+        )
+
+    async def build_sdist(
+        self,
+        sdist_directory: str,
+        config_settings: Optional[Mapping[str, Any]] = None,
+    ) -> str:
+        """See :meth:`BuildBackendHookCaller.build_sdist`."""
+        return await self._call_hook(
+            "build_sdist",
+            {
+                "sdist_directory": abspath(sdist_directory),
+                "config_settings": config_settings,
+            },
+        )
+
+    async def _call_hook(self, hook_name: str, kwargs: Mapping[str, Any]) -> Any:
+        extra_environ = _backend_environ(self.build_backend, self.backend_path)
+
+        # The files for the hook's input and output are handled in another
+        # thread, so they don't block the event loop
+        loop = asyncio.get_running_loop()
+        td = await loop.run_in_executor(None, _make_control_dir, kwargs)
+        try:
+            # Run the hook in a subprocess
+            with _in_proc_script_path() as script:
+                python = self.python_executable
+                await self._subprocess_runner(
+                    [python, abspath(str(script)), hook_name, td],
+                    cwd=self.source_dir,
+                    extra_environ=extra_environ,
+                )
+
+            data = await loop.run_in_executor(None, read_json, pjoin(td, "output.json"))
+        finally:
+            await loop.run_in_executor(None, shutil.rmtree, td)
+
+        return hook_result(data, hook_name, self.build_backend, self.backend_path)
+
+
+def _make_control_dir(kwargs: Mapping[str, Any]) -> str:
+    """Make a temporary directory with the input for a hook call."""
+    td = tempfile.mkdtemp()
+    try:
+        write_json({"kwargs": kwargs}, pjoin(td, "input.json"), indent=2)
+    except BaseException:
+        shutil.rmtree(td)
+        raise
+    return td
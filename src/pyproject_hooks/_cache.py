@@ -0,0 +1,664 @@
+"""On-disk caches for the results of build backend hooks.
+
+Entries are keyed by a fingerprint of the source tree, so a cache lookup only
+needs to walk the tree with ``stat`` and read one file, rather than start a
+Python subprocess. Entries are written atomically, so several processes can
+share a cache directory.
+"""
+import errno
+import functools
+import hashlib
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import time
+from os.path import join as pjoin
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+#: Directories left out of source tree fingerprints: version control data and
+#: caches anywhere in the tree, and the usual places at the top of the tree
+#: where build tools write their output. Names starting with ``/`` only match
+#: at the top, so e.g. a ``build`` package in the source code still counts.
+DEFAULT_EXCLUDE = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".svn",
+        "__pycache__",
+        ".mypy_cache",
+        ".pytest_cache",
+        "/.tox",
+        "/.nox",
+        "/.venv",
+        "/.eggs",
+        "/build",
+        "/dist",
+    }
+)
+
+
+def _walk_files(
+    source_dir: str, exclude: Iterable[str]
+) -> Iterable[Tuple[str, os.stat_result]]:
+    """Yield (relative path, stat) for all files in a tree, in a stable order.
+
+    Entries in *exclude* starting with ``/`` are paths from the top of the
+    tree; others are names skipped wherever they are.
+    """
+    names = set()
+    paths = set()
+    for pattern in exclude:
+        if pattern.startswith("/"):
+            paths.add(os.path.normpath(pattern.strip("/")))
+        else:
+            names.add(pattern)
+    stack = [""]
+    while stack:
+        reldir = stack.pop()
+        with os.scandir(pjoin(source_dir, reldir)) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for entry in entries:
+            if entry.name in names or entry.name.endswith(".egg-info"):
+                continue
+            relpath = pjoin(reldir, entry.name) if reldir else entry.name
+            if relpath in paths:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(relpath)
+            else:
+                yield relpath, entry.stat(follow_symlinks=False)
+
+
+def _file_digest(path: str, st: os.stat_result) -> str:
+    if stat.S_ISLNK(st.st_mode):
+        return "link:" + os.readlink(path)
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_tree_fingerprint(
+    source_dir: str,
+    exclude: Iterable[str] = DEFAULT_EXCLUDE,
+    hash_contents: bool = False,
+) -> str:
+    """Get a hash of the paths, sizes and modification times of the files in a
+    source tree.
+
+    Files and directories named in *exclude*, and ``*.egg-info`` directories,
+    are skipped. Entries starting with ``/`` are paths from the top of the
+    source tree, like ``/build``; other entries are skipped at any depth.
+
+    :param hash_contents: Hash the contents of the files instead of their sizes
+        and modification times. This is slower, but gives the same result for
+        copies of a source tree, e.g. checkouts on different machines.
+    """
+    h = hashlib.sha256()
+    for relpath, st in _walk_files(source_dir, exclude):
+        if hash_contents:
+            digest = _file_digest(pjoin(source_dir, relpath), st)
+            h.update(f"{relpath}\0{digest}\0".encode())
+        else:
+            h.update(f"{relpath}\0{st.st_size}\0{st.st_mtime_ns}\0".encode())
+    return h.hexdigest()
+
+
+def _find_executable(python_executable: str) -> str:
+    """Find an interpreter given by path or as a command on PATH, like the
+    subprocess which runs it would.
+
+    :raises FileNotFoundError: if it can't be found.
+    """
+    found = shutil.which(python_executable)
+    if found is None:
+        raise FileNotFoundError(errno.ENOENT, "No such Python", python_executable)
+    return found
+
+
+def interpreter_id(python_executable: str) -> Tuple[str, int, int]:
+    """Identify a Python interpreter by its path, and the file it points to."""
+    path = os.path.abspath(_find_executable(python_executable))
+    st = os.stat(path)
+    return (path, st.st_size, st.st_mtime_ns)
+
+
+_ABI_SCRIPT = """\
+import sys, sysconfig
+print(sys.implementation.cache_tag)
+print(sysconfig.get_config_var("EXT_SUFFIX") or "")
+print(sysconfig.get_platform())
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def interpreter_abi(python_executable: str) -> Tuple[str, ...]:
+    """Describe what the wheels built by an interpreter are compatible with.
+
+    Unlike :func:`interpreter_id`, this is the same for equivalent interpreters
+    on different machines. Other interpreters are asked once per process.
+    """
+    python_executable = _find_executable(python_executable)
+    if os.path.samefile(python_executable, sys.executable):
+        return (
+            sys.implementation.cache_tag or "",
+            sysconfig.get_config_var("EXT_SUFFIX") or "",
+            sysconfig.get_platform(),
+        )
+    out = subprocess.check_output([python_executable, "-c", _ABI_SCRIPT], text=True)
+    return tuple(out.splitlines())
+
+
+def cache_key(**parts: Any) -> str:
+    """Hash JSON-serialisable values into a cache key."""
+    data = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+#: Puts between full scans of a cache directory, which notice entries added by
+#: other processes, and entries past their maximum age.
+_PUTS_PER_SCAN = 100
+
+
+def _tree_size(path: str) -> int:
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_size
+    return sum(
+        os.lstat(pjoin(root, name)).st_size
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+class _CacheDirectory:
+    """Entries stored under ``<directory>/<key[:2]>/<key>``.
+
+    Reading an entry updates its modification time, which is used to evict the
+    least recently used entries. Rather than scan the whole directory on every
+    put, the number and size of the entries are tracked from the last scan, and
+    it is scanned again when they cross a limit, or after ``_PUTS_PER_SCAN``
+    puts.
+    """
+
+    #: Whether keys use file contents, rather than sizes and modification times
+    hash_contents = False
+
+    def __init__(
+        self,
+        directory: str,
+        max_entries: Optional[int] = None,
+        max_size: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        self.directory = os.path.abspath(directory)
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.max_age = max_age
+        # (entries, total size) as of the last scan, plus entries put since
+        self._tracked: Optional[Tuple[int, int]] = None
+        self._puts_since_scan = 0
+
+    def fingerprint(self, source_dir: str) -> str:
+        """Fingerprint a source tree for the keys of this cache."""
+        return source_tree_fingerprint(source_dir, hash_contents=self.hash_contents)
+
+    def _entry_path(self, key: str) -> str:
+        return pjoin(self.directory, key[:2], key)
+
+    def _touch(self, path: str) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # e.g. a read-only shared cache; the entry is still valid
+
+    def _publish_file(self, key: str, data: bytes) -> None:
+        """Atomically write a file entry, replacing any previous one."""
+        parent = pjoin(self.directory, key[:2])
+        os.makedirs(parent, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".tmp-", dir=parent)
+        try:
+            with open(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, self._entry_path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _publish_dir(self, key: str, fill: Callable[[str], None]) -> None:
+        """Atomically create a directory entry, unless it already exists.
+
+        *fill* is called with a temporary directory to put the contents in.
+        """
+        parent = pjoin(self.directory, key[:2])
+        os.makedirs(parent, exist_ok=True)
+        temp_path = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+        try:
+            fill(temp_path)
+            os.rename(temp_path, self._entry_path(key))
+        except OSError:
+            # Most likely another process published the same entry first
+            shutil.rmtree(temp_path, ignore_errors=True)
+            if not os.path.isdir(self._entry_path(key)):
+                raise
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """List (modification time, size, path) of all entries."""
+        entries = []
+        try:
+            subdirs = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        for subdir in subdirs:
+            subdir_path = pjoin(self.directory, subdir)
+            if len(subdir) != 2 or not os.path.isdir(subdir_path):
+                continue
+            for name in os.listdir(subdir_path):
+                path = pjoin(subdir_path, name)
+                if name.startswith(".tmp-"):
+                    _remove_if_stale(path)
+                    continue
+                try:
+                    entries.append((os.lstat(path).st_mtime, _tree_size(path), path))
+                except FileNotFoundError:
+                    pass  # Evicted by another process
+        return entries
+
+    def _remove(self, path: str) -> None:
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                # Move it aside first, so readers never see a partial entry
+                parent, name = os.path.split(path)
+                doomed = pjoin(parent, f".tmp-{name}-{os.getpid()}-{time.time_ns()}")
+                os.replace(path, doomed)
+                shutil.rmtree(doomed, ignore_errors=True)
+            else:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass  # Evicted by another process
+        except OSError:
+            pass  # e.g. in use on Windows; try again next time
+
+    def _over_limits(self, n_entries: int, total_size: int) -> bool:
+        return (self.max_entries is not None and n_entries > self.max_entries) or (
+            self.max_size is not None and total_size > self.max_size
+        )
+
+    def _added(self, key: str) -> None:
+        """Count a newly put entry, and evict old entries if needed."""
+        if self._tracked is not None and self._puts_since_scan < _PUTS_PER_SCAN:
+            try:
+                size = _tree_size(self._entry_path(key))
+            except FileNotFoundError:
+                size = 0  # Evicted by another process
+            n_entries = self._tracked[0] + 1
+            total_size = self._tracked[1] + size
+            if not self._over_limits(n_entries, total_size):
+                self._tracked = (n_entries, total_size)
+                self._puts_since_scan += 1
+                return
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove entries which are too old, then the least recently used
+        entries until the cache is within its limits.
+        """
+        entries = sorted(self._entries())
+        if self.max_age is not None:
+            cutoff = time.time() - self.max_age
+            while entries and entries[0][0] < cutoff:
+                self._remove(entries.pop(0)[2])
+
+        total_size = sum(size for _, size, _ in entries)
+        while entries and self._over_limits(len(entries), total_size):
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total_size -= size
+        self._tracked = (len(entries), total_size)
+        self._puts_since_scan = 0
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        for _, _, path in self._entries():
+            self._remove(path)
+        self._tracked = (0, 0)
+        self._puts_since_scan = 0
+
+
+class RequiresCache(_CacheDirectory):
+    """A cache for the results of the ``get_requires_for_build_*`` hooks.
+
+    Pass this as ``requires_cache`` to :class:`BuildBackendHookCaller`. Results
+    are keyed by a fingerprint of the source tree (see
+    :func:`source_tree_fingerprint`), the hook, the build backend and backend
+    path, the Python executable and the config settings.
+
+    :param directory: Where to store the cache. It is created if needed.
+    :param max_entries: The maximum number of results to keep.
+    :param max_size: The maximum total size of the stored results, in bytes.
+    :param max_age: Remove results not used for this many seconds.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_entries: Optional[int] = 10000,
+        max_size: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        super().__init__(directory, max_entries, max_size, max_age)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Get the stored requirements for a key, or None."""
+        path = self._entry_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                requires = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        self._touch(path)
+        return requires
+
+    def put(self, key: str, requires: Sequence[str]) -> None:
+        """Store the requirements for a key, and evict old entries if needed."""
+        self._publish_file(key, json.dumps(list(requires)).encode("utf-8"))
+        self._added(key)
+
+
+class MetadataCache(_CacheDirectory):
+    """A store for the ``.dist-info`` folders made by the
+    ``prepare_metadata_for_build_*`` hooks.
+
+    Pass this as ``metadata_cache`` to :class:`BuildBackendHookCaller`. On a
+    cache hit, the stored folder is copied to the metadata directory, without
+    running the backend. This is most useful for backends without these hooks,
+    where preparing metadata means building a wheel. The keys are made like
+    those for :class:`RequiresCache`.
+
+    :param directory: Where to store the cache. It is created if needed.
+    :param max_size: The maximum total size of the stored metadata, in bytes.
+    :param max_age: Remove metadata not used for this many seconds.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_size: Optional[int] = 500 * 1024 * 1024,
+        max_age: Optional[float] = None,
+    ) -> None:
+        super().__init__(directory, max_size=max_size, max_age=max_age)
+
+    def get(self, key: str, metadata_directory: str) -> Optional[str]:
+        """Copy the stored ``.dist-info`` folder for a key to
+        *metadata_directory*.
+
+        :returns: The name of the ``.dist-info`` folder, or None if there is no
+            entry for this key.
+        """
+        path = self._entry_path(key)
+        try:
+            (distinfo,) = os.listdir(path)
+            shutil.copytree(
+                pjoin(path, distinfo),
+                pjoin(metadata_directory, distinfo),
+                dirs_exist_ok=True,
+            )
+        except (FileNotFoundError, ValueError):
+            return None  # No entry, or evicted while we were reading it
+        self._touch(path)
+        return distinfo
+
+    def put(self, key: str, metadata_directory: str, distinfo: str) -> None:
+        """Store a ``.dist-info`` folder from *metadata_directory*, and evict
+        old entries if needed.
+        """
+
+        def fill(entry_dir: str) -> None:
+            src = pjoin(metadata_directory, distinfo)
+            shutil.copytree(src, pjoin(entry_dir, distinfo))
+
+        self._publish_dir(key, fill)
+        self._added(key)
+
+
+class WheelCache(_CacheDirectory):
+    """A store for the wheels made by the ``build_wheel`` and ``build_editable``
+    hooks.
+
+    Pass this as ``wheel_cache`` to :class:`BuildBackendHookCaller`. If a
+    matching wheel is stored, it is placed in the wheel directory without
+    running the backend.
+
+    The store is a plain directory, which can be shared by processes on several
+    machines, e.g. on a network filesystem. Wheels are published atomically, so
+    reading needs no locks. The keys use the contents of the source tree, the
+    backend and backend path (relative to the source tree), the config settings,
+    and :func:`interpreter_abi`. Keys for editable wheels also include the
+    location of the source tree.
+
+    :param directory: Where to store the wheels. It is created if needed.
+    :param max_size: The maximum total size of the stored wheels, in bytes.
+        The least recently used wheels are removed first.
+    :param max_age: Remove wheels not used for this many seconds.
+    """
+
+    hash_contents = True
+
+    def __init__(
+        self,
+        directory: str,
+        max_size: Optional[int] = 10 * 1024 * 1024 * 1024,
+        max_age: Optional[float] = None,
+    ) -> None:
+        super().__init__(directory, max_size=max_size, max_age=max_age)
+
+    def get(self, key: str, wheel_directory: str) -> Optional[str]:
+        """Put the stored wheel for a key in *wheel_directory*.
+
+        The wheel is cloned (copy-on-write) if the filesystem supports it,
+        or copied otherwise. It never shares its data with the stored wheel, so
+        a backend overwriting it later can't change the cache.
+
+        :returns: The file name of the wheel, or None if there is no entry for
+            this key.
+        """
+        path = self._entry_path(key)
+        try:
+            (wheel,) = os.listdir(path)
+            _clone_or_copy(pjoin(path, wheel), pjoin(wheel_directory, wheel))
+        except (FileNotFoundError, ValueError):
+            return None  # No entry, or evicted while we were reading it
+        self._touch(path)
+        return wheel
+
+    def put(self, key: str, wheel_directory: str, wheel: str) -> None:
+        """Store a wheel from *wheel_directory*, and evict old entries if needed."""
+
+        def fill(entry_dir: str) -> None:
+            _clone_or_copy(pjoin(wheel_directory, wheel), pjoin(entry_dir, wheel))
+
+        self._publish_dir(key, fill)
+        self._added(key)
+
+
+def _remove_if_stale(temp_path: str) -> None:
+    """Clean up after a process which died while writing to the cache."""
+    try:
+        if os.lstat(temp_path).st_mtime < time.time() - 3600:
+            if os.path.isdir(temp_path):
+                shutil.rmtree(temp_path, ignore_errors=True)
+            else:
+                os.unlink(temp_path)
+    except OSError:
+        pass
+
+
+# ioctl request to share the data blocks of one file with another (Linux)
+_FICLONE = 0x40049409
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """Try to make dst a copy-on-write clone of src. Returns True on success."""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    except OSError:
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def _clone_or_copy(src: str, dst: str) -> None:
+    """Copy a file, cloning it where the filesystem allows.
+
+    Hard links are not used: backends may rewrite a wheel in place (e.g.
+    ``ZipFile(path, "w")``), which would change every linked copy. The copy is
+    made next to *dst* and renamed over it.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst), prefix=".", suffix=".tmp")
+    os.close(fd)
+    try:
+        if not _reflink(src, tmp_path):
+            shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# Files changed this close to the snapshot may change again without their
+# modification time changing, so they are always checked by hashing.
+_RACY_NS = 2 * 10**9
+
+
+def _manifest_path(wheel_directory: str, key: str) -> str:
+    return pjoin(wheel_directory, f".pyproject-hooks-{key[:32]}.manifest.json")
+
+
+def snapshot_source_tree(
+    source_dir: str,
+    previous: Optional[Dict[str, Any]] = None,
+    skip: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Record the size, modification time and hash of each file in a tree.
+
+    Files with the same size and modification time as in a *previous*
+    snapshot keep their hash from it, so only changed files are read. *skip*
+    is a path relative to *source_dir* to leave out, e.g. the wheel directory.
+    """
+    old_files = previous["files"] if previous else {}
+    snapshot_ns = time.time_ns()
+    files = {}
+    for relpath, st in _walk_files(source_dir, DEFAULT_EXCLUDE):
+        if skip and (relpath == skip or relpath.startswith(skip + os.sep)):
+            continue
+        old = old_files.get(relpath)
+        if old and (old[0], old[1]) == (st.st_size, st.st_mtime_ns):
+            digest = old[2]
+        else:
+            digest = _file_digest(pjoin(source_dir, relpath), st)
+        files[relpath] = [st.st_size, st.st_mtime_ns, digest]
+    return {"snapshot_ns": snapshot_ns, "files": files}
+
+
+def _tree_unchanged(
+    source_dir: str, snapshot: Dict[str, Any], skip: Optional[str] = None
+) -> bool:
+    """Check a source tree against a snapshot, hashing only the files whose
+    size or modification time has changed.
+    """
+    files = snapshot["files"]
+    racy_after = snapshot["snapshot_ns"] - _RACY_NS
+    seen = 0
+    for relpath, st in _walk_files(source_dir, DEFAULT_EXCLUDE):
+        if skip and (relpath == skip or relpath.startswith(skip + os.sep)):
+            continue
+        old = files.get(relpath)
+        if old is None:
+            return False
+        seen += 1
+        size, mtime_ns, digest = old
+        if size == st.st_size and mtime_ns == st.st_mtime_ns < racy_after:
+            continue
+        if size != st.st_size:
+            return False
+        if _file_digest(pjoin(source_dir, relpath), st) != digest:
+            return False
+    return seen == len(files)
+
+
+def relative_inside(path: str, directory: str) -> Optional[str]:
+    """Get *path* relative to *directory* if it's inside it, or None."""
+    rel = os.path.relpath(path, directory)
+    if rel == os.curdir or rel.split(os.sep)[0] == os.pardir:
+        return None
+    return rel
+
+
+def read_manifest(key: str, wheel_directory: str) -> Optional[Dict[str, Any]]:
+    """Read the manifest for a key from the wheel directory, if there is one."""
+    try:
+        with open(_manifest_path(wheel_directory, key), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def fresh_wheel(
+    manifest: Dict[str, Any], source_dir: str, wheel_directory: str
+) -> Optional[str]:
+    """Get the wheel recorded in a manifest, if it is still there and the
+    source tree hasn't changed since it was built.
+    """
+    try:
+        st = os.stat(pjoin(wheel_directory, manifest["wheel"]))
+    except (OSError, KeyError):
+        return None
+    # The wheel must be the one which was built, not replaced since
+    if [st.st_size, st.st_mtime_ns] != manifest["wheel_stat"]:
+        return None
+    skip = relative_inside(wheel_directory, source_dir)
+    if not _tree_unchanged(source_dir, manifest["inputs"], skip):
+        return None
+    return manifest["wheel"]
+
+
+def write_manifest(
+    key: str,
+    wheel_directory: str,
+    wheel: str,
+    inputs: Dict[str, Any],
+    **details: Any,
+) -> None:
+    """Record the source tree snapshot a wheel was built from, next to it.
+
+    *details* are stored too, to show what else went into the key.
+    """
+    st = os.stat(pjoin(wheel_directory, wheel))
+    manifest = {
+        "wheel": wheel,
+        "wheel_stat": [st.st_size, st.st_mtime_ns],
+        **details,
+        "inputs": inputs,
+    }
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp-", dir=wheel_directory)
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, _manifest_path(wheel_directory, key))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
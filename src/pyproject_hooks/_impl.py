@@ -1,19 +1,43 @@
 import json
 import os
+import signal
+from collections import deque
 import sys
 import tempfile
-from contextlib import contextmanager
+import threading
+import time
+from contextlib import ExitStack, contextmanager
 from os.path import abspath
 from os.path import join as pjoin
-from subprocess import STDOUT, check_call, check_output
-from typing import TYPE_CHECKING, Any, Iterator, Mapping, Optional, Sequence
+from subprocess import PIPE, STDOUT, CalledProcessError, Popen, check_call, check_output
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 import warnings
 
 from ._in_process import _in_proc_script_path
 
+# The other modules of the package are imported where they're used, so that
+# importing this module is quick for tools which may not use their features
 if TYPE_CHECKING:
     from typing import Protocol
 
+    from ._cache import MetadataCache, RequiresCache, WheelCache, _CacheDirectory
+    from ._limits import MemoryAdmission
+    from ._trace import TraceSpan
+    from ._worker import HookForkServer, HookWorkerPool, _HookWorker
+
     class SubprocessRunner(Protocol):
         """A protocol for the subprocess runner."""
 
@@ -72,10 +96,84 @@ class UnsupportedOperation(Exception):
         self.traceback = traceback
 
 
+class HookFailed(Exception):
+    """Takes the place of a hook's result from
+    :meth:`BuildBackendHookCaller.call_hooks` if the backend raised an
+    unexpected error.
+
+    The ``traceback`` is the backend's traceback, or a description of the
+    failure if the process running the hook died.
+    """
+
+    def __init__(self, hook_name: str, traceback: str) -> None:
+        super().__init__(f"{hook_name} failed")
+        self.hook_name = hook_name
+        self.traceback = traceback
+
+
+class HookTimeout(Exception):
+    """Will be raised if a hook runs for longer than the timeout set on the
+    :class:`BuildBackendHookCaller`. The hook's process has been killed, along
+    with any subprocesses it started. See :ref:`Timeouts`.
+
+    ``elapsed`` is how long the call ran for, in seconds. ``output`` is what
+    the hook had printed, if the subprocess runner captured it, as
+    :func:`quiet_subprocess_runner` does.
+    """
+
+    def __init__(
+        self,
+        hook_name: str,
+        timeout: float,
+        elapsed: float,
+        output: Optional[Any] = None,
+    ) -> None:
+        super().__init__(f"{hook_name} timed out after {elapsed:.1f} seconds")
+        self.hook_name = hook_name
+        self.timeout = timeout
+        self.elapsed = elapsed
+        self.output = output
+
+
+class ResourceLimitExceeded(Exception):
+    """Will be raised if a hook goes over one of the resource limits set on
+    the :class:`BuildBackendHookCaller`. See :ref:`Resource Limits`.
+
+    ``limit`` is the name of the limit, like ``"address_space"``, and ``value``
+    is what it was set to. ``traceback`` is the traceback from the hook, for
+    limits it could report itself; ``output`` is what the hook had printed, if
+    it was killed and the subprocess runner captured it.
+    """
+
+    def __init__(
+        self,
+        hook_name: str,
+        limit: str,
+        value: int,
+        traceback: Optional[str] = None,
+        output: Optional[Any] = None,
+    ) -> None:
+        super().__init__(f"{hook_name} went over the {limit} limit ({value})")
+        self.hook_name = hook_name
+        self.limit = limit
+        self.value = value
+        self.traceback = traceback
+        self.output = output
+
+
+# The signal sent to a process which goes over its CPU time limit
+_SIGXCPU = getattr(signal, "SIGXCPU", 0)
+
+# The return code of a hook process ended by its timeout: the _in_process
+# script kills its process group with SIGKILL, or exits with 1 on Windows
+_DEADLINE_RETURNCODE = -getattr(signal, "SIGKILL", -1)
+
+
 def default_subprocess_runner(
     cmd: Sequence[str],
     cwd: Optional[str] = None,
     extra_environ: Optional[Mapping[str, str]] = None,
+    pass_fds: Sequence[int] = (),
 ) -> None:
     """The default method of calling the wrapper subprocess.
 
@@ -85,13 +183,14 @@ def default_subprocess_runner(
     if extra_environ:
         env.update(extra_environ)
 
-    check_call(cmd, cwd=cwd, env=env)
+    check_call(cmd, cwd=cwd, env=env, pass_fds=pass_fds)
 
 
 def quiet_subprocess_runner(
     cmd: Sequence[str],
     cwd: Optional[str] = None,
     extra_environ: Optional[Mapping[str, str]] = None,
+    pass_fds: Sequence[int] = (),
 ) -> None:
     """Call the subprocess while suppressing output.
 
@@ -101,7 +200,298 @@ def quiet_subprocess_runner(
     if extra_environ:
         env.update(extra_environ)
 
-    check_output(cmd, cwd=cwd, env=env, stderr=STDOUT)
+    check_output(cmd, cwd=cwd, env=env, stderr=STDOUT, pass_fds=pass_fds)
+
+
+class StreamingSubprocessRunner:
+    """A subprocess runner which passes output on line by line, and only keeps
+    the end of it.
+
+    The subprocess's stdout and stderr are read together. Each line is passed
+    to *on_line*, if given, as a string without the line ending; very long
+    lines are passed in several pieces. Only the last *tail_size* bytes are
+    kept. If the subprocess fails, they are attached to the
+    :exc:`subprocess.CalledProcessError` as its ``output``.
+
+    :param on_line: A function to call with each line of output
+    :param tail_size: How many bytes of output to keep, for errors
+    """
+
+    # The most to read at once, so a line without a newline can't use up memory
+    read_size = 8192
+
+    def __init__(
+        self,
+        on_line: Optional[Callable[[str], None]] = None,
+        tail_size: int = 64 * 1024,
+    ) -> None:
+        self.on_line = on_line
+        self.tail_size = tail_size
+
+    def __call__(
+        self,
+        cmd: Sequence[str],
+        cwd: Optional[str] = None,
+        extra_environ: Optional[Mapping[str, str]] = None,
+        pass_fds: Sequence[int] = (),
+    ) -> None:
+        env = os.environ.copy()
+        if extra_environ:
+            env.update(extra_environ)
+
+        tail: "deque[bytes]" = deque()
+        tail_bytes = 0
+        with Popen(
+            cmd, cwd=cwd, env=env, stdout=PIPE, stderr=STDOUT, pass_fds=pass_fds
+        ) as proc:
+            stdout = proc.stdout
+            assert stdout is not None
+            try:
+                for line in iter(lambda: stdout.readline(self.read_size), b""):
+                    tail.append(line)
+                    tail_bytes += len(line)
+                    while tail_bytes - len(tail[0]) >= self.tail_size:
+                        tail_bytes -= len(tail.popleft())
+                    if self.on_line is not None:
+                        self.on_line(line.decode("utf-8", "replace").rstrip("\r\n"))
+            except BaseException:
+                # Like subprocess.call; Ctrl+C may not reach a hook process
+                # with a timeout, as it's in its own process group
+                proc.kill()
+                raise
+
+        if proc.returncode:
+            output = b"".join(tail)[-self.tail_size :]
+            raise CalledProcessError(proc.returncode, cmd, output=output)
+
+
+def _accepts_pass_fds(runner: "SubprocessRunner") -> bool:
+    """Check if a subprocess runner takes the optional pass_fds argument."""
+    if os.name == "nt":
+        return False  # subprocess can't pass file descriptors on Windows
+    import inspect
+
+    try:
+        return "pass_fds" in inspect.signature(runner).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+# Environment variables which change the sys.path the site module sets up
+_SYS_PATH_ENVIRON = (
+    "PYTHONPATH",
+    "PYTHONHOME",
+    "PYTHONPLATLIBDIR",
+    "PYTHONSAFEPATH",
+)
+
+
+# (python_executable, path_environ) -> (site-packages mtimes, site state JSON)
+_site_states: Dict[
+    Tuple[str, Tuple[str, ...]], Tuple[Dict[str, Optional[int]], str]
+] = {}
+
+
+def _dir_mtimes(dirs: Iterable[str]) -> Dict[str, Optional[int]]:
+    mtimes: Dict[str, Optional[int]] = {}
+    for path in dirs:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+def _site_state(python_executable: str, path_environ: Tuple[str, ...]) -> str:
+    """Get what the site module sets up for an interpreter, as a JSON object.
+
+    This is sys.path, and sys.prefix and sys.exec_prefix, which site sets in a
+    virtual environment before Python 3.11. Fast start subprocesses skip
+    importing site, and restore these instead. They're found once for each
+    interpreter and environment, and again when a site-packages directory has
+    changed, e.g. because a package with a .pth file was installed.
+    *path_environ* is the values of the variables in _SYS_PATH_ENVIRON, as
+    part of the cache key.
+    """
+    key = (python_executable, path_environ)
+    cached = _site_states.get(key)
+    if cached is not None and _dir_mtimes(cached[0]) == cached[0]:
+        return cached[1]
+
+    # sys.path[0] is the working directory for -c, or the script directory
+    script = (
+        "import json, site, sys\n"
+        "site_dirs = site.getsitepackages() + [site.getusersitepackages()]\n"
+        "print(json.dumps({'sys_path': sys.path[1:], 'prefix': sys.prefix,"
+        " 'exec_prefix': sys.exec_prefix, 'site_dirs': site_dirs}))\n"
+    )
+    state = json.loads(check_output([python_executable, "-c", script], text=True))
+    # Taken before the state is used, so later changes are always noticed
+    mtimes = _dir_mtimes(state.pop("site_dirs"))
+    state_json = json.dumps(state)
+    _site_states[key] = (mtimes, state_json)
+    return state_json
+
+
+def _read_progress_events(
+    read_fd: int,
+    callback: Callable[[Mapping[str, Any]], None],
+    errors: List[BaseException],
+) -> None:
+    """Pass each JSON object written to the progress pipe to *callback*.
+
+    If the callback fails, the error is stored in *errors*, and the rest of
+    the events are read and ignored, so the subprocess doesn't block.
+    """
+    with open(read_fd, "rb") as f:
+        for line in f:
+            if errors:
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue  # Not JSON; perhaps a partial line
+            if not isinstance(event, dict):
+                continue
+            try:
+                callback(event)
+            except BaseException as e:
+                errors.append(e)
+
+
+class HookCallStats:
+    """Measurements from one hook call, passed to the ``stats_callback`` of a
+    :class:`BuildBackendHookCaller`.
+
+    .. attribute:: hook_name
+
+       The name of the hook that was called.
+
+    .. attribute:: timings
+
+       A dict of the time, in seconds, spent in each phase of the call, in the
+       order they happened. Phases which don't apply to a call are left out.
+
+       - ``script_path``: Finding the script to run in the subprocess.
+       - ``write_input``: Writing the hook arguments for the subprocess.
+       - ``interpreter_startup``: Starting the Python subprocess, until the
+         script gets control.
+       - ``read_input``: Reading the hook arguments in the subprocess.
+       - ``profile_imports``: Profiling the backend import, with
+         ``profile_imports=True``.
+       - ``import_backend``: Importing the build backend.
+       - ``hook``: Running the hook, including any fallback.
+       - ``write_output``: Writing the results, and exiting the subprocess.
+       - ``read_output``: Reading the results from the subprocess.
+       - ``total``: The whole hook call, as seen by the caller.
+
+    .. attribute:: wheel_handoff
+
+       How a wheel built by the metadata fallback was put in the wheel
+       directory (``"hardlink"``, ``"reflink"`` or ``"copy"``), ``"none"`` if
+       it was already there (the metadata was prepared in the wheel
+       directory), or None if no such wheel was reused.
+
+    .. attribute:: import_profile
+
+       With ``profile_imports=True``, a tree of the modules imported with the
+       build backend, as nested dicts (see :ref:`Import Profiling`).
+       Otherwise, or if the backend was already imported, None.
+
+    .. attribute:: resource_usage
+
+       A dict of the resources used by the hook's process and the
+       subprocesses it has waited for, from :func:`resource.getrusage`, or
+       None on Windows (see :ref:`Resource Usage`):
+
+       - ``user_time`` and ``system_time``: CPU time in seconds.
+       - ``max_rss``: The peak resident memory of the process, or of the
+         biggest subprocess, in bytes.
+       - ``block_input`` and ``block_output``: The number of block I/O
+         operations.
+       - ``voluntary_context_switches`` and
+         ``involuntary_context_switches``.
+    """
+
+    def __init__(
+        self,
+        hook_name: str,
+        timings: Mapping[str, float],
+        wheel_handoff: Optional[str] = None,
+        import_profile: Optional[Dict[str, Any]] = None,
+        resource_usage: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.hook_name = hook_name
+        self.timings = timings
+        self.wheel_handoff = wheel_handoff
+        self.import_profile = import_profile
+        self.resource_usage = resource_usage
+
+    def __repr__(self) -> str:
+        return f"<HookCallStats {self.hook_name} {dict(self.timings)}>"
+
+
+def _hook_timings(
+    call_timings: Mapping[str, float],
+    process: Optional[Mapping[str, float]],
+    times: Mapping[str, float],
+) -> Dict[str, float]:
+    """Put together the timings measured in the subprocess and in the caller."""
+    timings = {}
+    for phase in ("script_path", "write_input"):
+        if phase in times:
+            timings[phase] = times[phase]
+    if process and "spawned_at" in times:
+        timings["interpreter_startup"] = process["started_at"] - times["spawned_at"]
+        timings["read_input"] = process["read_input"]
+    timings.update(call_timings)
+    if process and "exited_at" in times:
+        timings["write_output"] = times["exited_at"] - process["output_started_at"]
+    if "read_output" in times:
+        timings["read_output"] = times["read_output"]
+    return timings
+
+
+def hook_result(
+    data: Mapping[str, Any],
+    hook_name: str,
+    build_backend: str,
+    backend_path: Optional[Sequence[str]],
+) -> Any:
+    """Get the return value from the output of a hook call.
+
+    Raise the exception for the hook's failure, if any, and emit the warnings
+    it captured as :class:`BuildBackendWarning`.
+    """
+    if data.get("unsupported"):
+        raise UnsupportedOperation(data.get("traceback", ""))
+    if data.get("no_backend"):
+        raise BackendUnavailable(
+            data.get("traceback", ""),
+            message=data.get("backend_error", ""),
+            backend_name=build_backend,
+            backend_path=backend_path,
+        )
+    if data.get("hook_failed"):
+        raise HookFailed(hook_name, data.get("traceback", ""))
+    if data.get("hook_missing"):
+        raise HookMissing(data.get("missing_hook_name") or hook_name)
+    if data.get("limit_exceeded"):
+        raise ResourceLimitExceeded(
+            hook_name,
+            data["limit_exceeded"]["limit"],
+            data["limit_exceeded"]["value"],
+            traceback=data.get("traceback", ""),
+        )
+
+    for w in data.get("warnings", []):
+        warnings.warn_explicit(
+            message=w["message"],
+            category=BuildBackendWarning,
+            filename=w["filename"],
+            lineno=w["lineno"],
+        )
+    return data["return_val"]
 
 
 def norm_and_check(source_tree: str, requested: str) -> str:
@@ -128,6 +518,35 @@ def norm_and_check(source_tree: str, requested: str) -> str:
     return abs_requested
 
 
+def _backend_environ(
+    build_backend: str, backend_path: Optional[Sequence[str]]
+) -> Dict[str, str]:
+    extra_environ = {
+        "_PYPROJECT_HOOKS_BUILD_BACKEND": build_backend,
+        # Not for the progress channel of an outer hook call, e.g. when pip is
+        # run by a backend; it's set again if this call has its own channel.
+        "PYPROJECT_HOOKS_PROGRESS_FD": "",
+    }
+
+    if backend_path:
+        extra_environ["_PYPROJECT_HOOKS_BACKEND_PATH"] = os.pathsep.join(backend_path)
+
+    return extra_environ
+
+
+def _spans_from_output(data: Mapping[str, Any]) -> List["TraceSpan"]:
+    from ._trace import spans_from_output
+
+    return spans_from_output(data.get("spans", []))
+
+
+def _annotate_cached() -> None:
+    """Mark the current span as answered from a cache, if it's being traced."""
+    from ._trace import annotate_span
+
+    annotate_span(outcome="cached")
+
+
 class BuildBackendHookCaller:
     """A wrapper to call the build backend hooks for a source directory."""
 
@@ -138,6 +557,23 @@ class BuildBackendHookCaller:
         backend_path: Optional[Sequence[str]] = None,
         runner: Optional["SubprocessRunner"] = None,
         python_executable: Optional[str] = None,
+        persistent_worker: bool = False,
+        worker_pool: Optional["HookWorkerPool"] = None,
+        fork_server: Optional["HookForkServer"] = None,
+        pipe_transport: bool = False,
+        requires_cache: Optional["RequiresCache"] = None,
+        metadata_cache: Optional["MetadataCache"] = None,
+        wheel_cache: Optional["WheelCache"] = None,
+        stats_callback: Optional[Callable[[HookCallStats], None]] = None,
+        fast_start: bool = False,
+        profile_imports: bool = False,
+        progress_callback: Optional[Callable[[Mapping[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+        resource_limits: Optional[Mapping[str, int]] = None,
+        admission: Optional["MemoryAdmission"] = None,
+        speculative_metadata: bool = False,
+        incremental: bool = False,
+        trace_exporter: Optional[Callable[["TraceSpan"], None]] = None,
     ) -> None:
         """
         :param source_dir: The source directory to invoke the build backend for
@@ -146,6 +582,64 @@ class BuildBackendHookCaller:
         :param runner: The :ref:`subprocess runner <Subprocess Runners>` to use
         :param python_executable:
             The Python executable used to invoke the build backend
+        :param persistent_worker:
+            Keep one subprocess running to answer all hook calls, instead of
+            starting a new one for each call. See :ref:`Persistent Workers`.
+        :param worker_pool:
+            A :class:`HookWorkerPool` to borrow a worker from for each hook call.
+        :param fork_server:
+            A :class:`HookForkServer` to run each hook call in a process forked
+            from one with the backend already imported. Ignored on platforms
+            without :func:`os.fork`. See :ref:`Fork Server`.
+        :param pipe_transport:
+            Send hook arguments and results through pipes rather than files in
+            a temporary directory, if the subprocess runner can pass file
+            descriptors (see :ref:`Custom Subprocess Runners`).
+        :param requires_cache:
+            A :class:`RequiresCache` to reuse the results of the
+            ``get_requires_for_build_*`` hooks from, for unchanged source trees.
+        :param metadata_cache:
+            A :class:`MetadataCache` to reuse the metadata from the
+            ``prepare_metadata_for_build_*`` hooks from, for unchanged source
+            trees.
+        :param wheel_cache:
+            A :class:`WheelCache` to reuse wheels from, for unchanged source
+            trees, and to store newly built wheels in.
+        :param stats_callback:
+            A function to call with a :class:`HookCallStats` after each hook
+            call which ran the backend.
+        :param fast_start:
+            Start each subprocess without the site module. See
+            :ref:`Fast Start`.
+        :param profile_imports:
+            Record how long each module takes to import when the backend is
+            imported, in the :class:`HookCallStats` for ``stats_callback``.
+            See :ref:`Import Profiling`.
+        :param progress_callback:
+            A function to call with each event the backend reports while a
+            hook is running, from another thread. See :ref:`Progress Events`.
+        :param timeout:
+            The longest time, in seconds, which each hook call may run for,
+            before it is killed and :exc:`HookTimeout` is raised. See
+            :ref:`Timeouts`.
+        :param resource_limits:
+            Limits for each hook call's process, by name: ``address_space``
+            (bytes), ``cpu_time`` (seconds) and ``open_files``. Ignored on
+            Windows. See :ref:`Resource Limits`.
+        :param admission:
+            A :class:`MemoryAdmission` to wait for before starting each hook
+            call. See :ref:`Memory Admission`.
+        :param speculative_metadata:
+            Let :meth:`get_requires_and_metadata_for_build_wheel` prepare the
+            metadata at the same time as getting the build requirements. See
+            :ref:`Speculative Metadata`.
+        :param incremental:
+            Reuse the wheel from the last :meth:`build_wheel` call with the same
+            arguments, if the source tree hasn't changed since. See
+            :ref:`Incremental Builds`.
+        :param trace_exporter:
+            A function to call with a :class:`TraceSpan` after each hook call,
+            such as a :class:`ChromeTraceExporter`. See :ref:`Tracing`.
         """
         if runner is None:
             runner = default_subprocess_runner
@@ -159,6 +653,52 @@ class BuildBackendHookCaller:
         if not python_executable:
             python_executable = sys.executable
         self.python_executable = python_executable
+        self._worker_pool = worker_pool
+        if fork_server is not None:
+            from ._worker import FORK_SERVER_SUPPORTED
+
+            if not FORK_SERVER_SUPPORTED:
+                fork_server = None
+        self._fork_server = fork_server
+        self.pipe_transport = pipe_transport
+        self.requires_cache = requires_cache
+        self.metadata_cache = metadata_cache
+        self.wheel_cache = wheel_cache
+        self.stats_callback = stats_callback
+        self.fast_start = fast_start
+        self.profile_imports = profile_imports
+        self.progress_callback = progress_callback
+        self.timeout = timeout
+        self.resource_limits: Dict[str, int] = {}
+        if resource_limits:
+            from ._limits import check_resource_limits
+
+            self.resource_limits = check_resource_limits(resource_limits)
+        self.admission = admission
+        self.speculative_metadata = speculative_metadata
+        self.incremental = incremental
+        self.trace_exporter = trace_exporter
+        self._worker: Optional["_HookWorker"] = None
+        if persistent_worker and worker_pool is None:
+            from ._worker import _HookWorker
+
+            self._worker = _HookWorker(
+                python_executable, self.source_dir, self._extra_environ()
+            )
+
+    def close(self) -> None:
+        """Stop the persistent worker, if there is one.
+
+        A new worker will be started if more hooks are called afterwards.
+        """
+        if self._worker is not None:
+            self._worker.close()
+
+    def __enter__(self) -> "BuildBackendHookCaller":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
 
     @contextmanager
     def subprocess_runner(self, runner: "SubprocessRunner") -> Iterator[None]:
@@ -180,6 +720,45 @@ class BuildBackendHookCaller:
         finally:
             self._subprocess_runner = prev
 
+    @contextmanager
+    def hook_timeout(self, timeout: Optional[float]) -> Iterator[None]:
+        """A context manager for temporarily overriding the timeout for hook
+        calls.
+
+        :param timeout: The timeout in seconds, or None for no timeout.
+
+        .. code-block:: python
+
+            hook_caller = BuildBackendHookCaller(..., timeout=60)
+            with hook_caller.hook_timeout(30 * 60):
+                hook_caller.build_wheel(...)
+        """
+        prev = self.timeout
+        self.timeout = timeout
+        try:
+            yield
+        finally:
+            self.timeout = prev
+
+    @contextmanager
+    def limit_resources(self, **limits: int) -> Iterator[None]:
+        """A context manager for temporarily changing the resource limits for
+        hook calls. Limits not given keep their current values.
+
+        .. code-block:: python
+
+            with hook_caller.limit_resources(address_space=8 * 1024**3):
+                hook_caller.build_wheel(...)
+        """
+        from ._limits import check_resource_limits
+
+        prev = self.resource_limits
+        self.resource_limits = {**prev, **check_resource_limits(limits)}
+        try:
+            yield
+        finally:
+            self.resource_limits = prev
+
     def _supported_features(self) -> Sequence[str]:
         """Return the list of optional features supported by the backend."""
         return self._call_hook("_supported_features", {})
@@ -253,8 +832,9 @@ class BuildBackendHookCaller:
 
             If the ``build_wheel`` hook was called in the fallback for
             :meth:`prepare_metadata_for_build_wheel`, the build backend would
-            not be invoked. Instead, the previously built wheel will be copied
-            to ``wheel_directory`` and the name of that file will be returned.
+            not be invoked. Instead, the previously built wheel will be placed
+            in ``wheel_directory`` (hard-linked, cloned or copied) and the name
+            of that file will be returned.
         """
         if metadata_directory is not None:
             metadata_directory = abspath(metadata_directory)
@@ -336,8 +916,8 @@ class BuildBackendHookCaller:
             If the ``build_editable`` hook was called in the fallback for
             :meth:`prepare_metadata_for_build_editable`, the build backend
             would not be invoked. Instead, the previously built wheel will be
-            copied to ``wheel_directory`` and the name of that file will be
-            returned.
+            placed in ``wheel_directory`` (hard-linked, cloned or copied) and
+            the name of that file will be returned.
         """
         if metadata_directory is not None:
             metadata_directory = abspath(metadata_directory)
@@ -380,44 +960,762 @@ class BuildBackendHookCaller:
             },
         )
 
+    def _extra_environ(self) -> Dict[str, str]:
+        return _backend_environ(self.build_backend, self.backend_path)
+
+    def _subprocess_command(self) -> Tuple[List[str], Dict[str, str]]:
+        """Get the start of the command to run the _in_process script, and
+        the extra environment variables for it.
+        """
+        extra_environ = self._extra_environ()
+        if self.profile_imports:
+            extra_environ["_PYPROJECT_HOOKS_PROFILE_IMPORTS"] = "1"
+        if self.timeout is not None:
+            extra_environ["_PYPROJECT_HOOKS_TIMEOUT"] = repr(self.timeout)
+        if self.resource_limits:
+            extra_environ["_PYPROJECT_HOOKS_RESOURCE_LIMITS"] = json.dumps(
+                self.resource_limits
+            )
+        if not self.fast_start:
+            return [self.python_executable], extra_environ
+
+        path_environ = tuple(os.environ.get(var, "") for var in _SYS_PATH_ENVIRON)
+        site_state = _site_state(self.python_executable, path_environ)
+        extra_environ["_PYPROJECT_HOOKS_SITE"] = site_state
+        return [self.python_executable, "-S"], extra_environ
+
+    def call_hooks(self, calls: Sequence[Tuple[str, Mapping[str, Any]]]) -> List[Any]:
+        """Call several hooks one after the other, in a single subprocess.
+
+        :param calls:
+            Pairs of a hook method name, like ``"get_requires_for_build_wheel"``,
+            and a dict of keyword arguments for that method.
+        :returns:
+            The return value for each call. If a call raises
+            :exc:`BackendUnavailable`, :exc:`HookMissing` or
+            :exc:`UnsupportedOperation`, that exception object takes the place
+            of its return value, and the following calls still run. If the
+            backend raises any other error, a :exc:`HookFailed` takes its
+            place, so the results of the other calls are not lost.
+
+        .. code-block:: python
+
+            features, requires, metadata = hook_caller.call_hooks([
+                ("_supported_features", {}),
+                ("get_requires_for_build_wheel", {}),
+                ("prepare_metadata_for_build_wheel", {"metadata_directory": md}),
+            ])
+
+        This saves starting Python and importing the backend for every hook.
+        Calls are made through the persistent worker instead, if there is one.
+        The hooks are always called: the ``requires_cache``,
+        ``metadata_cache`` and ``wheel_cache`` are not used, and neither is
+        ``incremental``.
+
+        If the subprocess exits without reporting the results, e.g. because a
+        hook called :func:`sys.exit` or was killed, the error is raised as for
+        a single hook call, and no results are returned.
+
+        The timeout, if one is set, applies to all the calls together in a
+        subprocess, or to each call in a persistent worker. If the calls in a
+        subprocess time out, the ``hook_name`` of the
+        :exc:`HookTimeout` is ``"call_hooks"``.
+
+        With a ``trace_exporter``, all the calls are traced as one span,
+        named ``"call_hooks"``.
+        """
+        with self._traced("call_hooks"):
+            return self._call_hooks_untraced(calls)
+
+    def _call_hooks_untraced(
+        self, calls: Sequence[Tuple[str, Mapping[str, Any]]]
+    ) -> List[Any]:
+        requests = [_hook_request(name, kwargs) for name, kwargs in calls]
+        start = time.perf_counter()
+        times: Dict[str, float] = {}
+        process = None
+        if self._uses_worker():
+            outputs = []
+            for hook_name, kwargs in requests:
+                try:
+                    with self._process_span() as span, self._hook_process(
+                        hook_name
+                    ) as clock:
+                        data = self._call_hook_in_worker(hook_name, kwargs, clock)
+                        if span is not None:
+                            span.children = _spans_from_output(data)
+                except CalledProcessError as e:
+                    # An unexpected error ends the worker; the next call
+                    # starts a new one
+                    data = {"hook_failed": True, "traceback": str(e)}
+                outputs.append(data)
+        else:
+            hook_input = {
+                "calls": [
+                    {"hook_name": hook_name, "kwargs": kwargs}
+                    for hook_name, kwargs in requests
+                ]
+            }
+            with self._process_span() as span, self._hook_process("call_hooks"):
+                batch_output = self._run_in_subprocess("_batch", hook_input, times)
+                outputs = batch_output["results"]
+                if span is not None:
+                    for data in outputs:
+                        span.children += _spans_from_output(data)
+            process = batch_output.get("process")
+        times["total"] = time.perf_counter() - start
+
+        results = []
+        for i, ((hook_name, _), data) in enumerate(zip(requests, outputs)):
+            # Time spent on the batch as a whole is reported with the first call
+            self._report_stats(
+                hook_name,
+                data,
+                process if i == 0 else None,
+                times if i == 0 else {},
+            )
+            try:
+                results.append(
+                    hook_result(data, hook_name, self.build_backend, self.backend_path)
+                )
+            except (
+                BackendUnavailable,
+                HookFailed,
+                HookMissing,
+                UnsupportedOperation,
+            ) as e:
+                results.append(e)
+        return results
+
+    def get_requires_and_metadata_for_build_wheel(
+        self,
+        metadata_directory: str,
+        requires_satisfied: Callable[[List[str]], bool],
+        install_requires: Callable[[List[str]], None],
+        config_settings: Optional[Mapping[str, Any]] = None,
+        _allow_fallback: bool = True,
+    ) -> Tuple[List[str], str]:
+        """Get the build requirements, install them if needed, and prepare the
+        metadata for a wheel.
+
+        :param metadata_directory: The directory to write the metadata to
+        :param requires_satisfied:
+            A function which is given the build requirements, and returns True
+            if they are all installed already
+        :param install_requires:
+            A function to install the build requirements, if they are not
+        :param config_settings: The configuration settings for the build backend
+        :param _allow_fallback:
+            As for :meth:`prepare_metadata_for_build_wheel`
+        :returns: The list from :meth:`get_requires_for_build_wheel`, and the
+                  name returned by :meth:`prepare_metadata_for_build_wheel`.
+
+        With ``speculative_metadata=True``, both hooks are called in one
+        subprocess. The metadata is kept if the requirements were already
+        satisfied, and prepared again after installing them if not.
+        """
+        return self._get_requires_and_metadata(
+            "wheel",
+            abspath(metadata_directory),
+            requires_satisfied,
+            install_requires,
+            config_settings,
+            _allow_fallback,
+        )
+
+    def get_requires_and_metadata_for_build_editable(
+        self,
+        metadata_directory: str,
+        requires_satisfied: Callable[[List[str]], bool],
+        install_requires: Callable[[List[str]], None],
+        config_settings: Optional[Mapping[str, Any]] = None,
+        _allow_fallback: bool = True,
+    ) -> Tuple[List[str], str]:
+        """Like :meth:`get_requires_and_metadata_for_build_wheel`, for an
+        editable wheel.
+
+        :returns: The list from :meth:`get_requires_for_build_editable`, and the
+                  name returned by :meth:`prepare_metadata_for_build_editable`.
+        """
+        return self._get_requires_and_metadata(
+            "editable",
+            abspath(metadata_directory),
+            requires_satisfied,
+            install_requires,
+            config_settings,
+            _allow_fallback,
+        )
+
+    def _get_requires_and_metadata(
+        self,
+        target: str,
+        metadata_directory: str,
+        requires_satisfied: Callable[[List[str]], bool],
+        install_requires: Callable[[List[str]], None],
+        config_settings: Optional[Mapping[str, Any]],
+        allow_fallback: bool,
+    ) -> Tuple[List[str], Any]:
+        get_requires = f"get_requires_for_build_{target}"
+        prepare_metadata = f"prepare_metadata_for_build_{target}"
+
+        requires = None
+        satisfied = False
+        # The caches make the hooks cheap to call one after the other
+        if self.speculative_metadata and not (
+            self.requires_cache or self.metadata_cache
+        ):
+            requires, satisfied, metadata = self._speculate_metadata(
+                get_requires,
+                prepare_metadata,
+                metadata_directory,
+                requires_satisfied,
+                config_settings,
+                allow_fallback,
+            )
+            if requires is not None and metadata is not None:
+                return requires, metadata[0]
+
+        if requires is None:
+            requires = getattr(self, get_requires)(config_settings)
+            satisfied = requires_satisfied(requires)
+        if not satisfied:
+            install_requires(requires)
+        metadata = getattr(self, prepare_metadata)(
+            metadata_directory, config_settings, _allow_fallback=allow_fallback
+        )
+        return requires, metadata
+
+    def _speculate_metadata(
+        self,
+        get_requires: str,
+        prepare_metadata: str,
+        metadata_directory: str,
+        requires_satisfied: Callable[[List[str]], bool],
+        config_settings: Optional[Mapping[str, Any]],
+        allow_fallback: bool,
+    ) -> Tuple[Optional[List[str]], bool, Optional[Tuple[Any]]]:
+        """Get the requirements and metadata together, preparing the metadata
+        in a temporary folder inside metadata_directory.
+
+        Returns the requirements, or None if the subprocess crashed, whether
+        they're satisfied, and the metadata hook's result in a 1-tuple, or None
+        if it must be called again because the requirements weren't installed
+        or it failed.
+        """
+        os.makedirs(metadata_directory, exist_ok=True)
+        with tempfile.TemporaryDirectory(
+            prefix=".speculative-", dir=metadata_directory
+        ) as td:
+            try:
+                requires, metadata = self.call_hooks(
+                    [
+                        (get_requires, {"config_settings": config_settings}),
+                        (
+                            prepare_metadata,
+                            {
+                                "metadata_directory": td,
+                                "config_settings": config_settings,
+                                "_allow_fallback": allow_fallback,
+                            },
+                        ),
+                    ]
+                )
+            except CalledProcessError:
+                # Perhaps the backend needs the requirements
+                return None, False, None
+            if isinstance(requires, HookFailed):
+                return None, False, None
+            if isinstance(requires, Exception):
+                raise requires
+            satisfied = requires_satisfied(requires)
+            if not satisfied or isinstance(metadata, HookFailed):
+                # Call the metadata hook again, once the requirements are
+                # installed, and let it fail then if it's still broken
+                return requires, satisfied, None
+            if isinstance(metadata, Exception):
+                raise metadata
+
+            # Keep the metadata, and any wheel built by the fallback
+            import shutil
+
+            for name in os.listdir(td):
+                dest = pjoin(metadata_directory, name)
+                if os.path.isdir(dest):
+                    shutil.rmtree(dest)
+                os.replace(pjoin(td, name), dest)
+        return requires, True, (metadata,)
+
     def _call_hook(self, hook_name: str, kwargs: Mapping[str, Any]) -> Any:
-        extra_environ = {"_PYPROJECT_HOOKS_BUILD_BACKEND": self.build_backend}
+        with self._traced(hook_name):
+            return self._call_hook_untraced(hook_name, kwargs)
 
+    @contextmanager
+    def _traced(self, name: str) -> Iterator[None]:
+        """Make a trace span for a hook call, if there's a trace_exporter."""
+        if self.trace_exporter is None:
+            yield
+            return
+        from ._trace import root_span
+
+        with root_span(
+            name,
+            self.trace_exporter,
+            build_backend=self.build_backend,
+            source_dir=self.source_dir,
+        ):
+            yield
+
+    def _call_hook_untraced(self, hook_name: str, kwargs: Mapping[str, Any]) -> Any:
+        if not self._can_cache():
+            return self._call_hook_uncached(hook_name, kwargs)
+        if self.requires_cache is not None and hook_name in GET_REQUIRES_HOOKS:
+            return self._call_get_requires_cached(hook_name, kwargs)
+        if self.metadata_cache is not None and hook_name in PREPARE_METADATA_HOOKS:
+            return self._call_prepare_metadata_cached(hook_name, kwargs)
+        if self.incremental and hook_name == "build_wheel":
+            return self._call_build_wheel_incremental(hook_name, kwargs)
+        return self._call_build_wheel_or_hook(hook_name, kwargs)
+
+    def _can_cache(self) -> bool:
+        """Check if there are caches to use, and the interpreter can be found
+        to identify it in cache keys.
+
+        An interpreter which can't be found is left for the hook call to
+        report, as it is without caches.
+        """
+        import shutil
+
+        if (
+            self.requires_cache is None
+            and self.metadata_cache is None
+            and self.wheel_cache is None
+            and not self.incremental
+        ):
+            return False
+        return shutil.which(self.python_executable) is not None
+
+    def _call_build_wheel_or_hook(
+        self, hook_name: str, kwargs: Mapping[str, Any]
+    ) -> Any:
+        if self.wheel_cache is not None and hook_name in BUILD_WHEEL_HOOKS:
+            return self._call_build_wheel_cached(hook_name, kwargs)
+        return self._call_hook_uncached(hook_name, kwargs)
+
+    def _cache_key(self, cache: "_CacheDirectory", hook_name: str, **extra: Any) -> str:
+        from ._cache import cache_key
+
+        backend_path = None
         if self.backend_path:
-            backend_path = os.pathsep.join(self.backend_path)
-            extra_environ["_PYPROJECT_HOOKS_BACKEND_PATH"] = backend_path
+            # Relative, so copies of the source tree can share cache entries
+            backend_path = [
+                os.path.relpath(p, self.source_dir) for p in self.backend_path
+            ]
+        return cache_key(
+            hook_name=hook_name,
+            source_tree=cache.fingerprint(self.source_dir),
+            build_backend=self.build_backend,
+            backend_path=backend_path,
+            **extra,
+        )
+
+    def _call_get_requires_cached(
+        self, hook_name: str, kwargs: Mapping[str, Any]
+    ) -> Any:
+        from ._cache import interpreter_id
+
+        assert self.requires_cache is not None
+        key = self._cache_key(
+            self.requires_cache,
+            hook_name,
+            python=interpreter_id(self.python_executable),
+            config_settings=kwargs["config_settings"],
+        )
+        requires = self.requires_cache.get(key)
+        if requires is None:
+            requires = self._call_hook_uncached(hook_name, kwargs)
+            self.requires_cache.put(key, requires)
+        else:
+            _annotate_cached()
+        return requires
+
+    def _call_prepare_metadata_cached(
+        self, hook_name: str, kwargs: Mapping[str, Any]
+    ) -> Any:
+        from ._cache import interpreter_id
+
+        assert self.metadata_cache is not None
+        key = self._cache_key(
+            self.metadata_cache,
+            hook_name,
+            python=interpreter_id(self.python_executable),
+            config_settings=kwargs["config_settings"],
+            # Without the fallback, a missing hook is an error to report
+            allow_fallback=kwargs["_allow_fallback"],
+        )
+        metadata_directory = kwargs["metadata_directory"]
+        distinfo = self.metadata_cache.get(key, metadata_directory)
+        if distinfo is None:
+            distinfo = self._call_hook_uncached(hook_name, kwargs)
+            self.metadata_cache.put(key, metadata_directory, distinfo)
+        else:
+            _annotate_cached()
+        return distinfo
+
+    def _call_build_wheel_cached(
+        self, hook_name: str, kwargs: Mapping[str, Any]
+    ) -> Any:
+        from ._cache import interpreter_abi
+
+        assert self.wheel_cache is not None
+        key = self._cache_key(
+            self.wheel_cache,
+            hook_name,
+            python=interpreter_abi(self.python_executable),
+            config_settings=kwargs["config_settings"],
+            # Editable wheels point to the source tree
+            source_dir=self.source_dir if hook_name == "build_editable" else None,
+        )
+        wheel_directory = kwargs["wheel_directory"]
+        wheel = self.wheel_cache.get(key, wheel_directory)
+        if wheel is None:
+            wheel = self._call_hook_uncached(hook_name, kwargs)
+            self.wheel_cache.put(key, wheel_directory, wheel)
+        else:
+            _annotate_cached()
+        return wheel
+
+    def _call_build_wheel_incremental(
+        self, hook_name: str, kwargs: Mapping[str, Any]
+    ) -> Any:
+        from ._cache import (
+            cache_key,
+            fresh_wheel,
+            interpreter_id,
+            read_manifest,
+            relative_inside,
+            snapshot_source_tree,
+            write_manifest,
+        )
+
+        wheel_directory = kwargs["wheel_directory"]
+        details = {
+            "source_dir": self.source_dir,
+            "build_backend": self.build_backend,
+            "backend_path": self.backend_path,
+            "python": interpreter_id(self.python_executable),
+            "config_settings": kwargs["config_settings"],
+        }
+        key = cache_key(hook_name=hook_name, **details)
+        manifest = read_manifest(key, wheel_directory)
+        if manifest is not None:
+            wheel = fresh_wheel(manifest, self.source_dir, wheel_directory)
+            if wheel is not None:
+                _annotate_cached()
+                return wheel
+
+        # Snapshot the inputs before the build, so changes made while it runs
+        # are seen next time
+        inputs = snapshot_source_tree(
+            self.source_dir,
+            manifest["inputs"] if manifest else None,
+            skip=relative_inside(wheel_directory, self.source_dir),
+        )
+        wheel = self._call_build_wheel_or_hook(hook_name, kwargs)
+        write_manifest(key, wheel_directory, wheel, inputs, **details)
+        return wheel
+
+    def _call_hook_uncached(self, hook_name: str, kwargs: Mapping[str, Any]) -> Any:
+        start = time.perf_counter()
+        times: Dict[str, float] = {}
+        with self._process_span() as span, self._hook_process(hook_name) as clock:
+            if self._uses_worker():
+                data = self._call_hook_in_worker(hook_name, kwargs, clock)
+            else:
+                data = self._run_in_subprocess(hook_name, {"kwargs": kwargs}, times)
+            if span is not None:
+                span.children = _spans_from_output(data)
+        times["total"] = time.perf_counter() - start
+
+        self._report_stats(hook_name, data, data.get("process"), times)
+        return hook_result(data, hook_name, self.build_backend, self.backend_path)
+
+    def _report_stats(
+        self,
+        hook_name: str,
+        data: Mapping[str, Any],
+        process: Optional[Mapping[str, float]],
+        times: Mapping[str, float],
+    ) -> None:
+        if self.stats_callback is None:
+            return
+        timings = _hook_timings(data.get("timings", {}), process, times)
+        if "total" in times:
+            timings["total"] = times["total"]
+        stats = HookCallStats(
+            hook_name,
+            timings,
+            data.get("wheel_handoff"),
+            data.get("import_profile"),
+            data.get("resource_usage"),
+        )
+        self.stats_callback(stats)
+
+    def _process_span(self) -> ContextManager[Optional["TraceSpan"]]:
+        """Trace the time a hook call spends in its process, including
+        waiting to start it, if the hook call is being traced.
+        """
+        from ._trace import child_span
+
+        return child_span("worker" if self._uses_worker() else "subprocess")
+
+    @contextmanager
+    def _hook_process(self, hook_name: str) -> Iterator[Dict[str, float]]:
+        """Wait for admission to start a hook process, and explain its failure
+        if it was killed for going over a limit.
+
+        The _in_process script kills itself when the timeout runs out, and the
+        OS kills it when it runs out of CPU time, so the subprocess runner
+        reports these like any other failure. A failure is only a timeout if
+        the process was killed that way once the timeout had run out.
+
+        Yields a dict with the ``"start"`` of the hook, as :func:`time.monotonic`
+        time; code which waits for a worker first sets it again once it has one.
+        """
+        with ExitStack() as stack:
+            if self.admission is not None:
+                stack.enter_context(self.admission.admit())
+            timeout = self.timeout
+            cpu_time = self.resource_limits.get("cpu_time")
+            clock = {"start": time.monotonic()}
+            try:
+                yield clock
+            except CalledProcessError as e:
+                elapsed = time.monotonic() - clock["start"]
+                if (
+                    timeout is not None
+                    and elapsed >= timeout
+                    and e.returncode == _DEADLINE_RETURNCODE
+                ):
+                    raise HookTimeout(hook_name, timeout, elapsed, e.output) from e
+                if cpu_time is not None and e.returncode == -_SIGXCPU:
+                    raise ResourceLimitExceeded(
+                        hook_name, "cpu_time", cpu_time, output=e.output
+                    ) from e
+                raise
+
+    def _uses_worker(self) -> bool:
+        """Check if hooks are called in a long-lived process."""
+        return (
+            self._fork_server is not None
+            or self._worker_pool is not None
+            or self._worker is not None
+        )
+
+    def _call_hook_in_worker(
+        self, hook_name: str, kwargs: Mapping[str, Any], clock: Dict[str, float]
+    ) -> Mapping[str, Any]:
+        from ._worker import _worker_key
+
+        key = _worker_key(self.python_executable, self.build_backend, self.backend_path)
+        if self._fork_server is not None:
+            zygote = self._fork_server._zygote(key, self.source_dir)
+            clock["start"] = time.monotonic()
+            return zygote.call(
+                hook_name,
+                kwargs,
+                cwd=self.source_dir,
+                timeout=self.timeout,
+                resource_limits=self.resource_limits,
+            )
+
+        if self._worker_pool is None:
+            assert self._worker is not None
+            return self._worker.call(
+                hook_name,
+                kwargs,
+                timeout=self.timeout,
+                resource_limits=self.resource_limits,
+            )
+
+        pool = self._worker_pool
+        worker = pool._acquire(key, self.source_dir)
+        clock["start"] = time.monotonic()
+        try:
+            return worker.call(
+                hook_name,
+                kwargs,
+                cwd=self.source_dir,
+                timeout=self.timeout,
+                resource_limits=self.resource_limits,
+            )
+        finally:
+            pool._release(worker)
+
+    def _run_in_subprocess(
+        self,
+        hook_name: str,
+        hook_input: Mapping[str, Any],
+        times: Dict[str, float],
+    ) -> Mapping[str, Any]:
+        """Run the _in_process script for a hook, and return its output.
+
+        Timings measured here are stored in *times*.
+        """
+        if self.pipe_transport and _accepts_pass_fds(self._subprocess_runner):
+            return self._run_in_subprocess_with_pipes(hook_name, hook_input, times)
 
         with tempfile.TemporaryDirectory() as td:
-            hook_input = {"kwargs": kwargs}
+            start = time.perf_counter()
             write_json(hook_input, pjoin(td, "input.json"), indent=2)
+            times["write_input"] = time.perf_counter() - start
 
             # Run the hook in a subprocess
+            python, extra_environ = self._subprocess_command()
+            start = time.perf_counter()
             with _in_proc_script_path() as script:
-                python = self.python_executable
-                self._subprocess_runner(
-                    [python, abspath(str(script)), hook_name, td],
-                    cwd=self.source_dir,
-                    extra_environ=extra_environ,
+                times["script_path"] = time.perf_counter() - start
+                times["spawned_at"] = time.time()
+                self._run_script(
+                    [*python, abspath(str(script)), hook_name, td], extra_environ
                 )
+                times["exited_at"] = time.time()
 
+            start = time.perf_counter()
             data = read_json(pjoin(td, "output.json"))
-            if data.get("unsupported"):
-                raise UnsupportedOperation(data.get("traceback", ""))
-            if data.get("no_backend"):
-                raise BackendUnavailable(
-                    data.get("traceback", ""),
-                    message=data.get("backend_error", ""),
-                    backend_name=self.build_backend,
-                    backend_path=self.backend_path,
-                )
-            if data.get("hook_missing"):
-                raise HookMissing(data.get("missing_hook_name") or hook_name)
-
-            for w in data.get("warnings", []):
-                warnings.warn_explicit(
-                    message=w["message"],
-                    category=BuildBackendWarning,
-                    filename=w["filename"],
-                    lineno=w["lineno"],
+            times["read_output"] = time.perf_counter() - start
+            return data
+
+    def _run_script(
+        self,
+        cmd: Sequence[str],
+        extra_environ: Dict[str, str],
+        pass_fds: Sequence[int] = (),
+    ) -> None:
+        """Run the subprocess, with a channel for progress events if wanted."""
+        callback = self.progress_callback
+        if callback is None or not _accepts_pass_fds(self._subprocess_runner):
+            kwargs = {"pass_fds": pass_fds} if pass_fds else {}
+            self._subprocess_runner(
+                cmd, cwd=self.source_dir, extra_environ=extra_environ, **kwargs
+            )
+            return
+
+        read_fd, write_fd = os.pipe()
+        errors: List[BaseException] = []
+        reader = threading.Thread(
+            target=_read_progress_events, args=(read_fd, callback, errors)
+        )
+        reader.start()
+        try:
+            extra_environ["PYPROJECT_HOOKS_PROGRESS_FD"] = str(write_fd)
+            self._subprocess_runner(  # type: ignore[call-arg]
+                cmd,
+                cwd=self.source_dir,
+                extra_environ=extra_environ,
+                pass_fds=(*pass_fds, write_fd),
+            )
+        finally:
+            # The reader stops once the subprocess and we have closed the pipe
+            os.close(write_fd)
+            reader.join()
+        if errors:
+            raise errors[0]
+
+    def _run_in_subprocess_with_pipes(
+        self,
+        hook_name: str,
+        hook_input: Mapping[str, Any],
+        times: Dict[str, float],
+    ) -> Mapping[str, Any]:
+        from ._worker import read_message, write_message
+
+        python, extra_environ = self._subprocess_command()
+        request_r, request_w = os.pipe()
+        response_r, response_w = os.pipe()
+        response = []
+
+        # Use threads, so neither side can block on a full pipe buffer
+        def send() -> None:
+            with open(request_w, "wb") as f:
+                try:
+                    write_message(hook_input, f)
+                except BrokenPipeError:
+                    pass  # The subprocess failed; the runner will report it
+
+        def receive() -> None:
+            with open(response_r, "rb") as f:
+                response.append(read_message(f))
+
+        threads = [threading.Thread(target=send), threading.Thread(target=receive)]
+        for thread in threads:
+            thread.start()
+        try:
+            start = time.perf_counter()
+            with _in_proc_script_path() as script:
+                times["script_path"] = time.perf_counter() - start
+                control = f"fd:{request_r},{response_w}"
+                times["spawned_at"] = time.time()
+                self._run_script(
+                    [*python, abspath(str(script)), hook_name, control],
+                    extra_environ,
+                    pass_fds=(request_r, response_w),
                 )
-            return data["return_val"]
+                times["exited_at"] = time.time()
+        finally:
+            # Once our copies are closed, the threads see the pipes are broken
+            os.close(request_r)
+            os.close(response_w)
+            for thread in threads:
+                thread.join()
+
+        if response[0] is None:
+            raise RuntimeError("The hook subprocess exited without a response")
+        return response[0]
+
+
+HOOK_NAMES = {
+    "get_requires_for_build_wheel",
+    "prepare_metadata_for_build_wheel",
+    "build_wheel",
+    "get_requires_for_build_editable",
+    "prepare_metadata_for_build_editable",
+    "build_editable",
+    "get_requires_for_build_sdist",
+    "build_sdist",
+    "_supported_features",
+}
+
+
+GET_REQUIRES_HOOKS = {
+    "get_requires_for_build_wheel",
+    "get_requires_for_build_editable",
+    "get_requires_for_build_sdist",
+}
+
+
+PREPARE_METADATA_HOOKS = {
+    "prepare_metadata_for_build_wheel",
+    "prepare_metadata_for_build_editable",
+}
+
+
+BUILD_WHEEL_HOOKS = {"build_wheel", "build_editable"}
+
+
+class _HookRequest:
+    """Stands in for a hook caller, to capture what a hook method would send."""
+
+    def _call_hook(
+        self, hook_name: str, kwargs: Mapping[str, Any]
+    ) -> Tuple[str, Mapping[str, Any]]:
+        return hook_name, kwargs
+
+
+def _hook_request(
+    name: str, kwargs: Mapping[str, Any]
+) -> Tuple[str, Mapping[str, Any]]:
+    """Get the hook name and normalised arguments for a call to a hook method."""
+    if name not in HOOK_NAMES:
+        raise ValueError(f"Unknown hook: {name}")
+    method = getattr(BuildBackendHookCaller, name)
+    return method(_HookRequest(), **kwargs)
@@ -4,18 +4,14 @@ The subpackage should stay as empty as possible to avoid shadowing modules that
 the backend might import.
 """
 
-import importlib.resources as resources
 
-try:
-    resources.files
-except AttributeError:
-    # Python 3.8 compatibility
-    def _in_proc_script_path():
-        return resources.path(__package__, "_in_process.py")
-
-else:
+def _in_proc_script_path():
+    # Imported here, so importing pyproject_hooks doesn't import it
+    import importlib.resources as resources
 
-    def _in_proc_script_path():
-        return resources.as_file(
-            resources.files(__package__).joinpath("_in_process.py")
-        )
+    try:
+        files = resources.files
+    except AttributeError:
+        # Python 3.8 compatibility
+        return resources.path(__package__, "_in_process.py")
+    return resources.as_file(files(__package__).joinpath("_in_process.py"))
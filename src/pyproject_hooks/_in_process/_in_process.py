@@ -10,21 +10,60 @@ It expects:
 
 Results:
 - control_dir/output.json
-  - {"return_val": ...}
+  - {"return_val": ..., "timings": {...}, "spans": [...], "process": {...}}
+
+control_dir may also be given as fd:R,W, where R and W are file descriptors
+inherited from the parent. The input is then read from R, and the output written
+to W, as length-prefixed JSON messages (see below).
+
+With the hook_name _batch, several hooks are called one after the other:
+- control_dir/input.json:
+  - {"calls": [{"hook_name": ..., "kwargs": {...}}, ...]}
+- control_dir/output.json
+  - {"results": [{"return_val": ...}, ...]}
+  A hook which raises an unexpected error has {"hook_failed": true,
+  "traceback": ...} in place of its result, and the following hooks still run.
+
+With the single command line arg --import-backend, it only imports the backend.
+This is used to profile the import with -X importtime.
+
+If _PYPROJECT_HOOKS_TIMEOUT is set to a number of seconds, the process (and
+any subprocesses the backend started) is killed if it runs for longer.
+
+If _PYPROJECT_HOOKS_RESOURCE_LIMITS is set to a JSON object, like
+{"address_space": 4294967296}, those limits are set with setrlimit before the
+backend is imported. If a hook goes over a limit, the output has
+"limit_exceeded": {"limit": ..., "value": ...}, where that can be detected.
+
+If PYPROJECT_HOOKS_PROGRESS_FD is set, the backend can write events to that
+file descriptor while a hook runs, each as a JSON object on one line. Warnings
+are also sent there as they happen: {"type": "warning", "message": ...}
+
+Alternatively, with the single command line arg --worker, it keeps running and
+answers hook calls until stdin is closed. Each request on stdin and each
+response on stdout is a JSON message prefixed by its length (4 bytes, big
+endian):
+- request: {"hook_name": ..., "kwargs": {...}, "cwd": ..., "timeout": ...,
+             "resource_limits": {...}}
+- response: the same object that would be written to output.json
+
+With the args --fork-server socket_path, it imports the backend once, and
+forks a new process to answer each hook call sent to the Unix socket at
+socket_path. The messages are the same as for --worker.
 """
+import errno
 import json
 import os
 import os.path
-import re
-import shutil
 import sys
-import traceback
-from glob import glob
+import time
 from importlib import import_module
-from importlib.machinery import PathFinder
 from os.path import join as pjoin
 import warnings
 
+# Other modules are imported where they're needed, so that simple hook calls
+# don't pay for importing them.
+
 # This file is run as a script, and `import wrappers` is not zip-safe, so we
 # include write_json() and read_json() from wrappers.py.
 
@@ -39,6 +78,25 @@ def read_json(path):
         return json.load(f)
 
 
+def write_message(obj, stream):
+    data = json.dumps(obj).encode("utf-8")
+    import struct
+
+    stream.write(struct.pack(">I", len(data)) + data)
+    stream.flush()
+
+
+def read_message(stream):
+    """Read one length-prefixed JSON message, or return None at EOF."""
+    header = stream.read(4)
+    if len(header) < 4:
+        return None
+    import struct
+
+    (length,) = struct.unpack(">I", header)
+    return json.loads(stream.read(length).decode("utf-8"))
+
+
 class BackendUnavailable(Exception):
     """Raised if we cannot import the backend"""
 
@@ -56,8 +114,37 @@ class HookMissing(Exception):
         self.hook_name = hook_name
 
 
+_backend = None
+# Set from _PYPROJECT_HOOKS_PROFILE_IMPORTS by main()
+_profile_imports = False
+
+
 def _build_backend():
-    """Find and load the build backend"""
+    """Find and load the build backend
+
+    The result is cached, so that a worker answering several hook calls only
+    imports the backend once.
+    """
+    global _backend
+    if _backend is None:
+        if _profile_imports:
+            start = time.perf_counter()
+            with _Span("profile_imports"):
+                _call_info["import_profile"] = _profile_backend_import()
+            timings = _call_info.setdefault("timings", {})
+            timings["profile_imports"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            with _Span("import_backend"):
+                _backend = _load_backend()
+        finally:
+            timings = _call_info.setdefault("timings", {})
+            timings["import_backend"] = time.perf_counter() - start
+    return _backend
+
+
+def _load_backend():
     backend_path = os.environ.get("_PYPROJECT_HOOKS_BACKEND_PATH")
     ep = os.environ["_PYPROJECT_HOOKS_BUILD_BACKEND"]
     mod_path, _, obj_path = ep.partition(":")
@@ -70,6 +157,8 @@ def _build_backend():
     try:
         obj = import_module(mod_path)
     except ImportError:
+        import traceback
+
         msg = f"Cannot import {mod_path!r}"
         raise BackendUnavailable(msg, traceback.format_exc())
 
@@ -79,6 +168,87 @@ def _build_backend():
     return obj
 
 
+# Printed to stderr around the backend import being profiled
+_IMPORT_PROFILE_START = "pyproject_hooks: importing backend"
+_IMPORT_PROFILE_END = "pyproject_hooks: imported backend in (us):"
+
+
+def _profile_backend_import():
+    """Import the backend in another interpreter, started with -X importtime.
+
+    Returns a tree of the modules imported for the backend, parsed from the
+    report on stderr, with the backend module at the root. Other output on
+    stderr is passed through.
+
+    -X importtime doesn't report modules loaded with importlib.import_module,
+    so the time for the backend module itself is measured separately.
+    """
+    import subprocess
+
+    flags = ["-X", "importtime"]
+    if sys.flags.no_user_site:
+        flags.append("-s")
+    if sys.flags.no_site:
+        flags.append("-S")
+    cmd = [sys.executable, *flags, os.path.abspath(__file__), "--import-backend"]
+    proc = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
+
+    lines = proc.stderr.splitlines()
+    if _IMPORT_PROFILE_START in lines:
+        lines = lines[lines.index(_IMPORT_PROFILE_START) + 1 :]
+    cumulative = None
+    for line in lines:
+        if line.startswith(_IMPORT_PROFILE_END):
+            cumulative = int(line[len(_IMPORT_PROFILE_END) :]) / 1e6
+        elif not line.startswith("import time:"):
+            print(line, file=sys.stderr)
+
+    children = _parse_import_times(lines)
+    children_time = sum(child["cumulative"] for child in children)
+    if cumulative is None:  # The import failed
+        cumulative = children_time
+    return {
+        "module": os.environ["_PYPROJECT_HOOKS_BUILD_BACKEND"].partition(":")[0],
+        "self": max(cumulative - children_time, 0),
+        "cumulative": cumulative,
+        "children": children,
+    }
+
+
+def _parse_import_times(lines):
+    """Turn -X importtime lines into a tree of nested dicts, times in seconds.
+
+    Each module is printed after the modules it imported, indented by 2 more
+    spaces than it.
+    """
+    stack = []
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # The header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        node = {
+            "module": name.strip(),
+            "self": int(self_us) / 1e6,
+            "cumulative": int(cumulative_us) / 1e6,
+            "children": [],
+            "depth": depth,
+        }
+        while stack and stack[-1]["depth"] > depth:
+            node["children"].insert(0, stack.pop())
+        stack.append(node)
+
+    def strip_depth(node):
+        del node["depth"]
+        for child in node["children"]:
+            strip_depth(child)
+        return node
+
+    return [strip_depth(node) for node in stack]
+
+
 class _BackendPathFinder:
     """Implements the MetaPathFinder interface to locate modules in ``backend-path``.
 
@@ -97,6 +267,8 @@ class _BackendPathFinder:
             # Rely on importlib to find nested modules based on parent's path
             return None
 
+        from importlib.machinery import PathFinder
+
         # Ignore other items in _path or sys.path and use backend_path instead:
         spec = PathFinder.find_spec(fullname, path=self.backend_path)
         if spec is None and fullname == self.backend_parent:
@@ -176,7 +348,8 @@ def prepare_metadata_for_build_wheel(
         return hook(metadata_directory, config_settings)
     # fallback to build_wheel outside the try block to avoid exception chaining
     # which can be confusing to users and is not relevant
-    whl_basename = backend.build_wheel(metadata_directory, config_settings)
+    with _Span("build_wheel", fallback=True):
+        whl_basename = backend.build_wheel(metadata_directory, config_settings)
     return _get_wheel_metadata_from_wheel(
         whl_basename, metadata_directory, config_settings
     )
@@ -202,7 +375,8 @@ def prepare_metadata_for_build_editable(
         except AttributeError:
             raise HookMissing(hook_name="build_editable")
         else:
-            whl_basename = build_hook(metadata_directory, config_settings)
+            with _Span("build_editable", fallback=True):
+                whl_basename = build_hook(metadata_directory, config_settings)
             return _get_wheel_metadata_from_wheel(
                 whl_basename, metadata_directory, config_settings
             )
@@ -213,18 +387,47 @@ def prepare_metadata_for_build_editable(
 WHEEL_BUILT_MARKER = "PYPROJECT_HOOKS_ALREADY_BUILT_WHEEL"
 
 
-def _dist_info_files(whl_zip):
-    """Identify the .dist-info folder inside a wheel ZipFile."""
-    res = []
+def _dist_info_dir(whl_zip, whl_basename):
+    """Identify the .dist-info folder inside a wheel ZipFile.
+
+    The folder is normally named after the first two parts of the wheel's file
+    name, so look there before scanning all the files in the wheel.
+    """
+    name_parts = whl_basename.split("-")
+    if len(name_parts) >= 5:
+        dist_info = "{}-{}.dist-info/".format(*name_parts[:2])
+        try:
+            whl_zip.getinfo(dist_info + "METADATA")
+        except KeyError:
+            pass
+        else:
+            return dist_info
+
+    import re
+
     for path in whl_zip.namelist():
         m = re.match(r"[^/\\]+-[^/\\]+\.dist-info/", path)
         if m:
-            res.append(path)
-    if res:
-        return res
+            return m.group(0)
     raise Exception("No .dist-info folder found in wheel")
 
 
+def _extract_dist_info(whl_zip, dist_info, metadata_directory):
+    """Extract the files in the .dist-info folder, streaming each one to disk."""
+    import shutil
+
+    for info in whl_zip.infolist():
+        if not info.filename.startswith(dist_info) or info.is_dir():
+            continue
+        parts = info.filename.split("/")
+        if ".." in parts or "\\" in info.filename:
+            raise Exception("Unsafe path in wheel: %s" % info.filename)
+        dest = os.path.join(metadata_directory, *parts)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with whl_zip.open(info) as src, open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+
+
 def _get_wheel_metadata_from_wheel(whl_basename, metadata_directory, config_settings):
     """Extract the metadata from a wheel.
 
@@ -233,14 +436,15 @@ def _get_wheel_metadata_from_wheel(whl_basename, metadata_directory, config_sett
     """
     from zipfile import ZipFile
 
-    with open(os.path.join(metadata_directory, WHEEL_BUILT_MARKER), "wb"):
-        pass  # Touch marker file
+    with _Span("_get_wheel_metadata_from_wheel"):
+        with open(os.path.join(metadata_directory, WHEEL_BUILT_MARKER), "wb"):
+            pass  # Touch marker file
 
-    whl_file = os.path.join(metadata_directory, whl_basename)
-    with ZipFile(whl_file) as zipf:
-        dist_info = _dist_info_files(zipf)
-        zipf.extractall(path=metadata_directory, members=dist_info)
-    return dist_info[0].split("/")[0]
+        whl_file = os.path.join(metadata_directory, whl_basename)
+        with ZipFile(whl_file) as zipf:
+            dist_info = _dist_info_dir(zipf, whl_basename)
+            _extract_dist_info(zipf, dist_info, metadata_directory)
+    return dist_info.rstrip("/")
 
 
 def _find_already_built_wheel(metadata_directory):
@@ -251,6 +455,8 @@ def _find_already_built_wheel(metadata_directory):
     if not os.path.isfile(pjoin(metadata_parent, WHEEL_BUILT_MARKER)):
         return None
 
+    from glob import glob
+
     whl_files = glob(os.path.join(metadata_parent, "*.whl"))
     if not whl_files:
         print("Found wheel built marker, but no .whl files")
@@ -266,17 +472,71 @@ def _find_already_built_wheel(metadata_directory):
     return whl_files[0]
 
 
+# ioctl request to share the data blocks of one file with another (Linux)
+FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    """Try to make dst a copy-on-write clone of src. Returns True on success."""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    import shutil
+
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        if os.path.exists(dst):
+            os.unlink(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def _hand_over_prebuilt_wheel(prebuilt_whl, wheel_directory):
+    """Put the wheel built by the metadata fallback in wheel_directory.
+
+    Wheels can be big, so this tries to avoid copying the data: first with a
+    hard link, then with a copy-on-write clone (e.g. on btrfs or XFS). The
+    strategy used is reported to the parent as wheel_handoff, without printing
+    anything, so quiet subprocess runners stay quiet.
+    """
+    import shutil
+
+    whl_basename = os.path.basename(prebuilt_whl)
+    dst = os.path.join(wheel_directory, whl_basename)
+    if os.path.exists(dst):
+        if os.path.samefile(prebuilt_whl, dst):
+            _call_info["wheel_handoff"] = "none"
+            return whl_basename
+        os.unlink(dst)
+
+    try:
+        os.link(prebuilt_whl, dst)
+        strategy = "hardlink"
+    except OSError:
+        if _reflink(prebuilt_whl, dst):
+            strategy = "reflink"
+        else:
+            shutil.copy2(prebuilt_whl, dst)
+            strategy = "copy"
+
+    _call_info["wheel_handoff"] = strategy
+    return whl_basename
+
+
 def build_wheel(wheel_directory, config_settings, metadata_directory=None):
     """Invoke the mandatory build_wheel hook.
 
     If a wheel was already built in the
     prepare_metadata_for_build_wheel fallback, this
-    will copy it rather than rebuilding the wheel.
+    will reuse it rather than rebuilding the wheel.
     """
     prebuilt_whl = _find_already_built_wheel(metadata_directory)
     if prebuilt_whl:
-        shutil.copy2(prebuilt_whl, wheel_directory)
-        return os.path.basename(prebuilt_whl)
+        with _Span("_hand_over_prebuilt_wheel"):
+            return _hand_over_prebuilt_wheel(prebuilt_whl, wheel_directory)
 
     return _build_backend().build_wheel(
         wheel_directory, config_settings, metadata_directory
@@ -288,7 +548,7 @@ def build_editable(wheel_directory, config_settings, metadata_directory=None):
 
     If a wheel was already built in the
     prepare_metadata_for_build_editable fallback, this
-    will copy it rather than rebuilding the wheel.
+    will reuse it rather than rebuilding the wheel.
     """
     backend = _build_backend()
     try:
@@ -298,8 +558,8 @@ def build_editable(wheel_directory, config_settings, metadata_directory=None):
     else:
         prebuilt_whl = _find_already_built_wheel(metadata_directory)
         if prebuilt_whl:
-            shutil.copy2(prebuilt_whl, wheel_directory)
-            return os.path.basename(prebuilt_whl)
+            with _Span("_hand_over_prebuilt_wheel"):
+                return _hand_over_prebuilt_wheel(prebuilt_whl, wheel_directory)
 
         return hook(wheel_directory, config_settings, metadata_directory)
 
@@ -335,6 +595,8 @@ def build_sdist(sdist_directory, config_settings):
     try:
         return backend.build_sdist(sdist_directory, config_settings)
     except getattr(backend, "UnsupportedOperation", _DummyException):
+        import traceback
+
         raise GotUnsupportedOperation(traceback.format_exc())
 
 
@@ -351,28 +613,63 @@ HOOK_NAMES = {
 }
 
 
-def main():
-    if len(sys.argv) < 3:
-        sys.exit("Needs args: hook_name, control_dir")
-    hook_name = sys.argv[1]
-    control_dir = sys.argv[2]
-    if hook_name not in HOOK_NAMES:
-        sys.exit("Unknown hook: %s" % hook_name)
-
+def _remove_script_dir_from_path():
     # Remove the parent directory from sys.path to avoid polluting the backend
     # import namespace with this directory.
     here = os.path.dirname(__file__)
     if here in sys.path:
         sys.path.remove(here)
 
-    hook = globals()[hook_name]
 
-    hook_input = read_json(pjoin(control_dir, "input.json"))
+# Extra details about the current hook call, added to output.json
+_call_info = {}  # type: dict
+
+# The spans which have been entered and not yet exited, innermost last
+_open_spans = []  # type: list
+
+
+class _Span:
+    """Time a step of the current hook call, for tracing.
+
+    Each span is a dict, with the wall clock time it started, its duration,
+    any args, and the spans started inside it. Spans which aren't inside
+    another one are put in _call_info["spans"].
+    """
+
+    def __init__(self, name, **args):
+        self.span = {"name": name, "start": 0.0, "duration": 0.0, "args": args}
+
+    def __enter__(self):
+        if _open_spans:
+            siblings = _open_spans[-1].setdefault("children", [])
+        else:
+            siblings = _call_info.setdefault("spans", [])
+        siblings.append(self.span)
+        _open_spans.append(self.span)
+        self.span["start"] = time.time()
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.span["duration"] = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.span["args"]["error"] = exc_type.__name__
+        _open_spans.pop()
+
+
+def _call_hook(hook_name, hook_input):
+    """Call a hook and return the data for output.json"""
+    hook = globals()[hook_name]
+    _call_info.clear()
+    timings = _call_info["timings"] = {}
+    start = time.perf_counter()
 
     with warnings.catch_warnings(record=True) as captured_warnings:
+        if _progress is not None:
+            warnings.showwarning = _warning_forwarder(captured_warnings)
         json_out = {"unsupported": False, "return_val": None}
         try:
-            json_out["return_val"] = hook(**hook_input["kwargs"])
+            with _Span(hook_name):
+                json_out["return_val"] = hook(**hook_input["kwargs"])
         except BackendUnavailable as e:
             json_out["no_backend"] = True
             json_out["traceback"] = e.traceback
@@ -383,17 +680,537 @@ def main():
         except HookMissing as e:
             json_out["hook_missing"] = True
             json_out["missing_hook_name"] = e.hook_name or hook_name
+        except MemoryError:
+            if "address_space" not in _resource_limits:
+                raise
+            _limit_exceeded(json_out, "address_space")
+        except OSError as e:
+            if e.errno != errno.EMFILE or "open_files" not in _resource_limits:
+                raise
+            _limit_exceeded(json_out, "open_files")
+
+    # Time spent importing the backend is reported separately
+    elapsed = time.perf_counter() - start
+    timings["hook"] = (
+        elapsed - timings.get("profile_imports", 0) - timings.get("import_backend", 0)
+    )
+    json_out["warnings"] = _format_warnings(captured_warnings)
+    json_out["resource_usage"] = _resource_usage_since_last_call()
+    json_out.update(_call_info)
+    return json_out
 
-    json_out["warnings"] = [
-        {
-            "message": str(w.message),
-            "filename": w.filename,
-            "lineno": w.lineno,
-        }
+
+def _call_batched_hook(hook_name, hook_input):
+    """Call a hook in a _batch, reporting an unexpected error in its output
+    instead of ending the process, so the other hooks' results are kept.
+    """
+    try:
+        return _call_hook(hook_name, hook_input)
+    except Exception:
+        import traceback
+
+        tb = traceback.format_exc()
+        print(tb, file=sys.stderr)
+        json_out = {"hook_failed": True, "traceback": tb, "warnings": []}
+        json_out.update(_call_info)
+        return json_out
+
+
+# Counters from getrusage to report, and the names we report them as
+_RUSAGE_FIELDS = [
+    ("user_time", "ru_utime"),
+    ("system_time", "ru_stime"),
+    ("block_input", "ru_inblock"),
+    ("block_output", "ru_oublock"),
+    ("voluntary_context_switches", "ru_nvcsw"),
+    ("involuntary_context_switches", "ru_nivcsw"),
+]
+
+# The counters at the end of the last hook call in this process
+_last_usage = None
+
+
+def _resource_usage():
+    """Get the resources used by this process and its finished subprocesses,
+    or None where the resource module is missing (i.e. on Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in bytes on macOS, and in KiB elsewhere
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    usage = {
+        name: getattr(own, field) + getattr(children, field)
+        for name, field in _RUSAGE_FIELDS
+    }
+    usage["max_rss"] = max(own.ru_maxrss, children.ru_maxrss) * rss_unit
+    return usage
+
+
+def _resource_usage_since_last_call():
+    """Get the resources used since the last hook call, or since the process
+    started for the first call. max_rss is the peak for the whole process.
+    """
+    global _last_usage
+    usage = _resource_usage()
+    if usage is None:
+        return None
+    delta = dict(usage)
+    if _last_usage is not None:
+        for name, _ in _RUSAGE_FIELDS:
+            delta[name] -= _last_usage[name]
+    _last_usage = usage
+    return delta
+
+
+# Resource module constants for the limits the caller can set
+_RLIMITS = {
+    "address_space": "RLIMIT_AS",
+    "cpu_time": "RLIMIT_CPU",
+    "open_files": "RLIMIT_NOFILE",
+}
+
+# The resource limits for the current hook call
+_resource_limits = {}  # type: dict
+
+
+def _set_resource_limits(limits):
+    """Lower the soft resource limits for hook calls in this process.
+
+    The CPU time limit counts from now. Returns a function to put back the
+    previous limits, for a worker to call once the hook is finished. Limits
+    can't be set without the resource module (i.e. on Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return lambda: None
+    # Once a limit is hit, there may not be the memory or file descriptors to
+    # import this to report it.
+    import traceback  # noqa: F401
+
+    previous = []
+    for name, value in limits.items():
+        which = getattr(resource, _RLIMITS[name])
+        soft, hard = resource.getrlimit(which)
+        if name == "cpu_time":
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            value += int(usage.ru_utime + usage.ru_stime) + 1
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(which, (value, hard))
+        previous.append((which, soft, hard))
+    _resource_limits.update(limits)
+
+    def restore():
+        for which, soft, hard in previous:
+            resource.setrlimit(which, (soft, hard))
+        _resource_limits.clear()
+
+    return restore
+
+
+def _limit_exceeded(json_out, name):
+    import traceback
+
+    json_out["limit_exceeded"] = {"limit": name, "value": _resource_limits[name]}
+    json_out["traceback"] = traceback.format_exc()
+
+
+def _format_warning(w):
+    return {
+        "message": str(w.message),
+        "filename": w.filename,
+        "lineno": w.lineno,
+    }
+
+
+def _format_warnings(captured_warnings):
+    return [
+        _format_warning(w)
         for w in captured_warnings
         if isinstance(w.category, type) and issubclass(w.category, UserWarning)
     ]
-    write_json(json_out, pjoin(control_dir, "output.json"), indent=2)
+
+
+# Where the backend can send progress events, as lines of JSON
+_progress = None
+
+
+def _open_progress_channel():
+    """Open the pipe for progress events, if the parent gave us one.
+
+    A file descriptor which isn't an open pipe, e.g. left in the environment by
+    an outer hook call, is ignored, and hidden from the backend.
+    """
+    import stat
+
+    global _progress
+    fd = os.environ.get("PYPROJECT_HOOKS_PROGRESS_FD")
+    if not fd:
+        return
+    try:
+        if not stat.S_ISFIFO(os.fstat(int(fd)).st_mode):
+            raise ValueError(f"Not a pipe: {fd}")
+        # Any subprocesses of the backend must not keep the pipe open
+        os.set_inheritable(int(fd), False)
+    except (OSError, ValueError):
+        os.environ["PYPROJECT_HOOKS_PROGRESS_FD"] = ""
+        return
+    _progress = open(int(fd), "w", encoding="utf-8", closefd=False)
+
+
+def _send_progress_event(event):
+    """Write an event (a JSON-serialisable dict) to the progress pipe."""
+    if _progress is not None:
+        _progress.write(json.dumps(event) + "\n")
+        _progress.flush()
+
+
+def _warning_forwarder(captured_warnings):
+    """Make a showwarning function which records warnings like
+    catch_warnings(record=True), and also sends them as progress events.
+    """
+
+    def showwarning(message, category, filename, lineno, file=None, line=None):
+        w = warnings.WarningMessage(message, category, filename, lineno, file, line)
+        captured_warnings.append(w)
+        if issubclass(category, UserWarning):
+            _send_progress_event({"type": "warning", **_format_warning(w)})
+
+    return showwarning
+
+
+def _start_deadline(timeout):
+    """Kill this process if it is still running after timeout seconds.
+
+    On POSIX, this process first gets its own process group, so the backend's
+    subprocesses (e.g. compilers) are killed with it, but not the parent. A
+    forked watchdog process does the waiting, so it works even if the hook
+    never lets go of the GIL. If this process dies before the hook finishes,
+    e.g. killed by the parent when it's interrupted, the watchdog kills the
+    group straight away, so the backend's subprocesses aren't left running.
+    Elsewhere, a thread ends this process.
+
+    Returns a function to call if the hook finishes in time.
+    """
+    import threading
+
+    if os.name != "posix":
+        timer = threading.Timer(timeout, os._exit, (1,))
+        timer.daemon = True
+        timer.start()
+        return timer.cancel
+
+    import select
+    import signal
+
+    if os.getpgrp() != os.getpid():
+        os.setpgid(0, 0)
+    read_fd, write_fd = os.pipe()
+    with warnings.catch_warnings():
+        # Forking a process with threads is fine if it only waits and kills
+        warnings.simplefilter("ignore", DeprecationWarning)
+        pid = os.fork()
+    if pid == 0:
+        os.close(write_fd)
+        # stop() writes a byte before closing the pipe; if it's closed without
+        # one, the hook process has died
+        finished, _, _ = select.select([read_fd], [], [], timeout)
+        if not finished or not os.read(read_fd, 1):
+            os.killpg(0, signal.SIGKILL)
+        os._exit(0)
+    os.close(read_fd)
+
+    def stop():
+        os.write(write_fd, b"\0")
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+
+    return stop
+
+
+def _call_hook_with_limits(hook_name, request):
+    """Call a hook for the --worker or --fork-server modes, with the request's
+    timeout and resource limits, if it has them.
+    """
+    cleanups = []
+    try:
+        if request.get("resource_limits"):
+            cleanups.append(_set_resource_limits(request["resource_limits"]))
+        if request.get("timeout") is not None:
+            cleanups.append(_start_deadline(request["timeout"]))
+        return _call_hook(hook_name, request)
+    finally:
+        for cleanup in reversed(cleanups):
+            cleanup()
+
+
+def serve():
+    """Answer hook calls sent on stdin until it is closed.
+
+    Any unexpected error in a hook ends the process, just like it would for a
+    single hook call; the parent will start a new worker for the next call.
+    """
+    # Keep the original stdin & stdout for the messages, and stop the backend
+    # from reading or writing them: its output goes to stderr instead.
+    requests = os.fdopen(os.dup(0), "rb")
+    responses = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+
+    # Import the backend while the parent is getting the first call ready.
+    # If that fails, the first hook call will try again and report the error.
+    with warnings.catch_warnings(record=True) as import_warnings:
+        try:
+            _build_backend()
+        except Exception:
+            pass
+
+    while True:
+        request = read_message(requests)
+        if request is None:
+            break
+        hook_name = request["hook_name"]
+        if hook_name not in HOOK_NAMES:
+            sys.exit("Unknown hook: %s" % hook_name)
+        os.chdir(request["cwd"])
+        json_out = _call_hook_with_limits(hook_name, request)
+        json_out["warnings"][:0] = _format_warnings(import_warnings)
+        import_warnings = []
+        sys.stdout.flush()
+        sys.stderr.flush()
+        write_message(json_out, responses)
+
+
+def _restore_site_state():
+    """Set what the site module would have, if started with -S for a fast start.
+
+    This is sys.path, and sys.prefix and sys.exec_prefix, which site sets in a
+    virtual environment before Python 3.11. The parent gets them from another
+    process, once for each interpreter and environment. They're set before
+    anything imports sysconfig, which finds install paths from sys.prefix.
+    """
+    site_state = os.environ.pop("_PYPROJECT_HOOKS_SITE", None)
+    if sys.flags.no_site and site_state is not None:
+        state = json.loads(site_state)
+        sys.path[1:] = state["sys_path"]
+        sys.prefix = state["prefix"]
+        sys.exec_prefix = state["exec_prefix"]
+
+
+def _exit_status(wait_status):
+    if os.WIFSIGNALED(wait_status):
+        return -os.WTERMSIG(wait_status)
+    return os.WEXITSTATUS(wait_status)
+
+
+def fork_server(socket_path):
+    """Fork a fresh process with the backend already imported for each hook call.
+
+    Each connection to the Unix socket at socket_path is one hook call: the
+    request message, then the response from the forked process, then
+    {"exit_status": ...} from this process once the forked process has exited.
+    This process never runs hooks itself, so no state is kept between calls.
+    It stops taking calls when stdin is closed, and exits once the running
+    calls are finished.
+    """
+    import selectors
+    import signal
+    import socket
+
+    # Stdin is only watched for EOF, and "ready" is written to stdout. The
+    # backend's output goes to stderr.
+    control = os.dup(0)
+    ready = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+
+    with warnings.catch_warnings(record=True) as captured_warnings:
+        try:
+            _build_backend()
+        except Exception:
+            pass  # Each hook call will try again, and report the error
+    import_warnings = _format_warnings(captured_warnings)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(64)
+
+    # Wake up from select when a forked process exits
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    signal.set_wakeup_fd(wakeup_w, warn_on_full_buffer=False)
+
+    os.write(ready, b"ready\n")
+    os.close(ready)
+
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    selector.register(control, selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
+    children = {}  # pid: connection
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is server:
+                conn, _ = server.accept()
+                pid = os.fork()
+                if pid == 0:
+                    signal.set_wakeup_fd(-1)
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    selector.close()
+                    for fd in (control, wakeup_r, wakeup_w):
+                        os.close(fd)
+                    server.close()
+                    _forked_hook_call(conn, import_warnings)
+                children[pid] = conn
+            elif key.fileobj == control:
+                if not os.read(control, 4096):
+                    selector.unregister(control)
+                    selector.unregister(server)
+                    server.close()
+                    control = None
+            else:
+                try:
+                    os.read(wakeup_r, 4096)
+                except BlockingIOError:
+                    pass
+
+        while children:
+            pid, wait_status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            conn = children.pop(pid)
+            try:
+                with conn.makefile("wb") as f:
+                    write_message({"exit_status": _exit_status(wait_status)}, f)
+            except OSError:
+                pass  # The caller has gone away
+            conn.close()
+
+        if control is None and not children:
+            break
+
+
+def _forked_hook_call(conn, import_warnings):
+    """Answer one hook call in a process forked by fork_server(). Never returns."""
+    status = 1
+    try:
+        with conn.makefile("rb") as f:
+            request = read_message(f)
+        hook_name = request["hook_name"]
+        if hook_name not in HOOK_NAMES:
+            print("Unknown hook: %s" % hook_name, file=sys.stderr)
+        else:
+            os.chdir(request["cwd"])
+            json_out = _call_hook_with_limits(hook_name, request)
+            json_out["warnings"][:0] = import_warnings
+            sys.stdout.flush()
+            sys.stderr.flush()
+            with conn.makefile("wb") as f:
+                write_message(json_out, f)
+            status = 0
+    except Exception:
+        import traceback
+
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def main():
+    global _profile_imports
+
+    started_at = time.time()
+    # The private variables are removed, so hook calls made by the backend
+    # itself, e.g. by running pip, don't inherit them
+    _profile_imports = bool(os.environ.pop("_PYPROJECT_HOOKS_PROFILE_IMPORTS", ""))
+    _restore_site_state()
+    _open_progress_channel()
+    if sys.argv[1:] == ["--worker"]:
+        _remove_script_dir_from_path()
+        serve()
+        return
+    if len(sys.argv) == 3 and sys.argv[1] == "--fork-server":
+        _remove_script_dir_from_path()
+        fork_server(sys.argv[2])
+        return
+    if sys.argv[1:] == ["--import-backend"]:
+        # Used by _profile_backend_import()
+        _remove_script_dir_from_path()
+        print(_IMPORT_PROFILE_START, file=sys.stderr, flush=True)
+        start = time.perf_counter()
+        try:
+            _load_backend()
+        except Exception:
+            sys.exit(1)  # The hook call will import it again to report the error
+        elapsed_us = int((time.perf_counter() - start) * 1e6)
+        print(_IMPORT_PROFILE_END, elapsed_us, file=sys.stderr)
+        return
+
+    if len(sys.argv) < 3:
+        sys.exit("Needs args: hook_name, control_dir")
+    hook_name = sys.argv[1]
+    control_dir = sys.argv[2]
+    if hook_name != "_batch" and hook_name not in HOOK_NAMES:
+        sys.exit("Unknown hook: %s" % hook_name)
+
+    _remove_script_dir_from_path()
+    timeout = os.environ.pop("_PYPROJECT_HOOKS_TIMEOUT", None)
+    stop_deadline = None
+    if timeout:
+        stop_deadline = _start_deadline(float(timeout))
+    resource_limits = os.environ.pop("_PYPROJECT_HOOKS_RESOURCE_LIMITS", None)
+    if resource_limits:
+        _set_resource_limits(json.loads(resource_limits))
+
+    read_start = time.perf_counter()
+    if control_dir.startswith("fd:"):
+        read_fd, write_fd = (int(fd) for fd in control_dir[3:].split(","))
+        # Don't leak the pipes to any subprocesses the backend starts
+        os.set_inheritable(read_fd, False)
+        os.set_inheritable(write_fd, False)
+        with open(read_fd, "rb") as f:
+            hook_input = read_message(f)
+    else:
+        hook_input = read_json(pjoin(control_dir, "input.json"))
+    read_input = time.perf_counter() - read_start
+
+    if hook_name == "_batch":
+        results = []
+        for call in hook_input["calls"]:
+            if call["hook_name"] not in HOOK_NAMES:
+                sys.exit("Unknown hook: %s" % call["hook_name"])
+            results.append(_call_batched_hook(call["hook_name"], call))
+        json_out = {"results": results}
+    else:
+        json_out = _call_hook(hook_name, hook_input)
+
+    # Wall clock times, for the parent to work out how long startup took
+    json_out["process"] = {
+        "started_at": started_at,
+        "read_input": read_input,
+        "output_started_at": time.time(),
+    }
+    if control_dir.startswith("fd:"):
+        with open(write_fd, "wb") as f:
+            write_message(json_out, f)
+    else:
+        write_json(json_out, pjoin(control_dir, "output.json"), indent=2)
+    if stop_deadline is not None:
+        stop_deadline()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+"""Resource limits for hook processes, and waiting for memory to start hooks."""
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Mapping, Optional
+
+#: The resource limits which can be set for a hook call, and their units.
+RESOURCE_LIMITS = {
+    "address_space": "bytes",
+    "cpu_time": "seconds",
+    "open_files": "file descriptors",
+}
+
+
+def check_resource_limits(limits: Mapping[str, int]) -> Dict[str, int]:
+    """Check the names and values of resource limits, and return them as a dict.
+
+    :raises ValueError: for an unknown limit, or a value which isn't a
+        positive integer.
+    """
+    checked = {}
+    for name, value in limits.items():
+        if name not in RESOURCE_LIMITS:
+            raise ValueError(f"Unknown resource limit: {name!r}")
+        if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+            raise ValueError(f"Resource limit {name} must be a positive integer")
+        checked[name] = value
+    return checked
+
+
+def _read_meminfo(path: str = "/proc/meminfo") -> Optional[int]:
+    """Get MemAvailable in bytes on Linux, or None if it can't be read."""
+    try:
+        with open(path, encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _read_memory_pressure(path: str = "/proc/pressure/memory") -> Optional[float]:
+    """Get the 'some avg10' memory pressure (a percentage) on Linux, or None."""
+    try:
+        with open(path, encoding="ascii") as f:
+            for line in f:
+                if line.startswith("some "):
+                    fields = dict(field.split("=") for field in line.split()[1:])
+                    return float(fields["avg10"])
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+class MemoryAdmission:
+    """Delay starting hook calls while the system is short of memory.
+
+    Give this to several :class:`BuildBackendHookCaller` objects as
+    ``admission``. Before each hook call starts, it waits until at least
+    *min_available* bytes of memory are available, counting *reserve* bytes
+    as taken for each hook call it has already let start. With *max_pressure*,
+    it also waits while the memory pressure is higher than that percentage.
+
+    A hook call is always let start if no others are running, so builds still
+    make progress on a busy machine. Memory is measured from
+    ``/proc/meminfo`` and ``/proc/pressure/memory`` on Linux; elsewhere, calls
+    start straight away. See :ref:`Memory Admission`.
+
+    :param min_available: Bytes of memory to keep available
+    :param reserve: Bytes of memory to expect each running hook call to use
+    :param max_pressure: The highest 'some avg10' memory pressure to start a
+        hook call at, as a percentage
+    :param poll_interval: Seconds between checks while waiting
+    """
+
+    def __init__(
+        self,
+        min_available: int = 1024**3,
+        reserve: int = 0,
+        max_pressure: Optional[float] = None,
+        poll_interval: float = 0.5,
+    ) -> None:
+        self.min_available = min_available
+        self.reserve = reserve
+        self.max_pressure = max_pressure
+        self.poll_interval = poll_interval
+        self._running = 0
+        self._cond = threading.Condition()
+
+    @property
+    def running(self) -> int:
+        """The number of hook calls started, and not yet finished."""
+        return self._running
+
+    def available_memory(self) -> Optional[int]:
+        """Get the available memory in bytes, or None if it isn't known."""
+        return _read_meminfo()
+
+    def memory_pressure(self) -> Optional[float]:
+        """Get the memory pressure as a percentage, or None if it isn't known."""
+        if self.max_pressure is None:
+            return None
+        return _read_memory_pressure()
+
+    def _can_start(self) -> bool:
+        if self._running == 0:
+            return True
+        available = self.available_memory()
+        if available is not None:
+            if available - self._running * self.reserve < self.min_available:
+                return False
+        pressure = self.memory_pressure()
+        if pressure is not None and self.max_pressure is not None:
+            if pressure > self.max_pressure:
+                return False
+        return True
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        """Wait until a hook call can start, and count it as running until the
+        context exits.
+        """
+        with self._cond:
+            while not self._can_start():
+                # Woken early when another hook call finishes
+                self._cond.wait(self.poll_interval)
+            self._running += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
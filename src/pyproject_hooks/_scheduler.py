@@ -0,0 +1,264 @@
+"""Run the hooks to build wheels for many projects in parallel."""
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from os.path import join as pjoin
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from ._impl import BuildBackendHookCaller
+
+
+class ProjectSpec:
+    """A project for :func:`build_projects` to build a wheel for.
+
+    The parameters are stored as attributes with the same names.
+
+    :param source_dir: The source directory of the project
+    :param build_backend: The build backend spec
+    :param backend_path: Additional path entries for the build backend spec
+    :param config_settings: Config settings to pass to the hooks
+    """
+
+    def __init__(
+        self,
+        source_dir: str,
+        build_backend: str,
+        backend_path: Optional[Sequence[str]] = None,
+        config_settings: Optional[Mapping[str, Any]] = None,
+    ) -> None:
+        self.source_dir = source_dir
+        self.build_backend = build_backend
+        self.backend_path = backend_path
+        self.config_settings = config_settings
+
+    def __repr__(self) -> str:
+        return f"<ProjectSpec {self.source_dir!r} {self.build_backend!r}>"
+
+
+class ProjectResult:
+    """The outcome of building one project with :func:`build_projects`.
+
+    .. attribute:: project
+
+       The :class:`ProjectSpec` which was built.
+
+    .. attribute:: requires
+
+       The list returned by ``get_requires_for_build_wheel``.
+
+    .. attribute:: dist_info
+
+       The path of the ``.dist-info`` folder made by
+       ``prepare_metadata_for_build_wheel``. It is removed once all the
+       projects are built, unless a ``metadata_directory`` was given.
+
+    .. attribute:: wheel
+
+       The path of the built wheel.
+
+    .. attribute:: error
+
+       The exception which stopped this project from being built, or None.
+
+    .. attribute:: failed_hook
+
+       The name of the hook which raised :attr:`error`, or None if the error
+       happened outside a hook (e.g. in the ``on_requires`` callback).
+
+    .. attribute:: durations
+
+       A dict of the time, in seconds, taken by each hook which was called.
+
+    Attributes for the steps after a failure are None.
+    """
+
+    def __init__(self, project: ProjectSpec) -> None:
+        self.project = project
+        self.requires: Optional[List[str]] = None
+        self.dist_info: Optional[str] = None
+        self.wheel: Optional[str] = None
+        self.error: Optional[Exception] = None
+        self.failed_hook: Optional[str] = None
+        self.durations: Dict[str, float] = {}
+
+    @property
+    def ok(self) -> bool:
+        """True if the wheel was built."""
+        return self.error is None
+
+    def __repr__(self) -> str:
+        outcome = self.wheel if self.ok else f"failed: {self.error!r}"
+        return f"<ProjectResult {self.project.source_dir!r} {outcome}>"
+
+
+class _ProjectBuild:
+    """The state of one project while it is being built."""
+
+    def __init__(self, index: int, project: ProjectSpec) -> None:
+        self.index = index
+        self.project = project
+        self.result = ProjectResult(project)
+        self.hooks: Optional[BuildBackendHookCaller] = None
+
+    def call(self, hook_name: str, *args: Any) -> Any:
+        assert self.hooks is not None
+        hook = getattr(self.hooks, hook_name)
+        start = time.perf_counter()
+        try:
+            return hook(*args)
+        except Exception:
+            self.result.failed_hook = hook_name
+            raise
+        finally:
+            self.result.durations[hook_name] = time.perf_counter() - start
+
+    def close(self) -> None:
+        if self.hooks is not None:
+            self.hooks.close()
+
+
+def _prepare(
+    build: _ProjectBuild,
+    metadata_directory: str,
+    make_hooks: Callable[[ProjectSpec], BuildBackendHookCaller],
+    on_requires: Optional[Callable[[ProjectSpec, List[str]], None]],
+) -> None:
+    """Get the build requirements and metadata for a project."""
+    result = build.result
+    config_settings = build.project.config_settings
+    try:
+        build.hooks = make_hooks(build.project)
+        result.requires = build.call("get_requires_for_build_wheel", config_settings)
+        if on_requires is not None:
+            on_requires(build.project, result.requires)
+
+        # A folder for each project, in case two make the same .dist-info name
+        project_metadata_dir = pjoin(metadata_directory, str(build.index))
+        os.makedirs(project_metadata_dir, exist_ok=True)
+        dist_info = build.call(
+            "prepare_metadata_for_build_wheel", project_metadata_dir, config_settings
+        )
+        result.dist_info = pjoin(project_metadata_dir, dist_info)
+    except Exception as e:
+        result.error = e
+        build.close()
+
+
+def _build(build: _ProjectBuild, wheel_directory: str) -> None:
+    """Build the wheel for a project, reusing its prepared metadata."""
+    result = build.result
+    try:
+        wheel = build.call(
+            "build_wheel",
+            wheel_directory,
+            build.project.config_settings,
+            result.dist_info,
+        )
+        result.wheel = pjoin(wheel_directory, wheel)
+    except Exception as e:
+        result.error = e
+    finally:
+        build.close()
+
+
+def build_projects(
+    projects: Iterable[Union[ProjectSpec, Tuple[str, str, Optional[Sequence[str]]]]],
+    wheel_directory: str,
+    metadata_directory: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    max_metadata_workers: int = 1,
+    on_requires: Optional[Callable[[ProjectSpec, List[str]], None]] = None,
+    on_result: Optional[Callable[[ProjectResult], None]] = None,
+    **caller_kwargs: Any,
+) -> List[ProjectResult]:
+    """Build wheels for many projects, running hooks in parallel.
+
+    For each project, this calls ``get_requires_for_build_wheel``,
+    ``prepare_metadata_for_build_wheel`` and then ``build_wheel``. The first
+    two hooks are usually quick, so they have separate threads: while wheels
+    are built for some projects, the metadata for the next projects is
+    prepared. A project's wheel is built as soon as its metadata is ready.
+
+    If a project fails, the error is stored in its :class:`ProjectResult`, and
+    the other projects carry on.
+
+    :param projects:
+        :class:`ProjectSpec` objects, or ``(source_dir, build_backend,
+        backend_path)`` tuples
+    :param wheel_directory: The directory to put all the built wheels in
+    :param metadata_directory:
+        A directory to prepare the metadata in, with a subdirectory for each
+        project. By default, a temporary directory is used.
+    :param max_workers:
+        The number of wheels to build at once. Defaults to the number of
+        CPUs.
+    :param max_metadata_workers:
+        The number of projects to get the requirements and metadata for at
+        once, alongside the wheels being built.
+    :param on_requires:
+        A function called with a project and its build requirements, before
+        its metadata is prepared, e.g. to install the requirements. If it
+        raises an exception, the project fails.
+    :param on_result:
+        A function called with each :class:`ProjectResult` once that project
+        is finished, from the thread which called :func:`build_projects`.
+    :param caller_kwargs:
+        Other arguments are passed to :class:`BuildBackendHookCaller` for
+        each project, e.g. ``runner`` or ``worker_pool``.
+    :return: A :class:`ProjectResult` for each project, in the same order.
+    """
+    specs = [p if isinstance(p, ProjectSpec) else ProjectSpec(*p) for p in projects]
+    builds = [_ProjectBuild(i, spec) for i, spec in enumerate(specs)]
+
+    def make_hooks(project: ProjectSpec) -> BuildBackendHookCaller:
+        return BuildBackendHookCaller(
+            project.source_dir,
+            project.build_backend,
+            project.backend_path,
+            **caller_kwargs,
+        )
+
+    def finished(build: _ProjectBuild) -> None:
+        if on_result is not None:
+            on_result(build.result)
+
+    with ExitStack() as stack:
+        if metadata_directory is None:
+            metadata_directory = stack.enter_context(tempfile.TemporaryDirectory())
+        build_pool = stack.enter_context(
+            ThreadPoolExecutor(max_workers or os.cpu_count() or 1)
+        )
+        metadata_pool = stack.enter_context(ThreadPoolExecutor(max_metadata_workers))
+
+        # Future -> (project, True if it's building the wheel)
+        stages: Dict["Future[None]", Tuple[_ProjectBuild, bool]] = {
+            metadata_pool.submit(
+                _prepare, build, metadata_directory, make_hooks, on_requires
+            ): (build, False)
+            for build in builds
+        }
+        while stages:
+            done, _ = wait(stages, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+                build, built = stages.pop(future)
+                if built or not build.result.ok:
+                    finished(build)
+                else:
+                    future = build_pool.submit(_build, build, wheel_directory)
+                    stages[future] = (build, True)
+
+    return [build.result for build in builds]
@@ -0,0 +1,188 @@
+"""Trace spans for hook calls, and writing them to a file for trace viewers."""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence
+
+
+class TraceSpan:
+    """A timed step of a hook call, passed to the ``trace_exporter`` of a
+    :class:`BuildBackendHookCaller`.
+
+    .. attribute:: name
+
+       The name of the step: the hook name for a whole hook call, or e.g.
+       ``"subprocess"`` or ``"import_backend"`` for the steps inside it.
+
+    .. attribute:: start
+
+       When the step started, in seconds since the epoch, like
+       :func:`time.time`.
+
+    .. attribute:: duration
+
+       How long the step took, in seconds.
+
+    .. attribute:: attributes
+
+       A dict of details about the step. For a whole hook call, these are
+       ``build_backend``, ``source_dir`` and ``outcome``: ``"ok"``,
+       ``"cached"`` if the result came from a cache, or the name of the
+       exception it raised.
+
+    .. attribute:: children
+
+       A list of the spans for the steps inside this one, in the order they
+       started.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        start: float,
+        duration: float = 0.0,
+        attributes: Optional[Dict[str, Any]] = None,
+        children: Optional[List["TraceSpan"]] = None,
+    ) -> None:
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.attributes = attributes if attributes is not None else {}
+        self.children = children if children is not None else []
+
+    def __repr__(self) -> str:
+        return f"<TraceSpan {self.name} {self.duration * 1000:.1f} ms>"
+
+    def walk(self) -> Iterator["TraceSpan"]:
+        """Iterate over this span and all the spans inside it, depth first."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+def spans_from_output(spans: Sequence[Mapping[str, Any]]) -> List[TraceSpan]:
+    """Make TraceSpan objects from the spans recorded in the hook's process."""
+    return [
+        TraceSpan(
+            span["name"],
+            span["start"],
+            span["duration"],
+            dict(span["args"]),
+            spans_from_output(span.get("children", [])),
+        )
+        for span in spans
+    ]
+
+
+_local = threading.local()
+
+
+@contextmanager
+def root_span(
+    name: str, exporter: Callable[[TraceSpan], None], **attributes: Any
+) -> Iterator[TraceSpan]:
+    """Trace a hook call, and pass its span to *exporter* when it's finished.
+
+    Spans started with :func:`child_span` in this thread are put inside it.
+    """
+    span = TraceSpan(name, time.time(), attributes=attributes)
+    outer = getattr(_local, "span", None)
+    _local.span = span
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span.attributes["outcome"] = type(e).__name__
+        raise
+    else:
+        span.attributes.setdefault("outcome", "ok")
+    finally:
+        span.duration = time.perf_counter() - start
+        _local.span = outer
+        exporter(span)
+
+
+@contextmanager
+def child_span(name: str, **attributes: Any) -> Iterator[Optional[TraceSpan]]:
+    """Time a step inside the current span, if a hook call is being traced.
+
+    Yields the new span, or None if nothing is being traced.
+    """
+    parent = getattr(_local, "span", None)
+    if parent is None:
+        yield None
+        return
+    span = TraceSpan(name, time.time(), attributes=attributes)
+    parent.children.append(span)
+    _local.span = span
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        span.duration = time.perf_counter() - start
+        _local.span = parent
+
+
+def annotate_span(**attributes: Any) -> None:
+    """Add attributes to the current span, if a hook call is being traced."""
+    span = getattr(_local, "span", None)
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+class ChromeTraceExporter:
+    """Write the spans of hook calls to a JSON file in the Trace Event Format.
+
+    Give this to :class:`BuildBackendHookCaller` as ``trace_exporter``. The
+    file can be opened in trace viewers like `Perfetto
+    <https://ui.perfetto.dev>`_ or ``chrome://tracing``. It's a JSON array of
+    events, one per line, which is started by the first hook call and added to
+    after each one. Like trace viewers, a program reading it should allow for
+    the array not being closed, and for a comma after the last event.
+
+    One exporter can be shared by several hook callers and threads, but not by
+    several processes. Each hook call is shown in the thread which made it,
+    with the steps that ran in the hook's process nested inside it.
+
+    :param path: The file to write
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._started = False
+        self._lock = threading.Lock()
+
+    def __call__(self, span: TraceSpan) -> None:
+        pid = os.getpid()
+        tid = threading.get_ident()
+        lines = [
+            json.dumps(
+                {
+                    "name": s.name,
+                    "cat": "pyproject_hooks",
+                    "ph": "X",  # A complete event, with a duration
+                    "ts": s.start * 1e6,
+                    "dur": s.duration * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": s.attributes,
+                },
+                default=str,
+            )
+            + ",\n"
+            for s in span.walk()
+        ]
+        with self._lock:
+            # Only the new events are written, so a long build doesn't slow
+            # down as the trace grows
+            mode = "a" if self._started else "w"
+            with open(self.path, mode, encoding="utf-8") as f:
+                if not self._started:
+                    f.write("[\n")
+                f.writelines(lines)
+            self._started = True
@@ -0,0 +1,524 @@
+"""Long-lived hook processes, to avoid starting Python for every hook call."""
+import json
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from os.path import abspath
+from subprocess import PIPE, CalledProcessError, Popen, TimeoutExpired
+from typing import IO, Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from ._impl import _backend_environ
+from ._in_process import _in_proc_script_path
+
+# (python_executable, build_backend, backend_path)
+WorkerKey = Tuple[str, str, Optional[Tuple[str, ...]]]
+
+
+def write_message(obj: Mapping[str, Any], stream: IO[bytes]) -> None:
+    data = json.dumps(obj).encode("utf-8")
+    stream.write(struct.pack(">I", len(data)) + data)
+    stream.flush()
+
+
+def read_message(stream: IO[bytes]) -> Optional[Mapping[str, Any]]:
+    """Read one length-prefixed JSON message, or return None at EOF."""
+    header = stream.read(4)
+    if len(header) < 4:
+        return None
+    (length,) = struct.unpack(">I", header)
+    return json.loads(stream.read(length).decode("utf-8"))
+
+
+class _HookWorker:
+    """A long-lived ``_in_process`` child answering hook calls in a loop.
+
+    The child imports the backend as soon as it starts. It is started on the
+    first call, and started again if it has died in the meantime. If it dies
+    during a call, :exc:`subprocess.CalledProcessError` is raised, as the
+    default subprocess runner would do.
+    """
+
+    def __init__(
+        self,
+        python_executable: str,
+        cwd: str,
+        extra_environ: Mapping[str, str],
+        key: Optional[WorkerKey] = None,
+    ) -> None:
+        self.python_executable = python_executable
+        self.cwd = cwd
+        self.extra_environ = extra_environ
+        self.key = key
+        self.calls = 0
+        self.last_used = time.monotonic()
+        self._proc: Optional["Popen[bytes]"] = None
+        self._cmd: List[str] = []
+        self._exit_stack = ExitStack()
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self) -> None:
+        """Start the child now, rather than on the first call."""
+        with self._lock:
+            if not self.alive:
+                self._stop()
+                self._start()
+
+    def _start(self) -> None:
+        script = self._exit_stack.enter_context(_in_proc_script_path())
+        self._cmd = [self.python_executable, abspath(str(script)), "--worker"]
+        env = os.environ.copy()
+        env.update(self.extra_environ)
+        self._proc = Popen(self._cmd, cwd=self.cwd, env=env, stdin=PIPE, stdout=PIPE)
+
+    def _stop(self, timeout: Optional[float] = 5) -> Optional[int]:
+        proc, self._proc = self._proc, None
+        returncode = None
+        if proc is not None:
+            assert proc.stdin is not None and proc.stdout is not None
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            try:
+                returncode = proc.wait(timeout)
+            except TimeoutExpired:
+                proc.kill()
+                returncode = proc.wait()
+            proc.stdout.close()
+        self._exit_stack.close()
+        return returncode
+
+    def _send(self, request: Mapping[str, Any]) -> None:
+        if self._proc is not None and self._proc.poll() is not None:
+            self._stop()
+        if self._proc is None:
+            self._start()
+        assert self._proc is not None and self._proc.stdin is not None
+        write_message(request, self._proc.stdin)
+
+    def call(
+        self,
+        hook_name: str,
+        kwargs: Mapping[str, Any],
+        cwd: Optional[str] = None,
+        timeout: Optional[float] = None,
+        resource_limits: Optional[Mapping[str, int]] = None,
+    ) -> Mapping[str, Any]:
+        """Call a hook in the worker, and return the data from the child.
+
+        :param cwd: The working directory for this call, if not the one the
+            worker was started in.
+        :param timeout: Seconds after which the worker kills itself, if the
+            hook hasn't finished.
+        :param resource_limits: Limits for the worker while it runs the hook.
+        """
+        request = {
+            "hook_name": hook_name,
+            "kwargs": kwargs,
+            "cwd": cwd or self.cwd,
+            "timeout": timeout,
+            "resource_limits": resource_limits,
+        }
+        with self._lock:
+            self.calls += 1
+            try:
+                self._send(request)
+            except BrokenPipeError:
+                # It died before reading the request, so it's safe to retry.
+                self._stop()
+                self._send(request)
+
+            assert self._proc is not None and self._proc.stdout is not None
+            data = read_message(self._proc.stdout)
+            self.last_used = time.monotonic()
+            if data is None:
+                cmd = self._cmd
+                returncode = self._stop()
+                raise CalledProcessError(returncode or 1, cmd)
+            return data
+
+    def close(self) -> None:
+        """Ask the worker to exit, and wait for it."""
+        with self._lock:
+            self._stop()
+
+
+class HookWorkerPool:
+    """A pool of :ref:`persistent workers <Persistent Workers>`, which can be
+    shared by many :class:`BuildBackendHookCaller` objects.
+
+    Workers are kept per Python executable, build backend and backend path, with
+    the backend already imported. A caller using the pool borrows a matching
+    worker for each hook call, running it in the caller's source directory.
+
+    :param max_workers: The maximum number of worker processes, busy or idle.
+        When the limit is reached, an idle worker for another backend is
+        stopped, or the call waits until a worker is returned to the pool.
+    :param idle_timeout: Stop workers which have not been used for this many
+        seconds. This is checked whenever the pool is used.
+    :param max_calls_per_worker: Replace each worker after it has handled this
+        many hook calls, to limit state building up in backends.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        idle_timeout: Optional[float] = 300,
+        max_calls_per_worker: Optional[int] = 100,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.max_calls_per_worker = max_calls_per_worker
+        self._idle: Dict[WorkerKey, List[_HookWorker]] = {}
+        self._n_workers = 0
+        self._cond = threading.Condition()
+
+    def prestart(
+        self,
+        python_executable: str,
+        build_backend: str,
+        backend_path: Optional[Sequence[str]] = None,
+        count: int = 1,
+    ) -> None:
+        """Start idle workers for a backend, so they are ready when needed.
+
+        :param backend_path: Absolute paths, as stored on
+            :attr:`BuildBackendHookCaller.backend_path`.
+        """
+        key = _worker_key(python_executable, build_backend, backend_path)
+        for _ in range(count):
+            with self._cond:
+                stopped = self._evict_idle()
+                full = self._n_workers >= self.max_workers
+                if not full:
+                    self._n_workers += 1
+            _close_workers(stopped)
+            if full:
+                return
+            worker = self._new_worker(key, os.getcwd())
+            worker.start()
+            self._release(worker)
+
+    def _new_worker(self, key: WorkerKey, cwd: str) -> _HookWorker:
+        python_executable, build_backend, backend_path = key
+        extra_environ = _backend_environ(build_backend, backend_path)
+        return _HookWorker(python_executable, cwd, extra_environ, key)
+
+    def _evict_idle(self) -> List[_HookWorker]:
+        """Take out workers which have been idle too long, to be stopped.
+
+        Call with the lock held, and close the workers after releasing it.
+        """
+        if self.idle_timeout is None:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        evicted = []
+        for workers in self._idle.values():
+            for worker in [w for w in workers if w.last_used < cutoff]:
+                workers.remove(worker)
+                self._discard(worker)
+                evicted.append(worker)
+        return evicted
+
+    def _discard(self, worker: _HookWorker) -> None:
+        """Stop counting a worker which is leaving the pool.
+
+        Call with the lock held. Closing the worker can take a few seconds, so
+        the caller does that after releasing the lock.
+        """
+        self._n_workers -= 1
+        self._cond.notify()
+
+    def _take_oldest_idle(self) -> Optional[_HookWorker]:
+        idle = [w for workers in self._idle.values() for w in workers]
+        if not idle:
+            return None
+        oldest = min(idle, key=lambda w: w.last_used)
+        assert oldest.key is not None
+        self._idle[oldest.key].remove(oldest)
+        self._discard(oldest)
+        return oldest
+
+    def _acquire(self, key: WorkerKey, cwd: str) -> _HookWorker:
+        """Borrow a worker for the given key, waiting if the pool is full.
+
+        A new worker is started in *cwd*, so the backend is imported there.
+        """
+        while True:
+            worker: Optional[_HookWorker] = None
+            with self._cond:
+                stopped = self._evict_idle()
+                idle = self._idle.get(key)
+                if idle:
+                    # The most recently used worker is the least likely to be
+                    # evicted next, so reuse it first.
+                    worker = idle.pop()
+                else:
+                    if self._n_workers >= self.max_workers:
+                        oldest = self._take_oldest_idle()
+                        if oldest is not None:
+                            stopped.append(oldest)
+                    if self._n_workers < self.max_workers:
+                        self._n_workers += 1
+                        worker = self._new_worker(key, cwd)
+                    elif not stopped:
+                        self._cond.wait()
+            _close_workers(stopped)
+            if worker is not None:
+                return worker
+
+    def _release(self, worker: _HookWorker) -> None:
+        """Return a borrowed worker to the pool."""
+        with self._cond:
+            limit = self.max_calls_per_worker
+            retire = not worker.alive or (limit is not None and worker.calls >= limit)
+            if retire:
+                self._discard(worker)
+            else:
+                assert worker.key is not None
+                self._idle.setdefault(worker.key, []).append(worker)
+                self._cond.notify()
+        if retire:
+            worker.close()
+
+    def close(self) -> None:
+        """Stop all idle workers.
+
+        The pool can still be used afterwards; it will start new workers.
+        """
+        with self._cond:
+            stopped = [w for workers in self._idle.values() for w in workers]
+            for worker in stopped:
+                self._discard(worker)
+            self._idle.clear()
+        _close_workers(stopped)
+
+    def __enter__(self) -> "HookWorkerPool":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def _close_workers(workers: List[_HookWorker]) -> None:
+    """Stop workers taken out of a pool, without holding the pool's lock."""
+    for worker in workers:
+        worker.close()
+
+
+# Forking without exec is only possible on Unix
+FORK_SERVER_SUPPORTED = hasattr(os, "fork") and hasattr(socket, "AF_UNIX")
+
+
+class _Zygote:
+    """A process with the backend imported, which forks a child for each call.
+
+    It is started on the first call, and started again if it has died. If a
+    forked child dies during a call, :exc:`subprocess.CalledProcessError` is
+    raised, as the default subprocess runner would do.
+    """
+
+    def __init__(
+        self, python_executable: str, cwd: str, extra_environ: Mapping[str, str]
+    ) -> None:
+        self.python_executable = python_executable
+        self.cwd = cwd
+        self.extra_environ = extra_environ
+        self._proc: Optional["Popen[bytes]"] = None
+        self._cmd: List[str] = []
+        self._socket_dir: Optional[str] = None
+        self._exit_stack = ExitStack()
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _socket_path(self) -> str:
+        assert self._socket_dir is not None
+        return os.path.join(self._socket_dir, "zygote.sock")
+
+    def start(self) -> None:
+        """Start the zygote now, rather than on the first call."""
+        with self._lock:
+            if not self.alive:
+                self._stop()
+                self._start()
+
+    def _start(self) -> None:
+        script = self._exit_stack.enter_context(_in_proc_script_path())
+        # A short path, as Unix socket paths have a low length limit
+        self._socket_dir = tempfile.mkdtemp(prefix="pyproject-hooks-")
+        self._cmd = [
+            self.python_executable,
+            abspath(str(script)),
+            "--fork-server",
+            self._socket_path(),
+        ]
+        env = os.environ.copy()
+        env.update(self.extra_environ)
+        self._proc = Popen(self._cmd, cwd=self.cwd, env=env, stdin=PIPE, stdout=PIPE)
+        assert self._proc.stdout is not None
+        # Wait until it's listening on the socket
+        if self._proc.stdout.readline() != b"ready\n":
+            returncode = self._stop()
+            raise CalledProcessError(returncode or 1, self._cmd)
+
+    def _stop(self, timeout: Optional[float] = 5) -> Optional[int]:
+        proc, self._proc = self._proc, None
+        returncode = None
+        if proc is not None:
+            assert proc.stdin is not None and proc.stdout is not None
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            try:
+                returncode = proc.wait(timeout)
+            except TimeoutExpired:
+                proc.kill()
+                returncode = proc.wait()
+            proc.stdout.close()
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+        self._exit_stack.close()
+        return returncode
+
+    def _connect(self) -> socket.socket:
+        with self._lock:
+            if not self.alive:
+                self._stop()
+                self._start()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self._socket_path())
+            except OSError:
+                sock.close()
+                raise
+            return sock
+
+    def call(
+        self,
+        hook_name: str,
+        kwargs: Mapping[str, Any],
+        cwd: str,
+        timeout: Optional[float] = None,
+        resource_limits: Optional[Mapping[str, int]] = None,
+    ) -> Mapping[str, Any]:
+        """Call a hook in a freshly forked process, and return its data."""
+        request = {
+            "hook_name": hook_name,
+            "kwargs": kwargs,
+            "cwd": cwd,
+            "timeout": timeout,
+            "resource_limits": resource_limits,
+        }
+        try:
+            sock = self._connect()
+        except OSError:
+            # The zygote may have died since we checked; try a new one.
+            with self._lock:
+                self._stop()
+            sock = self._connect()
+
+        with sock, sock.makefile("wb") as wfile, sock.makefile("rb") as rfile:
+            write_message(request, wfile)
+            data = read_message(rfile)
+            if data is not None and "exit_status" not in data:
+                status = read_message(rfile)
+            else:
+                status, data = data, None
+
+        if data is None:
+            # The forked process, or the zygote itself, died during the call
+            returncode = status["exit_status"] if status else 1
+            raise CalledProcessError(returncode or 1, self._cmd)
+        return data
+
+    def close(self) -> None:
+        """Stop the zygote, after any calls it's running have finished."""
+        with self._lock:
+            self._stop(timeout=None)
+
+
+class HookForkServer:
+    """Processes with build backends imported, which fork a fresh process for
+    each hook call. It can be shared by many :class:`BuildBackendHookCaller`
+    objects.
+
+    There is one of these zygote processes for each Python executable, build
+    backend and backend path, started when it is first needed. Each hook call
+    runs in a new process forked from it, so it doesn't pay for starting
+    Python or importing the backend, but no state is kept between calls.
+    See :ref:`Fork Server`.
+    """
+
+    def __init__(self) -> None:
+        self._zygotes: Dict[WorkerKey, _Zygote] = {}
+        self._lock = threading.Lock()
+
+    def prestart(
+        self,
+        python_executable: str,
+        build_backend: str,
+        backend_path: Optional[Sequence[str]] = None,
+    ) -> None:
+        """Start the zygote for a backend, so it is ready when needed.
+
+        :param backend_path: Absolute paths, as stored on
+            :attr:`BuildBackendHookCaller.backend_path`.
+        """
+        key = _worker_key(python_executable, build_backend, backend_path)
+        self._zygote(key, os.getcwd()).start()
+
+    def _zygote(self, key: WorkerKey, cwd: str) -> _Zygote:
+        """Get the zygote for a key. A new one imports the backend in *cwd*."""
+        with self._lock:
+            zygote = self._zygotes.get(key)
+            if zygote is None:
+                python_executable, build_backend, backend_path = key
+                extra_environ = _backend_environ(build_backend, backend_path)
+                zygote = _Zygote(python_executable, cwd, extra_environ)
+                self._zygotes[key] = zygote
+            return zygote
+
+    def close(self) -> None:
+        """Stop all the zygote processes, once their calls have finished.
+
+        The fork server can still be used afterwards; it will start new ones.
+        """
+        with self._lock:
+            zygotes = list(self._zygotes.values())
+            self._zygotes.clear()
+        for zygote in zygotes:
+            zygote.close()
+
+    def __enter__(self) -> "HookForkServer":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def _worker_key(
+    python_executable: str,
+    build_backend: str,
+    backend_path: Optional[Sequence[str]],
+) -> WorkerKey:
+    return (
+        python_executable,
+        build_backend,
+        tuple(backend_path) if backend_path else None,
+    )
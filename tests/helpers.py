@@ -0,0 +1,20 @@
+from os.path import abspath, dirname
+from os.path import join as pjoin
+
+from pyproject_hooks import BuildBackendHookCaller
+from tests.compat import tomllib
+
+SAMPLES_DIR = pjoin(dirname(abspath(__file__)), "samples")
+BUILDSYS_PKGS = pjoin(SAMPLES_DIR, "buildsys_pkgs")
+
+
+def get_hooks(pkg, source_dir=None, caller_class=BuildBackendHookCaller, **kwargs):
+    """Make a hook caller for a sample package, with the backend named in its
+    pyproject.toml. *source_dir* replaces the package's own directory.
+    """
+    pkg_dir = pjoin(SAMPLES_DIR, pkg)
+    with open(pjoin(pkg_dir, "pyproject.toml"), "rb") as f:
+        data = tomllib.load(f)
+    return caller_class(
+        source_dir or pkg_dir, data["build-system"]["build-backend"], **kwargs
+    )
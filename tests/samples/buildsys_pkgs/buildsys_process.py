@@ -0,0 +1,72 @@
+"""Test backend reporting which process it runs in, and where.
+
+It can also be made to print lines of output, raise an error, call a hook
+itself, die in the middle of a hook, hang along with a subprocess (writing the
+subprocess's pid to a file), or use a lot of memory, file descriptors or CPU
+time.
+get_requires_for_build_sdist reports the interpreter flags, prefix, install
+path and import path.
+
+Don't use this for any real code.
+"""
+import os
+import subprocess
+import sys
+import sysconfig
+import time
+
+
+def get_requires_for_build_wheel(config_settings):
+    config_settings = config_settings or {}
+    for i in range(config_settings.get("print_lines", 0)):
+        print(f"line {i}")
+    if config_settings.get("raise"):
+        raise RuntimeError(config_settings["raise"])
+    if config_settings.get("crash"):
+        sys.stdout.flush()
+        os._exit(3)
+    if config_settings.get("hang"):
+        child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+        with open(config_settings["hang"], "w") as f:
+            f.write(str(child.pid))
+        sys.stdout.flush()
+        time.sleep(60)
+    if config_settings.get("allocate"):
+        bytearray(config_settings["allocate"])
+    if config_settings.get("open_files"):
+        files = [open(os.devnull) for _ in range(config_settings["open_files"])]
+        for f in files:
+            f.close()
+    if config_settings.get("nested"):
+        return _nested_call()
+    if config_settings.get("spin"):
+        end = time.process_time() + config_settings["spin"]
+        while time.process_time() < end:
+            pass
+    return [str(os.getpid()), os.getcwd()]
+
+
+def _nested_call():
+    # Like pip run by a backend, calling hooks without profiling imports
+    from pyproject_hooks import BuildBackendHookCaller
+
+    stats = []
+    hooks = BuildBackendHookCaller(
+        os.getcwd(), "buildsys_process", stats_callback=stats.append
+    )
+    hooks.get_requires_for_build_wheel({})
+    leaked = [
+        name
+        for name in ["_PYPROJECT_HOOKS_PROFILE_IMPORTS", "_PYPROJECT_HOOKS_SITE"]
+        if name in os.environ
+    ]
+    return leaked + [str(stats[0].import_profile)]
+
+
+def get_requires_for_build_sdist(config_settings):
+    return [
+        str(sys.flags.no_site),
+        str(sys.flags.no_user_site),
+        sys.prefix,
+        sysconfig.get_paths()["purelib"],
+    ] + sys.path
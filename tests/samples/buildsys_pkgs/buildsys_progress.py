@@ -0,0 +1,21 @@
+"""Test backend reporting progress while building.
+
+Don't use this for any real code.
+"""
+import json
+import os
+import warnings
+
+
+def report(event):
+    fd = os.environ.get("PYPROJECT_HOOKS_PROGRESS_FD")
+    if fd:
+        with open(int(fd), "w", closefd=False) as f:
+            f.write(json.dumps(event) + "\n")
+
+
+def get_requires_for_build_wheel(config_settings):
+    report({"type": "progress", "step": 1})
+    warnings.warn("halfway there")
+    report({"type": "progress", "step": 2})
+    return ["progress-bar"]
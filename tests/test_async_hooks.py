@@ -0,0 +1,162 @@
+import asyncio
+import os
+import shutil
+import threading
+import zipfile
+from contextlib import ExitStack
+from os.path import join as pjoin
+from subprocess import CalledProcessError
+from unittest.mock import Mock, patch
+
+import pytest
+from testpath import assert_isfile, modified_env
+from testpath.tempdir import TemporaryDirectory
+
+from pyproject_hooks import (
+    AsyncBuildBackendHookCaller,
+    BackendUnavailable,
+    BuildBackendWarning,
+    HookMissing,
+    UnsupportedOperation,
+    default_async_subprocess_runner,
+    quiet_async_subprocess_runner,
+)
+from pyproject_hooks import _async
+from tests import helpers
+from tests.helpers import BUILDSYS_PKGS
+
+
+def get_hooks(pkg, **kwargs):
+    return helpers.get_hooks(pkg, caller_class=AsyncBuildBackendHookCaller, **kwargs)
+
+
+def test_get_requires():
+    hooks = get_hooks("pkg1")
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        res = asyncio.run(hooks.get_requires_for_build_wheel({}))
+    assert res == ["wheelwright"]
+
+
+def test_concurrent_calls():
+    hooks = get_hooks("pkg1")
+
+    async def call_all():
+        return await asyncio.gather(
+            hooks._supported_features(),
+            hooks.get_requires_for_build_wheel({}),
+            hooks.get_requires_for_build_editable({}),
+            hooks.get_requires_for_build_sdist({}),
+        )
+
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        res = asyncio.run(call_all())
+    assert res == [
+        ["build_editable"],
+        ["wheelwright"],
+        ["wheelwright", "editables"],
+        ["frog"],
+    ]
+
+
+def test_metadata_fallback_and_build_wheel():
+    hooks = get_hooks("pkg2")
+
+    async def build(metadata_dir, wheel_dir):
+        distinfo = await hooks.prepare_metadata_for_build_wheel(metadata_dir, {})
+        whl = await hooks.build_wheel(wheel_dir, {}, pjoin(metadata_dir, distinfo))
+        return distinfo, whl
+
+    with TemporaryDirectory() as md, TemporaryDirectory() as wd:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            distinfo, whl = asyncio.run(build(md, wd))
+        assert_isfile(pjoin(md, distinfo, "METADATA"))
+        assert zipfile.is_zipfile(pjoin(wd, whl))
+
+
+def test_errors():
+    with TemporaryDirectory() as td:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            with pytest.raises(UnsupportedOperation):
+                asyncio.run(
+                    get_hooks("pkg1").build_sdist(td, {"test_unsupported": True})
+                )
+            with pytest.raises(HookMissing):
+                asyncio.run(get_hooks("pkg2").build_editable(td, {}))
+        with modified_env({"PYTHONPATH": ""}):
+            with pytest.raises(BackendUnavailable):
+                asyncio.run(get_hooks("pkg1").get_requires_for_build_wheel({}))
+
+
+def test_warnings():
+    hooks = get_hooks("pkg-with-warnings")
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with pytest.warns(BuildBackendWarning, match="this is my example warning"):
+            asyncio.run(hooks.get_requires_for_build_wheel({}))
+
+
+def test_quiet_runner_failure():
+    cmd = ["python", "-c", "print('some output'); raise SystemExit(2)"]
+    with pytest.raises(CalledProcessError) as exc:
+        asyncio.run(quiet_async_subprocess_runner(cmd))
+    assert exc.value.returncode == 2
+    assert b"some output" in exc.value.output
+
+
+def test_runner_replaced():
+    runner = Mock(wraps=default_async_subprocess_runner)
+    hooks = get_hooks("pkg1")
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), hooks.subprocess_runner(runner):
+        asyncio.run(hooks.get_requires_for_build_wheel())
+    runner.assert_called_once()
+    assert runner.call_args[1]["cwd"] == hooks.source_dir
+    assert os.path.basename(runner.call_args[0][0][1]) == "_in_process.py"
+
+
+def test_control_files_off_event_loop():
+    threads = {}
+
+    def record(name, func):
+        def wrapper(*args, **kwargs):
+            threads[name] = threading.get_ident()
+            return func(*args, **kwargs)
+
+        return patch(f"pyproject_hooks._async.{name}", wrapper)
+
+    async def call():
+        threads["loop"] = threading.get_ident()
+        return await get_hooks("pkg1").get_requires_for_build_wheel({})
+
+    with ExitStack() as stack:
+        stack.enter_context(modified_env({"PYTHONPATH": BUILDSYS_PKGS}))
+        stack.enter_context(record("write_json", _async.write_json))
+        stack.enter_context(record("read_json", _async.read_json))
+        stack.enter_context(record("shutil.rmtree", shutil.rmtree))
+        assert asyncio.run(call()) == ["wheelwright"]
+    assert set(threads) == {"loop", "write_json", "read_json", "shutil.rmtree"}
+    assert threads["loop"] not in {threads["write_json"], threads["read_json"]}
+    assert threads["loop"] != threads["shutil.rmtree"]
+
+
+@pytest.mark.parametrize(
+    "runner", [default_async_subprocess_runner, quiet_async_subprocess_runner]
+)
+def test_cancelled_call_kills_subprocess(runner):
+    procs = []
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def record(*args, **kwargs):
+        procs.append(await create_subprocess_exec(*args, **kwargs))
+        return procs[-1]
+
+    hooks = get_hooks("pkg-process", runner=runner)
+
+    async def call():
+        hook = hooks.get_requires_for_build_wheel({"spin": 60})
+        await asyncio.wait_for(hook, 1.5)
+
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with patch("asyncio.create_subprocess_exec", record):
+            with pytest.raises(asyncio.TimeoutError):
+                asyncio.run(call())
+    (proc,) = procs
+    assert proc.returncode is not None
@@ -0,0 +1,371 @@
+import os
+import shutil
+import sys
+from os.path import join as pjoin
+from unittest.mock import Mock, patch
+
+import pytest
+from testpath import assert_isfile, modified_env
+from testpath.tempdir import TemporaryDirectory
+
+from pyproject_hooks import (
+    BuildBackendHookCaller,
+    HookMissing,
+    MetadataCache,
+    RequiresCache,
+    WheelCache,
+    default_subprocess_runner,
+    source_tree_fingerprint,
+)
+from tests.helpers import BUILDSYS_PKGS, SAMPLES_DIR
+
+
+@pytest.fixture
+def source_dir():
+    with TemporaryDirectory() as td:
+        source_dir = pjoin(td, "pkg1")
+        shutil.copytree(pjoin(SAMPLES_DIR, "pkg1"), source_dir)
+        yield source_dir
+
+
+@pytest.fixture
+def runner():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        yield Mock(wraps=default_subprocess_runner)
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def write_bytes(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_fingerprint(source_dir):
+    fingerprint = source_tree_fingerprint(source_dir)
+    os.mkdir(pjoin(source_dir, ".git"))
+    with open(pjoin(source_dir, ".git", "HEAD"), "w") as f:
+        f.write("ref: refs/heads/main\n")
+    assert source_tree_fingerprint(source_dir) == fingerprint
+
+    with open(pjoin(source_dir, "pkg1.py"), "a") as f:
+        f.write("# changed\n")
+    assert source_tree_fingerprint(source_dir) != fingerprint
+
+
+def test_fingerprint_nested_build_package(source_dir):
+    # Only build/ at the top of the tree is build output
+    os.makedirs(pjoin(source_dir, "build", "lib"))
+    fingerprint = source_tree_fingerprint(source_dir)
+    with open(pjoin(source_dir, "build", "lib", "pkg1.py"), "w") as f:
+        f.write("# copied by the backend\n")
+    assert source_tree_fingerprint(source_dir) == fingerprint
+
+    package = pjoin(source_dir, "src", "pkg", "build")
+    os.makedirs(package)
+    fingerprint = source_tree_fingerprint(source_dir, hash_contents=True)
+    with open(pjoin(package, "__init__.py"), "w") as f:
+        f.write("# real code\n")
+    assert source_tree_fingerprint(source_dir, hash_contents=True) != fingerprint
+
+
+def test_fingerprint_exclude_names_and_paths(source_dir):
+    os.makedirs(pjoin(source_dir, "a", "out"))
+    fingerprint = source_tree_fingerprint(source_dir, exclude=["out"])
+    with open(pjoin(source_dir, "a", "out", "x"), "w") as f:
+        f.write("x")
+    assert source_tree_fingerprint(source_dir, exclude=["out"]) == fingerprint
+    assert source_tree_fingerprint(source_dir, exclude=["/a/out"]) == fingerprint
+    assert source_tree_fingerprint(source_dir, exclude=["/out"]) != fingerprint
+
+
+def test_requires_cache(source_dir, runner):
+    with TemporaryDirectory() as td:
+        cache = RequiresCache(td)
+        hooks = BuildBackendHookCaller(
+            source_dir, "buildsys", runner=runner, requires_cache=cache
+        )
+        assert hooks.get_requires_for_build_wheel({}) == ["wheelwright"]
+        assert hooks.get_requires_for_build_wheel({}) == ["wheelwright"]
+        assert runner.call_count == 1
+
+        # Other hooks and config settings have their own entries
+        assert hooks.get_requires_for_build_sdist({}) == ["frog"]
+        assert hooks.get_requires_for_build_wheel({"a": "b"}) == ["wheelwright"]
+        assert runner.call_count == 3
+
+        # Changing the source tree invalidates the cached results
+        with open(pjoin(source_dir, "pkg1.py"), "a") as f:
+            f.write("# changed\n")
+        assert hooks.get_requires_for_build_sdist({}) == ["frog"]
+        assert runner.call_count == 4
+
+        # And the cache can be shared with other callers
+        hooks2 = BuildBackendHookCaller(
+            source_dir, "buildsys", runner=runner, requires_cache=cache
+        )
+        assert hooks2.get_requires_for_build_sdist({}) == ["frog"]
+        assert runner.call_count == 4
+
+
+def test_cache_python_on_path(source_dir, runner):
+    # The interpreter can be a command to find on PATH, as without caches
+    python_dir, python = os.path.split(sys.executable)
+    path = python_dir + os.pathsep + os.environ["PATH"]
+    with modified_env({"PATH": path}), TemporaryDirectory() as td:
+        hooks = BuildBackendHookCaller(
+            source_dir,
+            "buildsys",
+            runner=runner,
+            python_executable=python,
+            requires_cache=RequiresCache(pjoin(td, "requires")),
+            wheel_cache=WheelCache(pjoin(td, "wheels")),
+        )
+        assert hooks.get_requires_for_build_wheel({}) == ["wheelwright"]
+        assert hooks.get_requires_for_build_wheel({}) == ["wheelwright"]
+        wheel_dir = pjoin(td, "dist")
+        os.mkdir(wheel_dir)
+        hooks.build_wheel(wheel_dir, {})
+        hooks.build_wheel(wheel_dir, {})
+    assert runner.call_count == 2
+
+
+def test_cache_python_not_found(source_dir, runner):
+    with TemporaryDirectory() as td:
+        hooks = BuildBackendHookCaller(
+            source_dir,
+            "buildsys",
+            runner=runner,
+            python_executable="no-such-python",
+            requires_cache=RequiresCache(td),
+        )
+        # The hook call reports the missing interpreter, as without a cache
+        with pytest.raises(FileNotFoundError):
+            hooks.get_requires_for_build_wheel({})
+    runner.assert_called_once()
+
+
+def test_requires_cache_eviction():
+    with TemporaryDirectory() as td:
+        cache = RequiresCache(td, max_entries=2)
+        for i, key in enumerate(["aa01", "bb02", "cc03"]):
+            cache.put(key, [str(i)])
+            os.utime(cache._entry_path(key), (i, i))
+        cache.put("cc03", ["2"])
+        assert cache.get("aa01") is None
+        assert cache.get("bb02") == ["1"]
+        assert cache.get("cc03") == ["2"]
+
+        cache.clear()
+        assert cache.get("cc03") is None
+
+
+def test_cache_eviction_scans():
+    scans = []
+    with TemporaryDirectory() as td:
+        cache = RequiresCache(td, max_entries=150)
+        entries = cache._entries
+        with patch.object(cache, "_entries", lambda: scans.append(1) or entries()):
+            for i in range(150):
+                cache.put(f"{i:04x}", [])
+            # Once for the first put, then every 100 puts
+            assert len(scans) == 2
+
+            # Going over a limit scans right away
+            cache.put("ffff", [])
+            assert len(scans) == 3
+        assert len(entries()) == 150
+
+
+def test_metadata_cache(runner):
+    with TemporaryDirectory() as td:
+        source_dir = pjoin(td, "pkg2")
+        shutil.copytree(pjoin(SAMPLES_DIR, "pkg2"), source_dir)
+        cache = MetadataCache(pjoin(td, "cache"))
+        hooks = BuildBackendHookCaller(
+            source_dir, "buildsys_minimal", runner=runner, metadata_cache=cache
+        )
+        for i in range(2):
+            metadata_dir = pjoin(td, f"metadata{i}")
+            os.mkdir(metadata_dir)
+            distinfo = hooks.prepare_metadata_for_build_wheel(metadata_dir, {})
+            assert distinfo == "pkg2-0.5.dist-info"
+            assert_isfile(pjoin(metadata_dir, distinfo, "METADATA"))
+        assert runner.call_count == 1
+        # Only the first call fell back to building a wheel
+        assert os.listdir(metadata_dir) == [distinfo]
+
+        # A missing hook is still reported if the fallback isn't allowed
+        with pytest.raises(HookMissing):
+            hooks.prepare_metadata_for_build_wheel(
+                metadata_dir, {}, _allow_fallback=False
+            )
+
+
+def test_metadata_cache_eviction():
+    with TemporaryDirectory() as td:
+        metadata_dir = pjoin(td, "metadata")
+        os.makedirs(pjoin(metadata_dir, "a-1.dist-info"))
+        write_bytes(pjoin(metadata_dir, "a-1.dist-info", "METADATA"), b"Name: a\n")
+
+        cache = MetadataCache(pjoin(td, "cache"), max_age=60)
+        cache.put("aa01", metadata_dir, "a-1.dist-info")
+        os.utime(cache._entry_path("aa01"), (0, 0))
+        cache.put("bb02", metadata_dir, "a-1.dist-info")
+        # Ages are only checked when the directory is scanned
+        assert cache.get("aa01", td) == "a-1.dist-info"
+        os.utime(cache._entry_path("aa01"), (0, 0))
+        cache.evict()
+        assert cache.get("aa01", td) is None
+        assert cache.get("bb02", td) == "a-1.dist-info"
+
+        cache = MetadataCache(pjoin(td, "cache"), max_size=1)
+        cache.put("cc03", metadata_dir, "a-1.dist-info")
+        assert cache._entries() == []
+
+
+def test_wheel_cache(runner):
+    with TemporaryDirectory() as td:
+        cache = WheelCache(pjoin(td, "cache"))
+        wheels = []
+        for i in range(2):
+            # Copies of a source tree share wheels, regardless of file times
+            source_dir = pjoin(td, f"pkg1-{i}")
+            shutil.copytree(
+                pjoin(SAMPLES_DIR, "pkg1"), source_dir, copy_function=shutil.copy
+            )
+            wheel_dir = pjoin(td, f"wheels{i}")
+            os.mkdir(wheel_dir)
+            hooks = BuildBackendHookCaller(
+                source_dir, "buildsys", runner=runner, wheel_cache=cache
+            )
+            wheels.append(hooks.build_wheel(wheel_dir, {}))
+            assert_isfile(pjoin(wheel_dir, wheels[-1]))
+        assert wheels[0] == wheels[1] == "pkg1-0.5-py2.py3-none-any.whl"
+        assert runner.call_count == 1
+
+        # Editable wheels aren't shared between source trees
+        hooks.build_editable(wheel_dir, {})
+        assert runner.call_count == 2
+        hooks.build_editable(wheel_dir, {})
+        assert runner.call_count == 2
+
+        # Nor are wheels built with different settings
+        hooks.build_wheel(wheel_dir, {"a": "b"})
+        assert runner.call_count == 3
+
+
+def test_wheel_cache_eviction():
+    with TemporaryDirectory() as td:
+        write_bytes(pjoin(td, "a-1-py3-none-any.whl"), b"x" * 100)
+        cache = WheelCache(pjoin(td, "cache"), max_size=150)
+        cache.put("aa01", td, "a-1-py3-none-any.whl")
+        os.utime(cache._entry_path("aa01"), (0, 0))
+        cache.put("bb02", td, "a-1-py3-none-any.whl")
+
+        wheel_dir = pjoin(td, "wheels")
+        os.mkdir(wheel_dir)
+        assert cache.get("aa01", wheel_dir) is None
+        assert cache.get("bb02", wheel_dir) == "a-1-py3-none-any.whl"
+        assert_isfile(pjoin(wheel_dir, "a-1-py3-none-any.whl"))
+
+
+def test_wheel_cache_entry_not_shared():
+    wheel = "a-1-py3-none-any.whl"
+    with TemporaryDirectory() as td:
+        write_bytes(pjoin(td, wheel), b"original")
+        cache = WheelCache(pjoin(td, "cache"))
+        cache.put("aa01", td, wheel)
+
+        # Backends may rewrite a wheel in place, truncating the existing file
+        with open(pjoin(td, wheel), "r+b") as f:
+            f.truncate(0)
+            f.write(b"rebuilt")
+
+        wheel_dir = pjoin(td, "wheels")
+        os.mkdir(wheel_dir)
+        assert cache.get("aa01", wheel_dir) == wheel
+        assert read_bytes(pjoin(wheel_dir, wheel)) == b"original"
+
+        with open(pjoin(wheel_dir, wheel), "r+b") as f:
+            f.truncate(0)
+            f.write(b"rebuilt again")
+        assert cache.get("aa01", td) == wheel
+        assert read_bytes(pjoin(td, wheel)) == b"original"
+        assert os.listdir(wheel_dir) == [wheel]
+
+
+def test_incremental_build_wheel(source_dir, runner):
+    hooks = BuildBackendHookCaller(
+        source_dir, "buildsys", runner=runner, incremental=True
+    )
+    wheel_dir = pjoin(source_dir, "wheels")
+    os.mkdir(wheel_dir)
+    whl = hooks.build_wheel(wheel_dir, {})
+    assert_isfile(pjoin(wheel_dir, whl))
+    assert runner.call_count == 1
+
+    # Nothing changed; the wheel directory inside the tree doesn't count
+    assert hooks.build_wheel(wheel_dir, {}) == whl
+    assert runner.call_count == 1
+
+    # Touched, but the same contents
+    mtime = os.stat(pjoin(source_dir, "pkg1.py")).st_mtime_ns + 10**9
+    os.utime(pjoin(source_dir, "pkg1.py"), ns=(mtime, mtime))
+    hooks.build_wheel(wheel_dir, {})
+    assert runner.call_count == 1
+
+    # Different config settings are a separate build
+    hooks.build_wheel(wheel_dir, {"option": "1"})
+    assert runner.call_count == 2
+
+    with open(pjoin(source_dir, "pkg1.py"), "a") as f:
+        f.write("# changed\n")
+    hooks.build_wheel(wheel_dir, {})
+    assert runner.call_count == 3
+
+    with open(pjoin(source_dir, "new.txt"), "w") as f:
+        f.write("new file\n")
+    hooks.build_wheel(wheel_dir, {})
+    assert runner.call_count == 4
+
+    os.unlink(pjoin(source_dir, "new.txt"))
+    hooks.build_wheel(wheel_dir, {})
+    assert runner.call_count == 5
+
+    # A package named build is source code, not build output
+    os.makedirs(pjoin(source_dir, "src", "build"))
+    with open(pjoin(source_dir, "src", "build", "__init__.py"), "w") as f:
+        f.write("# code\n")
+    hooks.build_wheel(wheel_dir, {})
+    assert runner.call_count == 6
+
+    # The wheel itself was removed
+    os.unlink(pjoin(wheel_dir, whl))
+    hooks.build_wheel(wheel_dir, {})
+    assert runner.call_count == 7
+    assert_isfile(pjoin(wheel_dir, whl))
+
+
+def test_incremental_racy_file(source_dir, runner):
+    hooks = BuildBackendHookCaller(
+        source_dir, "buildsys", runner=runner, incremental=True
+    )
+    path = pjoin(source_dir, "pkg1.py")
+    os.utime(path)  # Modified just before the build
+    with TemporaryDirectory() as wheel_dir:
+        hooks.build_wheel(wheel_dir, {})
+
+        # Changed again without changing the size or modification time: as it
+        # was modified so close to the snapshot, it's hashed rather than trusted.
+        st = os.stat(path)
+        with open(path, "r+") as f:
+            data = f.read()
+            f.seek(0)
+            f.write(data.swapcase())
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        hooks.build_wheel(wheel_dir, {})
+    assert runner.call_count == 2
@@ -1,10 +1,13 @@
 import json
 import os
+import subprocess
 import tarfile
+import time
+import venv
 import zipfile
-from os.path import abspath, dirname
 from os.path import join as pjoin
-from unittest.mock import Mock
+from subprocess import CalledProcessError
+from unittest.mock import Mock, patch
 
 import pytest
 from testpath import assert_isfile, modified_env
@@ -14,23 +17,16 @@ from pyproject_hooks import (
     BackendUnavailable,
     BuildBackendWarning,
     BuildBackendHookCaller,
+    HookFailed,
+    HookTimeout,
+    ResourceLimitExceeded,
+    StreamingSubprocessRunner,
     UnsupportedOperation,
     default_subprocess_runner,
+    quiet_subprocess_runner,
 )
 from pyproject_hooks._in_process import _in_proc_script_path as in_proc_script_path
-from tests.compat import tomllib
-
-SAMPLES_DIR = pjoin(dirname(abspath(__file__)), "samples")
-BUILDSYS_PKGS = pjoin(SAMPLES_DIR, "buildsys_pkgs")
-
-
-def get_hooks(pkg, **kwargs):
-    source_dir = pjoin(SAMPLES_DIR, pkg)
-    with open(pjoin(source_dir, "pyproject.toml"), "rb") as f:
-        data = tomllib.load(f)
-    return BuildBackendHookCaller(
-        source_dir, data["build-system"]["build-backend"], **kwargs
-    )
+from tests.helpers import BUILDSYS_PKGS, SAMPLES_DIR, get_hooks
 
 
 def test_missing_backend_gives_exception():
@@ -233,3 +229,589 @@ def test_warnings():
     with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
         with pytest.warns(BuildBackendWarning, match="this is my example warning"):
             hooks.get_requires_for_build_wheel({})
+
+
+def test_call_hooks():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        runner = Mock(wraps=default_subprocess_runner)
+        hooks = get_hooks("pkg1", runner=runner)
+        with TemporaryDirectory() as td:
+            features, requires, distinfo, unsupported = hooks.call_hooks(
+                [
+                    ("_supported_features", {}),
+                    ("get_requires_for_build_wheel", {"config_settings": {}}),
+                    ("prepare_metadata_for_build_wheel", {"metadata_directory": td}),
+                    (
+                        "build_sdist",
+                        {
+                            "sdist_directory": td,
+                            "config_settings": {"test_unsupported": True},
+                        },
+                    ),
+                ]
+            )
+            assert_isfile(pjoin(td, "pkg1-0.5.dist-info", "METADATA"))
+        runner.assert_called_once()
+        assert features == ["build_editable"]
+        assert requires == ["wheelwright"]
+        assert isinstance(unsupported, UnsupportedOperation)
+
+
+@pytest.mark.parametrize("persistent_worker", [False, True])
+def test_call_hooks_error_keeps_results(persistent_worker):
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks = get_hooks(
+            "pkg-process",
+            runner=quiet_subprocess_runner,
+            persistent_worker=persistent_worker,
+        )
+        with hooks:
+            first, failed, last = hooks.call_hooks(
+                [
+                    ("get_requires_for_build_wheel", {}),
+                    (
+                        "get_requires_for_build_wheel",
+                        {"config_settings": {"raise": "x"}},
+                    ),
+                    ("get_requires_for_build_sdist", {}),
+                ]
+            )
+        assert first[1] == hooks.source_dir
+        assert isinstance(failed, HookFailed)
+        assert failed.hook_name == "get_requires_for_build_wheel"
+        if not persistent_worker:
+            assert "RuntimeError: x" in failed.traceback
+        assert isinstance(last, list)
+
+
+def test_call_hooks_unknown():
+    hooks = get_hooks("pkg1")
+    with pytest.raises(ValueError):
+        hooks.call_hooks([("subprocess_runner", {})])
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Can't pass file descriptors on Windows")
+def test_pipe_transport():
+    # No control files, so no temporary directory to put them in
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with patch("tempfile.TemporaryDirectory", None):
+            hooks = get_hooks("pkg1", pipe_transport=True)
+            assert hooks.get_requires_for_build_wheel({}) == ["wheelwright"]
+            features, requires = hooks.call_hooks(
+                [("_supported_features", {}), ("get_requires_for_build_sdist", {})]
+            )
+            assert features == ["build_editable"]
+            assert requires == ["frog"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Can't pass file descriptors on Windows")
+def test_pipe_transport_crash():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks = get_hooks("pkg-process", pipe_transport=True)
+        with pytest.raises(CalledProcessError):
+            hooks.get_requires_for_build_wheel({"crash": True})
+
+
+def test_pipe_transport_fallback():
+    def runner(cmd, cwd=None, extra_environ=None):
+        default_subprocess_runner(cmd, cwd, extra_environ)
+        assert os.path.isdir(cmd[-1])  # A control directory, not pipes
+
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks = get_hooks("pkg1", runner=runner, pipe_transport=True)
+        assert hooks.get_requires_for_build_wheel({}) == ["wheelwright"]
+
+
+def test_stats_callback():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        stats = []
+        hooks = get_hooks("pkg1", stats_callback=stats.append)
+        hooks.get_requires_for_build_wheel({})
+
+        (call_stats,) = stats
+        assert call_stats.hook_name == "get_requires_for_build_wheel"
+        assert list(call_stats.timings) == [
+            "script_path",
+            "write_input",
+            "interpreter_startup",
+            "read_input",
+            "import_backend",
+            "hook",
+            "write_output",
+            "read_output",
+            "total",
+        ]
+        assert all(t >= 0 for t in call_stats.timings.values())
+        assert call_stats.wheel_handoff is None
+
+
+def test_stats_callback_call_hooks():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        stats = []
+        hooks = get_hooks("pkg1", stats_callback=stats.append)
+        hooks.call_hooks(
+            [("get_requires_for_build_wheel", {}), ("get_requires_for_build_sdist", {})]
+        )
+
+        first, second = stats
+        assert "interpreter_startup" in first.timings
+        assert "total" in first.timings
+        # The backend is only imported once per subprocess
+        assert "import_backend" in first.timings
+        assert list(second.timings) == ["hook"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="No resource module on Windows")
+def test_stats_resource_usage():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        stats = []
+        hooks = get_hooks("pkg1", stats_callback=stats.append)
+        hooks.call_hooks(
+            [("get_requires_for_build_wheel", {}), ("get_requires_for_build_sdist", {})]
+        )
+
+        first, second = stats
+        assert set(first.resource_usage) == {
+            "user_time",
+            "system_time",
+            "max_rss",
+            "block_input",
+            "block_output",
+            "voluntary_context_switches",
+            "involuntary_context_switches",
+        }
+        assert all(v >= 0 for v in first.resource_usage.values())
+        # Starting Python is counted in the first call
+        assert (
+            first.resource_usage["user_time"] + first.resource_usage["system_time"] > 0
+        )
+        assert first.resource_usage["max_rss"] > 1024 * 1024
+        assert second.resource_usage["max_rss"] >= first.resource_usage["max_rss"]
+
+
+def test_fast_start():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks = get_hooks("pkg-process")
+        no_site, no_user_site, *site_state = hooks.get_requires_for_build_sdist({})
+        assert (no_site, no_user_site) == ("0", "0")
+
+        hooks = get_hooks("pkg-process", fast_start=True)
+        (
+            fast_no_site,
+            fast_no_user_site,
+            *fast_site_state,
+        ) = hooks.get_requires_for_build_sdist({})
+        # The user site directory is still used, as without fast_start
+        assert (fast_no_site, fast_no_user_site) == ("1", "0")
+        # The prefix, install path and sys.path are the same as with site
+        assert fast_site_state == site_state
+        assert BUILDSYS_PKGS in fast_site_state
+
+
+def test_fast_start_venv():
+    # Before Python 3.11, site sets sys.prefix to the virtual environment
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        venv_dir = pjoin(td, "venv")
+        venv.create(venv_dir, symlinks=os.name != "nt")
+        bin_dir = "Scripts" if os.name == "nt" else "bin"
+        python = pjoin(venv_dir, bin_dir, "python")
+        hooks = get_hooks("pkg-process", python_executable=python)
+        expected = hooks.get_requires_for_build_sdist({})[2:]
+        assert expected[0] == venv_dir
+
+        hooks = get_hooks("pkg-process", python_executable=python, fast_start=True)
+        assert hooks.get_requires_for_build_sdist({})[2:] == expected
+
+        # Directories added by .pth files installed since the last call are used
+        purelib = expected[1]
+        extra_dir = pjoin(td, "extra")
+        os.mkdir(extra_dir)
+        with open(pjoin(purelib, "extra.pth"), "w") as f:
+            f.write(f"{extra_dir}\n")
+        assert extra_dir in hooks.get_requires_for_build_sdist({})
+
+
+def test_fast_start_backend_path():
+    hooks = BuildBackendHookCaller(
+        pjoin(SAMPLES_DIR, "pkg_intree"), "intree_backend", ["backend"], fast_start=True
+    )
+    assert hooks.get_requires_for_build_sdist({}) == ["intree_backend_called"]
+
+
+def test_private_environ_not_inherited():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks = get_hooks("pkg-process", profile_imports=True, fast_start=True)
+        # The backend calls a hook itself, without profile_imports
+        assert hooks.get_requires_for_build_wheel({"nested": True}) == ["None"]
+
+
+def test_profile_imports():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        stats = []
+        hooks = get_hooks("pkg1", profile_imports=True, stats_callback=stats.append)
+        assert hooks.get_requires_for_build_wheel({}) == ["wheelwright"]
+
+        (call_stats,) = stats
+        assert "profile_imports" in call_stats.timings
+        profile = call_stats.import_profile
+        assert profile["module"] == "buildsys"
+        assert "zipfile" in [child["module"] for child in profile["children"]]
+        assert profile["cumulative"] >= sum(
+            c["cumulative"] for c in profile["children"]
+        )
+
+
+def test_streaming_runner():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        lines = []
+        runner = StreamingSubprocessRunner(on_line=lines.append)
+        hooks = get_hooks("pkg-process", runner=runner)
+        hooks.get_requires_for_build_wheel({"print_lines": 3})
+        assert lines == ["line 0", "line 1", "line 2"]
+
+
+def test_streaming_runner_tail():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        runner = StreamingSubprocessRunner(tail_size=100)
+        hooks = get_hooks("pkg-process", runner=runner)
+        with pytest.raises(CalledProcessError) as exc_info:
+            hooks.get_requires_for_build_wheel({"print_lines": 10000, "crash": True})
+
+        assert exc_info.value.returncode == 3
+        output = exc_info.value.output
+        assert len(output) == 100
+        assert output.endswith(b"line 9999" + os.linesep.encode())
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Can't pass file descriptors on Windows")
+def test_streaming_runner_pipe_transport():
+    hooks = get_hooks("pkg1", runner=StreamingSubprocessRunner(), pipe_transport=True)
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with patch("tempfile.TemporaryDirectory", None):
+            assert hooks.get_requires_for_build_wheel({}) == ["wheelwright"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Can't pass file descriptors on Windows")
+@pytest.mark.parametrize("pipe_transport", [False, True])
+def test_progress_events(pipe_transport):
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        events = []
+        hooks = BuildBackendHookCaller(
+            pjoin(SAMPLES_DIR, "pkg1"),
+            "buildsys_progress",
+            progress_callback=events.append,
+            pipe_transport=pipe_transport,
+        )
+        with pytest.warns(BuildBackendWarning, match="halfway there"):
+            assert hooks.get_requires_for_build_wheel({}) == ["progress-bar"]
+
+        assert [e["type"] for e in events] == ["progress", "warning", "progress"]
+        assert events[0]["step"] == 1
+        assert events[1]["message"] == "halfway there"
+
+
+def test_progress_events_runner_without_pass_fds():
+    def runner(cmd, cwd=None, extra_environ=None):
+        assert extra_environ["PYPROJECT_HOOKS_PROGRESS_FD"] == ""
+        default_subprocess_runner(cmd, cwd, extra_environ)
+
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        events = []
+        hooks = BuildBackendHookCaller(
+            pjoin(SAMPLES_DIR, "pkg1"),
+            "buildsys_progress",
+            runner=runner,
+            progress_callback=events.append,
+        )
+        with pytest.warns(BuildBackendWarning, match="halfway there"):
+            hooks.get_requires_for_build_wheel({})
+        assert events == []
+
+
+def test_progress_fd_from_outer_call():
+    # e.g. a backend running pip, which calls hooks without a progress_callback
+    hooks = BuildBackendHookCaller(pjoin(SAMPLES_DIR, "pkg1"), "buildsys_progress")
+    with modified_env(
+        {"PYTHONPATH": BUILDSYS_PKGS, "PYPROJECT_HOOKS_PROGRESS_FD": "99"}
+    ):
+        with pytest.warns(BuildBackendWarning, match="halfway there"):
+            assert hooks.get_requires_for_build_wheel({}) == ["progress-bar"]
+
+
+@pytest.mark.parametrize("fd", ["99", "not-a-number"])
+def test_progress_fd_not_a_pipe(fd):
+    def runner(cmd, cwd=None, extra_environ=None):
+        extra_environ = dict(extra_environ, PYPROJECT_HOOKS_PROGRESS_FD=fd)
+        quiet_subprocess_runner(cmd, cwd, extra_environ)
+
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks = BuildBackendHookCaller(
+            pjoin(SAMPLES_DIR, "pkg1"), "buildsys_progress", runner=runner
+        )
+        with pytest.warns(BuildBackendWarning, match="halfway there"):
+            assert hooks.get_requires_for_build_wheel({}) == ["progress-bar"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Can't pass file descriptors on Windows")
+def test_progress_callback_error():
+    def callback(event):
+        raise ValueError("Bad event")
+
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks = BuildBackendHookCaller(
+            pjoin(SAMPLES_DIR, "pkg1"), "buildsys_progress", progress_callback=callback
+        )
+        with pytest.raises(ValueError, match="Bad event"):
+            hooks.get_requires_for_build_wheel({})
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    try:
+        # It may be a zombie, which no one has waited for yet
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return True
+
+
+def _assert_killed(pid_file):
+    with open(pid_file) as f:
+        pid = int(f.read())
+    for _ in range(100):
+        if not _running(pid):
+            return
+        time.sleep(0.05)
+    pytest.fail(f"Subprocess {pid} is still running")
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Uses process groups")
+@pytest.mark.parametrize(
+    "runner",
+    [default_subprocess_runner, quiet_subprocess_runner, StreamingSubprocessRunner()],
+)
+def test_timeout(runner):
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        hooks = get_hooks("pkg-process", runner=runner, timeout=1)
+        pid_file = pjoin(td, "pid")
+        config = {"print_lines": 2, "hang": pid_file}
+        with pytest.raises(HookTimeout) as exc:
+            hooks.get_requires_for_build_wheel(config)
+        assert exc.value.hook_name == "get_requires_for_build_wheel"
+        assert exc.value.timeout == 1
+        assert 1 <= exc.value.elapsed < 30
+        if runner is not default_subprocess_runner:
+            assert b"line 1" in exc.value.output
+        _assert_killed(pid_file)
+
+        # The caller isn't left with a timeout
+        assert len(hooks.get_requires_for_build_wheel({})) == 2
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Uses process groups")
+def test_timeout_custom_runner():
+    def runner(cmd, cwd=None, extra_environ=None):
+        env = dict(os.environ, **(extra_environ or {}))
+        proc = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True)
+        if proc.returncode:
+            raise CalledProcessError(proc.returncode, cmd, output=proc.stdout)
+
+    hooks = get_hooks("pkg-process", runner=runner)
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        pid_file = pjoin(td, "pid")
+        with hooks.hook_timeout(1):
+            with pytest.raises(HookTimeout) as exc:
+                hooks.get_requires_for_build_wheel({"hang": pid_file})
+        assert exc.value.output == b""
+        _assert_killed(pid_file)
+    assert hooks.timeout is None
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Uses process groups")
+def _wait_for_pid_file(pid_file):
+    while not os.path.exists(pid_file) or not os.path.getsize(pid_file):
+        time.sleep(0.05)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Uses process groups")
+def test_timeout_hook_process_killed():
+    # Like subprocess.call, the runner kills the process when interrupted
+    def runner(cmd, cwd=None, extra_environ=None):
+        env = dict(os.environ, **(extra_environ or {}))
+        with subprocess.Popen(cmd, cwd=cwd, env=env) as proc:
+            _wait_for_pid_file(pid_file)
+            proc.kill()
+        raise KeyboardInterrupt
+
+    hooks = get_hooks("pkg-process", runner=runner, timeout=30)
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        pid_file = pjoin(td, "pid")
+        with pytest.raises(KeyboardInterrupt):
+            hooks.get_requires_for_build_wheel({"hang": pid_file})
+        # The backend's subprocess doesn't outlive the hook process
+        _assert_killed(pid_file)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Uses process groups")
+def test_timeout_streaming_runner_interrupted():
+    def on_line(line):
+        _wait_for_pid_file(pid_file)
+        raise KeyboardInterrupt
+
+    runner = StreamingSubprocessRunner(on_line=on_line)
+    hooks = get_hooks("pkg-process", runner=runner, timeout=30)
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        pid_file = pjoin(td, "pid")
+        with pytest.raises(KeyboardInterrupt):
+            hooks.get_requires_for_build_wheel({"print_lines": 1, "hang": pid_file})
+        _assert_killed(pid_file)
+
+
+def test_timeout_not_reached():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks = get_hooks("pkg-process", timeout=30)
+        pid, _ = hooks.get_requires_for_build_wheel({})
+        assert pid != str(os.getpid())
+        # Other failures are reported as usual
+        with pytest.raises(CalledProcessError):
+            hooks.get_requires_for_build_wheel({"crash": True})
+        assert hooks.call_hooks([("get_requires_for_build_wheel", {})])[0][0] != pid
+
+
+@pytest.mark.skipif(os.name == "nt", reason="No resource limits on Windows")
+@pytest.mark.parametrize(
+    "limits, config",
+    [
+        ({"address_space": 512 * 1024**2}, {"allocate": 1024**3}),
+        ({"open_files": 64}, {"open_files": 100}),
+    ],
+)
+def test_resource_limits(limits, config):
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks = get_hooks("pkg-process", resource_limits=limits)
+        ((limit, value),) = limits.items()
+        with pytest.raises(ResourceLimitExceeded) as exc:
+            hooks.get_requires_for_build_wheel(config)
+        assert exc.value.hook_name == "get_requires_for_build_wheel"
+        assert exc.value.limit == limit
+        assert exc.value.value == value
+        assert exc.value.traceback
+
+        # Hooks which stay under the limit work
+        assert len(hooks.get_requires_for_build_wheel({})) == 2
+
+
+@pytest.mark.skipif(os.name == "nt", reason="No resource limits on Windows")
+def test_resource_limits_cpu_time():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks = get_hooks("pkg-process", runner=quiet_subprocess_runner)
+        with hooks.limit_resources(cpu_time=1):
+            with pytest.raises(ResourceLimitExceeded) as exc:
+                hooks.get_requires_for_build_wheel({"spin": 5, "print_lines": 1})
+        assert exc.value.limit == "cpu_time"
+        assert b"line 0" in exc.value.output
+        assert hooks.resource_limits == {}
+
+
+def test_resource_limits_invalid():
+    with pytest.raises(ValueError, match="Unknown resource limit"):
+        get_hooks("pkg1", resource_limits={"memory": 1})
+    with pytest.raises(ValueError, match="positive integer"):
+        get_hooks("pkg1", resource_limits={"cpu_time": 0.5})
+
+
+def counting_runner(calls):
+    def runner(cmd, cwd=None, extra_environ=None):
+        calls.append(cmd[-2])  # The hook name
+        default_subprocess_runner(cmd, cwd, extra_environ)
+
+    return runner
+
+
+@pytest.mark.parametrize("speculative", [False, True])
+def test_requires_and_metadata_satisfied(speculative):
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        calls = []
+        hooks = get_hooks(
+            "pkg2", runner=counting_runner(calls), speculative_metadata=speculative
+        )
+        installed = []
+        requires, distinfo = hooks.get_requires_and_metadata_for_build_wheel(
+            td, lambda reqs: True, installed.append
+        )
+        assert requires == []
+        assert installed == []
+        assert_isfile(pjoin(td, distinfo, "METADATA"))
+        if speculative:
+            assert calls == ["_batch"]
+            # Only the metadata, and the wheel built for it, are left
+            assert sorted(os.listdir(td)) == sorted(
+                [
+                    distinfo,
+                    "PYPROJECT_HOOKS_ALREADY_BUILT_WHEEL",
+                    "pkg2-0.5-py2.py3-none-any.whl",
+                ]
+            )
+        else:
+            assert calls == [
+                "get_requires_for_build_wheel",
+                "prepare_metadata_for_build_wheel",
+            ]
+
+        # The wheel built by the metadata fallback is reused
+        wheel_dir = pjoin(td, "wheel")
+        os.mkdir(wheel_dir)
+        hooks.build_wheel(wheel_dir, {}, pjoin(td, distinfo))
+        assert_isfile(pjoin(wheel_dir, "pkg2-0.5-py2.py3-none-any.whl"))
+
+
+def test_requires_and_metadata_not_satisfied():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        calls = []
+        hooks = get_hooks(
+            "pkg2", runner=counting_runner(calls), speculative_metadata=True
+        )
+        installed = []
+        requires, distinfo = hooks.get_requires_and_metadata_for_build_wheel(
+            td, lambda reqs: False, installed.append
+        )
+        assert installed == [[]]
+        # The speculative metadata is thrown away, and made again
+        assert calls == ["_batch", "prepare_metadata_for_build_wheel"]
+        assert_isfile(pjoin(td, distinfo, "METADATA"))
+        assert not [n for n in os.listdir(td) if n.startswith(".speculative")]
+
+
+def test_requires_and_metadata_error():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        calls = []
+        # This backend has no build_wheel for the metadata fallback
+        hooks = get_hooks(
+            "pkg-process", runner=counting_runner(calls), speculative_metadata=True
+        )
+        installed = []
+        with pytest.raises(CalledProcessError):
+            hooks.get_requires_and_metadata_for_build_wheel(
+                td, lambda reqs: True, installed.append
+            )
+        # After the metadata hook fails in the batch, it's called again by itself,
+        # without installing the requirements, which were satisfied
+        assert calls == ["_batch", "prepare_metadata_for_build_wheel"]
+        assert installed == []
+
+
+def test_requires_and_metadata_crash():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        calls = []
+        hooks = get_hooks(
+            "pkg-process", runner=counting_runner(calls), speculative_metadata=True
+        )
+        with pytest.raises(CalledProcessError):
+            hooks.get_requires_and_metadata_for_build_wheel(
+                td, lambda reqs: True, lambda reqs: None, {"crash": True}
+            )
+        # After the batch crashes, the hooks are called one at a time
+        assert calls == ["_batch", "get_requires_for_build_wheel"]
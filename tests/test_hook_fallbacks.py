@@ -1,22 +1,13 @@
-from os.path import abspath, dirname
+import os
 from os.path import join as pjoin
+from subprocess import STDOUT, check_output
 
 import pytest
 from testpath import assert_isfile, modified_env
 from testpath.tempdir import TemporaryDirectory
 
-from pyproject_hooks import BuildBackendHookCaller, HookMissing
-from tests.compat import tomllib
-
-SAMPLES_DIR = pjoin(dirname(abspath(__file__)), "samples")
-BUILDSYS_PKGS = pjoin(SAMPLES_DIR, "buildsys_pkgs")
-
-
-def get_hooks(pkg):
-    source_dir = pjoin(SAMPLES_DIR, pkg)
-    with open(pjoin(source_dir, "pyproject.toml"), "rb") as f:
-        data = tomllib.load(f)
-    return BuildBackendHookCaller(source_dir, data["build-system"]["build-backend"])
+from pyproject_hooks import HookMissing
+from tests.helpers import BUILDSYS_PKGS, get_hooks
 
 
 def test_get_requires_for_build_wheel():
@@ -99,3 +90,63 @@ def test_prepare_metadata_for_build_editable_no_fallback():
             e = exc_info.value
             assert "prepare_metadata_for_build_editable" == e.hook_name
             assert "prepare_metadata_for_build_editable" in str(e)
+
+
+def test_call_hooks_fallback_chain():
+    hooks = get_hooks("pkg2")
+    with TemporaryDirectory() as metadatadir, TemporaryDirectory() as builddir:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            distinfo, missing = hooks.call_hooks(
+                [
+                    (
+                        "prepare_metadata_for_build_wheel",
+                        {"metadata_directory": metadatadir},
+                    ),
+                    ("build_editable", {"wheel_directory": builddir}),
+                ]
+            )
+            (whl,) = hooks.call_hooks(
+                [
+                    (
+                        "build_wheel",
+                        {
+                            "wheel_directory": builddir,
+                            "metadata_directory": pjoin(metadatadir, distinfo),
+                        },
+                    )
+                ]
+            )
+        assert_isfile(pjoin(metadatadir, distinfo, "METADATA"))
+        assert_isfile(pjoin(builddir, whl))
+        assert isinstance(missing, HookMissing)
+
+
+def test_fallback_wheel_handoff_stats():
+    stats = []
+    hooks = get_hooks("pkg2", stats_callback=stats.append)
+    with TemporaryDirectory() as metadatadir, TemporaryDirectory() as builddir:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            distinfo = hooks.prepare_metadata_for_build_wheel(metadatadir, {})
+            hooks.build_wheel(builddir, {}, pjoin(metadatadir, distinfo))
+
+    assert [s.hook_name for s in stats] == [
+        "prepare_metadata_for_build_wheel",
+        "build_wheel",
+    ]
+    assert stats[0].wheel_handoff is None
+    assert stats[1].wheel_handoff in ("hardlink", "reflink", "copy")
+
+
+def test_fallback_wheel_handoff_is_quiet():
+    outputs = []
+
+    def runner(cmd, cwd=None, extra_environ=None):
+        env = dict(os.environ, **(extra_environ or {}))
+        outputs.append(check_output(cmd, cwd=cwd, env=env, stderr=STDOUT))
+
+    hooks = get_hooks("pkg2", runner=runner)
+    with TemporaryDirectory() as metadatadir, TemporaryDirectory() as builddir:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            distinfo = hooks.prepare_metadata_for_build_wheel(metadatadir, {})
+            hooks.build_wheel(builddir, {}, pjoin(metadatadir, distinfo))
+    assert outputs[1] == b""
@@ -0,0 +1,61 @@
+import subprocess
+import sys
+
+import pytest
+
+import pyproject_hooks
+
+
+def modules_imported_by(code):
+    # Only sys is imported first, so the other modules count if code needs them
+    script = (
+        "import sys\n"
+        "before = set(sys.modules)\n"
+        f"{code}\n"
+        "print(' '.join(sorted(set(sys.modules) - before)))\n"
+    )
+    out = subprocess.check_output([sys.executable, "-c", script], text=True)
+    return out.split()
+
+
+def test_import_is_lazy():
+    # Importing the package used to import asyncio, subprocess, tempfile, json
+    # and more, which tools that don't call hooks shouldn't pay for.
+    imported = modules_imported_by("import pyproject_hooks")
+    assert imported == ["pyproject_hooks"]
+
+
+def test_names_imported_when_used():
+    imported = modules_imported_by("from pyproject_hooks import HookMissing")
+    assert "pyproject_hooks._impl" in imported
+    assert "asyncio" not in imported
+
+
+def test_hook_caller_import_is_lazy():
+    # Caches, workers, tracing and resource limits are only imported when used
+    imported = modules_imported_by("from pyproject_hooks import BuildBackendHookCaller")
+    for name in [
+        "inspect",
+        "socket",
+        "hashlib",
+        "pyproject_hooks._cache",
+        "pyproject_hooks._limits",
+        "pyproject_hooks._trace",
+        "pyproject_hooks._worker",
+    ]:
+        assert name not in imported
+
+
+def test_public_names():
+    from pyproject_hooks._impl import BackendUnavailable, BuildBackendHookCaller
+
+    assert pyproject_hooks.BuildBackendHookCaller is BuildBackendHookCaller
+    assert pyproject_hooks.BackendInvalid is BackendUnavailable
+    for name in pyproject_hooks.__all__:
+        assert getattr(pyproject_hooks, name) is not None
+        assert name in dir(pyproject_hooks)
+
+
+def test_unknown_name():
+    with pytest.raises(AttributeError, match="no attribute 'NoSuchHook'"):
+        pyproject_hooks.NoSuchHook  # noqa: B018
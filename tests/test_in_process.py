@@ -0,0 +1,128 @@
+"""Tests for helper functions in the _in_process script."""
+import os
+import zipfile
+from os.path import join as pjoin
+from unittest.mock import patch
+
+import pytest
+from testpath import assert_not_path_exists
+from testpath.tempdir import TemporaryDirectory
+
+from pyproject_hooks._in_process import _in_process
+
+
+def make_wheel(path, names):
+    with zipfile.ZipFile(path, "w") as zf:
+        for name in names:
+            zf.writestr(name, "")
+
+
+def test_metadata_from_wheel():
+    whl = "foo_bar-1.0-py3-none-any.whl"
+    with TemporaryDirectory() as td:
+        make_wheel(
+            pjoin(td, whl),
+            [
+                "foo_bar/__init__.py",
+                "foo_bar-1.0.dist-info/METADATA",
+                "foo_bar-1.0.dist-info/WHEEL",
+                "foo_bar-1.0.dist-info/licenses/LICENSE",
+                "foo_bar-1.0.dist-info/RECORD",
+            ],
+        )
+        distinfo = _in_process._get_wheel_metadata_from_wheel(whl, td, {})
+        assert distinfo == "foo_bar-1.0.dist-info"
+        distinfo_dir = pjoin(td, distinfo)
+        extracted = {
+            os.path.relpath(pjoin(root, name), distinfo_dir).replace("\\", "/")
+            for root, _, files in os.walk(distinfo_dir)
+            for name in files
+        }
+        assert extracted == {"METADATA", "WHEEL", "RECORD", "licenses/LICENSE"}
+        assert_not_path_exists(pjoin(td, "foo_bar"))
+
+
+def test_dist_info_not_named_like_wheel():
+    # Older tools didn't always normalise the names the same way
+    with TemporaryDirectory() as td:
+        make_wheel(pjoin(td, "x.whl"), ["Foo.Bar-1.0.dist-info/METADATA"])
+        with zipfile.ZipFile(pjoin(td, "x.whl")) as zf:
+            assert (
+                _in_process._dist_info_dir(zf, "foo_bar-1.0-py3-none-any.whl")
+                == "Foo.Bar-1.0.dist-info/"
+            )
+
+
+def test_unsafe_dist_info_path():
+    whl = "foo-1.0-py3-none-any.whl"
+    with TemporaryDirectory() as td:
+        make_wheel(
+            pjoin(td, whl), ["foo-1.0.dist-info/METADATA", "foo-1.0.dist-info/../x"]
+        )
+        with pytest.raises(Exception, match="Unsafe path"):
+            _in_process._get_wheel_metadata_from_wheel(whl, td, {})
+
+
+@pytest.fixture
+def prebuilt_wheel():
+    """Make a wheel, and an empty directory to hand it over to."""
+    with TemporaryDirectory() as td:
+        os.mkdir(pjoin(td, "metadata"))
+        os.mkdir(pjoin(td, "wheels"))
+        whl = pjoin(td, "metadata", "foo-1.0-py3-none-any.whl")
+        with open(whl, "wb") as f:
+            f.write(b"wheel data")
+        _in_process._call_info.clear()
+        yield whl, pjoin(td, "wheels")
+
+
+def test_hand_over_prebuilt_wheel_hardlink(prebuilt_wheel):
+    src, wheel_dir = prebuilt_wheel
+    whl = _in_process._hand_over_prebuilt_wheel(src, wheel_dir)
+    assert whl == os.path.basename(src)
+    assert _in_process._call_info["wheel_handoff"] == "hardlink"
+    assert os.path.samefile(src, pjoin(wheel_dir, whl))
+
+    # Handing it over again is a no-op
+    _in_process._hand_over_prebuilt_wheel(src, wheel_dir)
+    assert _in_process._call_info["wheel_handoff"] == "none"
+
+
+def test_hand_over_prebuilt_wheel_copy(prebuilt_wheel):
+    def no_link(src, dst):
+        raise OSError("Hard links not supported")
+
+    src, wheel_dir = prebuilt_wheel
+    with patch.object(os, "link", no_link), patch.object(
+        _in_process, "_reflink", lambda src, dst: False
+    ):
+        whl = _in_process._hand_over_prebuilt_wheel(src, wheel_dir)
+    assert _in_process._call_info["wheel_handoff"] == "copy"
+    with open(pjoin(wheel_dir, whl), "rb") as f:
+        assert f.read() == b"wheel data"
+    assert not os.path.samefile(src, pjoin(wheel_dir, whl))
+
+
+def test_parse_import_times():
+    lines = [
+        "import time: self [us] | cumulative | imported package",
+        "import time:       100 |        100 |     _b_inner",
+        "import time:       200 |        300 |   b",
+        "import time:        50 |         50 |   c",
+        "Some other output",
+        "import time:      1000 |       1350 | backend",
+        "import time:        10 |         10 | late",
+    ]
+    (backend, late) = _in_process._parse_import_times(lines)
+    assert backend["module"] == "backend"
+    assert backend["self"] == pytest.approx(0.001)
+    assert backend["cumulative"] == pytest.approx(0.00135)
+    assert [c["module"] for c in backend["children"]] == ["b", "c"]
+    (b_inner,) = backend["children"][0]["children"]
+    assert b_inner == {
+        "module": "_b_inner",
+        "self": pytest.approx(0.0001),
+        "cumulative": pytest.approx(0.0001),
+        "children": [],
+    }
+    assert late["children"] == []
@@ -1,5 +1,4 @@
 from inspect import cleandoc
-from os.path import abspath, dirname
 from os.path import join as pjoin
 from pathlib import Path
 
@@ -9,9 +8,8 @@ from testpath.tempdir import TemporaryDirectory
 
 from pyproject_hooks import BackendUnavailable, BuildBackendHookCaller
 from tests.compat import tomllib
+from tests.helpers import BUILDSYS_PKGS, SAMPLES_DIR
 
-SAMPLES_DIR = pjoin(dirname(abspath(__file__)), "samples")
-BUILDSYS_PKGS = pjoin(SAMPLES_DIR, "buildsys_pkgs")
 SOURCE_DIR = pjoin(SAMPLES_DIR, "pkg1")
 
 
@@ -0,0 +1,125 @@
+import threading
+import time
+from os.path import join as pjoin
+
+import pytest
+from testpath import modified_env
+from testpath.tempdir import TemporaryDirectory
+
+from pyproject_hooks import MemoryAdmission, default_subprocess_runner
+from pyproject_hooks._limits import (
+    _read_meminfo,
+    _read_memory_pressure,
+    check_resource_limits,
+)
+from tests.helpers import BUILDSYS_PKGS, get_hooks
+
+
+class FakeMemory(MemoryAdmission):
+    def __init__(self, available, pressure=None, **kwargs):
+        super().__init__(poll_interval=0.01, **kwargs)
+        self.available = available
+        self.pressure = pressure
+
+    def available_memory(self):
+        return self.available
+
+    def memory_pressure(self):
+        return self.pressure
+
+
+def start_admitted(admission, started, finish):
+    def run():
+        with admission.admit():
+            started.set()
+            finish.wait()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_admission_always_starts_one():
+    admission = FakeMemory(available=0, min_available=1024)
+    with admission.admit():
+        assert admission.running == 1
+    assert admission.running == 0
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"available": 100, "min_available": 1024},
+        # Enough memory, but not with what the running call is expected to use
+        {"available": 2000, "min_available": 1024, "reserve": 1024},
+        {"available": None, "pressure": 30.0, "max_pressure": 10.0},
+    ],
+)
+def test_admission_waits(kwargs):
+    admission = FakeMemory(**kwargs)
+    first_started, second_started = threading.Event(), threading.Event()
+    finish_first, finish_second = threading.Event(), threading.Event()
+    first = start_admitted(admission, first_started, finish_first)
+    assert first_started.wait(5)
+    second = start_admitted(admission, second_started, finish_second)
+
+    time.sleep(0.1)
+    assert not second_started.is_set()
+    finish_first.set()
+    assert second_started.wait(5)
+    finish_second.set()
+    first.join()
+    second.join()
+    assert admission.running == 0
+
+
+def test_admission_enough_memory():
+    admission = FakeMemory(available=4096, min_available=1024, reserve=1024)
+    with admission.admit(), admission.admit():
+        assert admission.running == 2
+
+
+def test_read_meminfo():
+    with TemporaryDirectory() as td:
+        meminfo = pjoin(td, "meminfo")
+        with open(meminfo, "w") as f:
+            f.write("MemTotal:       16000000 kB\nMemAvailable:    8000000 kB\n")
+        assert _read_meminfo(meminfo) == 8000000 * 1024
+        assert _read_meminfo(pjoin(td, "missing")) is None
+
+
+def test_read_memory_pressure():
+    with TemporaryDirectory() as td:
+        pressure = pjoin(td, "memory")
+        with open(pressure, "w") as f:
+            f.write(
+                "some avg10=12.50 avg60=3.00 avg300=1.00 total=123\n"
+                "full avg10=1.00 avg60=0.50 avg300=0.10 total=45\n"
+            )
+        assert _read_memory_pressure(pressure) == 12.5
+        assert _read_memory_pressure(pjoin(td, "missing")) is None
+
+
+def test_check_resource_limits():
+    assert check_resource_limits({"open_files": 10}) == {"open_files": 10}
+    with pytest.raises(ValueError):
+        check_resource_limits({"open_files": True})
+
+
+def test_hook_caller_admission():
+    admission = FakeMemory(available=0)
+    running = []
+    hooks = get_hooks(
+        "pkg1",
+        admission=admission,
+        runner=lambda *args, **kwargs: (
+            running.append(admission.running),
+            default_subprocess_runner(*args, **kwargs),
+        ),
+    )
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks.get_requires_for_build_wheel({})
+        hooks.call_hooks([("get_requires_for_build_sdist", {})])
+    # Each subprocess is counted as running while it runs
+    assert running == [1, 1]
+    assert admission.running == 0
@@ -0,0 +1,317 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join as pjoin
+from subprocess import CalledProcessError
+from unittest.mock import patch
+
+import pytest
+from testpath import assert_isfile, modified_env
+from testpath.tempdir import TemporaryDirectory
+
+from pyproject_hooks import (
+    BackendUnavailable,
+    BuildBackendWarning,
+    HookForkServer,
+    HookMissing,
+    HookTimeout,
+    HookWorkerPool,
+    ResourceLimitExceeded,
+    UnsupportedOperation,
+)
+from pyproject_hooks._worker import FORK_SERVER_SUPPORTED, _HookWorker
+from tests import helpers
+from tests.helpers import BUILDSYS_PKGS
+
+
+def get_hooks(pkg, **kwargs):
+    kwargs.setdefault("persistent_worker", True)
+    return helpers.get_hooks(pkg, **kwargs)
+
+
+def test_hooks_share_one_process():
+    with get_hooks("pkg-process") as hooks:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            first = hooks.get_requires_for_build_wheel({})
+        # The worker keeps the environment it was started with
+        second = hooks.get_requires_for_build_wheel({})
+    assert first == second
+    assert first[0] != str(os.getpid())
+
+
+def test_hook_chain():
+    with get_hooks("pkg2") as hooks, TemporaryDirectory() as td:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            assert hooks.get_requires_for_build_wheel({}) == []
+            metadata_dir = pjoin(td, "metadata")
+            os.mkdir(metadata_dir)
+            distinfo = hooks.prepare_metadata_for_build_wheel(metadata_dir, {})
+            assert_isfile(pjoin(metadata_dir, distinfo, "METADATA"))
+            whl = hooks.build_wheel(td, {}, pjoin(metadata_dir, distinfo))
+        assert_isfile(pjoin(td, whl))
+
+
+def test_errors():
+    with get_hooks("pkg1") as hooks, TemporaryDirectory() as td:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            with pytest.raises(UnsupportedOperation):
+                hooks.build_sdist(td, {"test_unsupported": True})
+            assert hooks.get_requires_for_build_sdist({}) == ["frog"]
+
+    with get_hooks("pkg2") as hooks, TemporaryDirectory() as td:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            with pytest.raises(HookMissing):
+                hooks.prepare_metadata_for_build_wheel(td, {}, _allow_fallback=False)
+
+    with get_hooks("pkg1") as hooks:
+        with modified_env({"PYTHONPATH": ""}):
+            with pytest.raises(BackendUnavailable):
+                hooks.get_requires_for_build_wheel({})
+
+
+def test_warnings_from_each_call():
+    with get_hooks("pkg-with-warnings") as hooks:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            for _ in range(2):
+                with pytest.warns(BuildBackendWarning, match="my example warning"):
+                    hooks.get_requires_for_build_wheel({})
+
+
+def test_restart_after_crash():
+    with get_hooks("pkg-process") as hooks:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            first = hooks.get_requires_for_build_wheel({})
+            with pytest.raises(CalledProcessError) as exc:
+                hooks.get_requires_for_build_wheel({"crash": True})
+            assert exc.value.returncode == 3
+            second = hooks.get_requires_for_build_wheel({})
+    assert first != second
+
+
+def test_restart_after_idle_death():
+    with get_hooks("pkg-process") as hooks:
+        with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+            first = hooks.get_requires_for_build_wheel({})
+            hooks._worker._proc.kill()
+            hooks._worker._proc.wait()
+            second = hooks.get_requires_for_build_wheel({})
+    assert first != second
+
+
+def test_pool_shares_workers_between_callers():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        with HookWorkerPool(max_workers=2) as pool:
+            hooks1 = get_hooks("pkg-process", worker_pool=pool)
+            hooks2 = get_hooks("pkg-process", source_dir=td, worker_pool=pool)
+            pid1, cwd1 = hooks1.get_requires_for_build_wheel({})
+            pid2, cwd2 = hooks2.get_requires_for_build_wheel({})
+        assert pid1 == pid2
+        assert cwd1 == hooks1.source_dir
+        assert cwd2 == hooks2.source_dir
+
+
+def test_pool_max_calls_per_worker():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with HookWorkerPool(max_calls_per_worker=2) as pool:
+            hooks = get_hooks("pkg-process", worker_pool=pool)
+            pids = [hooks.get_requires_for_build_wheel({})[0] for _ in range(3)]
+        assert pids[0] == pids[1] != pids[2]
+
+
+def test_pool_size_limit():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with HookWorkerPool(max_workers=1) as pool:
+            hooks1 = get_hooks("pkg-process", worker_pool=pool)
+            hooks2 = get_hooks("pkg1", worker_pool=pool)
+            pid = hooks1.get_requires_for_build_wheel({})[0]
+            assert hooks2.get_requires_for_build_wheel({}) == ["wheelwright"]
+            # The idle worker for the other backend was stopped to make room
+            assert hooks1.get_requires_for_build_wheel({})[0] != pid
+            assert pool._n_workers == 1
+
+
+def test_pool_idle_timeout():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with HookWorkerPool(idle_timeout=0) as pool:
+            hooks = get_hooks("pkg-process", worker_pool=pool)
+            pid = hooks.get_requires_for_build_wheel({})[0]
+            assert hooks.get_requires_for_build_wheel({})[0] != pid
+
+
+def test_pool_prestart():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with HookWorkerPool() as pool:
+            hooks = get_hooks("pkg-process", worker_pool=pool)
+            pool.prestart(hooks.python_executable, hooks.build_backend)
+            (worker,) = pool._idle[(hooks.python_executable, "buildsys_process", None)]
+            pid = hooks.get_requires_for_build_wheel({})[0]
+            assert pid == str(worker._proc.pid)
+
+
+def test_pool_stops_workers_without_lock():
+    lock_free = []
+
+    def try_lock():
+        if pool._cond.acquire(timeout=5):
+            pool._cond.release()
+            return True
+        return False
+
+    def close(worker):
+        # Another thread can take the pool's lock while a worker stops
+        with ThreadPoolExecutor(1) as executor:
+            lock_free.append(executor.submit(try_lock).result())
+        original_close(worker)
+
+    original_close = _HookWorker.close
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with patch.object(_HookWorker, "close", close):
+            with HookWorkerPool(max_workers=1, max_calls_per_worker=1) as pool:
+                hooks1 = get_hooks("pkg-process", worker_pool=pool)
+                hooks2 = get_hooks("pkg1", worker_pool=pool)
+                hooks1.get_requires_for_build_wheel({})  # Retired after one call
+                pool.prestart(hooks1.python_executable, hooks1.build_backend)
+                hooks2.get_requires_for_build_wheel({})  # Stops the idle worker
+    assert lock_free == [True, True, True]
+
+
+needs_fork = pytest.mark.skipif(
+    not FORK_SERVER_SUPPORTED, reason="The fork server needs os.fork"
+)
+
+
+def get_forked_hooks(pkg, fork_server, **kwargs):
+    return get_hooks(pkg, persistent_worker=False, fork_server=fork_server, **kwargs)
+
+
+@needs_fork
+def test_fork_server_fresh_process_per_call():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        with HookForkServer() as fork_server:
+            hooks1 = get_forked_hooks("pkg-process", fork_server)
+            hooks2 = get_forked_hooks("pkg-process", fork_server, source_dir=td)
+            pid1, cwd1 = hooks1.get_requires_for_build_wheel({})
+            pid2, cwd2 = hooks1.get_requires_for_build_wheel({})
+            pid3, cwd3 = hooks2.get_requires_for_build_wheel({})
+            (zygote,) = fork_server._zygotes.values()
+            zygote_pid = zygote._proc.pid
+        assert len({pid1, pid2, pid3, str(zygote_pid), str(os.getpid())}) == 5
+        assert cwd1 == cwd2 == hooks1.source_dir
+        assert cwd3 == hooks2.source_dir
+
+
+@needs_fork
+def test_fork_server_hook_chain_and_errors():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with HookForkServer() as fork_server, TemporaryDirectory() as td:
+            hooks = get_forked_hooks("pkg2", fork_server)
+            distinfo = hooks.prepare_metadata_for_build_wheel(td, {})
+            whl = hooks.build_wheel(td, {}, pjoin(td, distinfo))
+            assert_isfile(pjoin(td, whl))
+            with pytest.raises(HookMissing):
+                hooks.prepare_metadata_for_build_wheel(td, {}, _allow_fallback=False)
+
+            with pytest.warns(BuildBackendWarning, match="my example warning"):
+                get_forked_hooks(
+                    "pkg-with-warnings", fork_server
+                ).get_requires_for_build_wheel({})
+
+
+@needs_fork
+def test_fork_server_crash():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with HookForkServer() as fork_server:
+            hooks = get_forked_hooks("pkg-process", fork_server)
+            with pytest.raises(CalledProcessError) as exc:
+                hooks.get_requires_for_build_wheel({"crash": True})
+            assert exc.value.returncode == 3
+            (zygote,) = fork_server._zygotes.values()
+            zygote_pid = zygote._proc.pid
+            hooks.get_requires_for_build_wheel({})
+            # The zygote is unaffected
+            assert zygote._proc.pid == zygote_pid
+
+            # If the zygote dies, a new one is started
+            zygote._proc.kill()
+            zygote._proc.wait()
+            hooks.get_requires_for_build_wheel({})
+            assert zygote._proc.pid != zygote_pid
+
+
+@needs_fork
+def test_fork_server_concurrent_calls():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with HookForkServer() as fork_server, ThreadPoolExecutor(4) as executor:
+            hooks = get_forked_hooks("pkg-process", fork_server)
+            fork_server.prestart(hooks.python_executable, hooks.build_backend)
+            futures = [
+                executor.submit(hooks.get_requires_for_build_wheel, {})
+                for _ in range(8)
+            ]
+            pids = {future.result()[0] for future in futures}
+        assert len(pids) == 8
+
+
+@needs_fork
+def test_fork_server_close():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        fork_server = HookForkServer()
+        hooks = get_forked_hooks("pkg-process", fork_server)
+        hooks.get_requires_for_build_wheel({})
+        (zygote,) = fork_server._zygotes.values()
+        proc, socket_dir = zygote._proc, zygote._socket_dir
+        fork_server.close()
+        assert proc.returncode == 0
+        assert not os.path.exists(socket_dir)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Uses process groups")
+def test_worker_timeout():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        with get_hooks("pkg-process", timeout=1) as hooks:
+            first = hooks.get_requires_for_build_wheel({})
+            with pytest.raises(HookTimeout) as exc:
+                hooks.get_requires_for_build_wheel({"hang": pjoin(td, "pid")})
+            assert exc.value.elapsed >= 1
+            # The worker was killed, so a new one answers the next call
+            second = hooks.get_requires_for_build_wheel({})
+        assert first != second
+
+
+def test_worker_pool_wait_is_not_timeout():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with HookWorkerPool(max_workers=1) as pool, ThreadPoolExecutor() as executor:
+            busy = get_hooks("pkg-process", worker_pool=pool)
+            hooks = get_hooks("pkg-process", worker_pool=pool, timeout=1)
+            # The only worker is busy for longer than the timeout
+            fut = executor.submit(busy.get_requires_for_build_wheel, {"spin": 2})
+            time.sleep(0.3)
+            with pytest.raises(CalledProcessError) as exc:
+                hooks.get_requires_for_build_wheel({"crash": True})
+            assert exc.value.returncode == 3
+            fut.result()
+
+
+@needs_fork
+def test_fork_server_timeout():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        with HookForkServer() as fork_server:
+            hooks = get_forked_hooks("pkg-process", fork_server, timeout=1)
+            with pytest.raises(HookTimeout):
+                hooks.get_requires_for_build_wheel({"hang": pjoin(td, "pid")})
+            (zygote,) = fork_server._zygotes.values()
+            assert zygote.alive
+            hooks.get_requires_for_build_wheel({})
+
+
+@pytest.mark.skipif(os.name == "nt", reason="No resource limits on Windows")
+def test_worker_resource_limits():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        with get_hooks("pkg-process") as hooks:
+            first = hooks.get_requires_for_build_wheel({})
+            with hooks.limit_resources(open_files=64):
+                with pytest.raises(ResourceLimitExceeded):
+                    hooks.get_requires_for_build_wheel({"open_files": 100})
+            # The same worker carries on, without the limit
+            second = hooks.get_requires_for_build_wheel({"open_files": 100})
+        assert first == second
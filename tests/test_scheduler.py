@@ -0,0 +1,115 @@
+import os
+import threading
+from os.path import join as pjoin
+from subprocess import CalledProcessError
+
+import pytest
+from testpath import assert_isfile, modified_env
+from testpath.tempdir import TemporaryDirectory
+
+from pyproject_hooks import (
+    HookWorkerPool,
+    ProjectSpec,
+    build_projects,
+    quiet_subprocess_runner,
+)
+from tests.helpers import BUILDSYS_PKGS, SAMPLES_DIR
+
+
+@pytest.fixture(autouse=True)
+def buildsys_path():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        yield
+
+
+def test_build_projects():
+    projects = [
+        (pjoin(SAMPLES_DIR, "pkg2"), "buildsys_minimal", None),
+        ProjectSpec(pjoin(SAMPLES_DIR, "pkg3"), "buildsys_minimal_editable"),
+    ]
+    finished = []
+    with TemporaryDirectory() as wheeldir:
+        results = build_projects(
+            projects, wheeldir, max_workers=2, on_result=finished.append
+        )
+        for result in results:
+            assert result.ok
+            assert result.requires == []
+            assert_isfile(result.wheel)
+            assert list(result.durations) == [
+                "get_requires_for_build_wheel",
+                "prepare_metadata_for_build_wheel",
+                "build_wheel",
+            ]
+
+    assert [r.project.source_dir for r in results] == [
+        pjoin(SAMPLES_DIR, "pkg2"),
+        pjoin(SAMPLES_DIR, "pkg3"),
+    ]
+    assert sorted(finished, key=results.index) == results
+
+
+def test_failure_does_not_stop_others():
+    projects = [
+        ProjectSpec(
+            pjoin(SAMPLES_DIR, "pkg-process"),
+            "buildsys_process",
+            config_settings={"crash": True},
+        ),
+        ProjectSpec(pjoin(SAMPLES_DIR, "pkg2"), "buildsys_minimal"),
+        ProjectSpec(pjoin(SAMPLES_DIR, "pkg2"), "buildsys_minimal", ["/outside"]),
+    ]
+    with TemporaryDirectory() as wheeldir:
+        crashed, ok, invalid = build_projects(projects, wheeldir)
+        assert_isfile(ok.wheel)
+
+    assert isinstance(crashed.error, CalledProcessError)
+    assert crashed.failed_hook == "get_requires_for_build_wheel"
+    assert crashed.wheel is None
+
+    assert isinstance(invalid.error, ValueError)
+    assert invalid.failed_hook is None
+
+
+def test_on_requires_failure():
+    def on_requires(project, requires):
+        raise RuntimeError("Can't install")
+
+    projects = [(pjoin(SAMPLES_DIR, "pkg2"), "buildsys_minimal", None)]
+    with TemporaryDirectory() as wheeldir:
+        (result,) = build_projects(projects, wheeldir, on_requires=on_requires)
+
+    assert isinstance(result.error, RuntimeError)
+    assert result.failed_hook is None
+    assert result.requires == []
+    assert result.dist_info is None
+
+
+def test_metadata_directory_and_caller_kwargs():
+    runner_threads = set()
+
+    def runner(cmd, cwd=None, extra_environ=None):
+        runner_threads.add(threading.get_ident())
+        quiet_subprocess_runner(cmd, cwd, extra_environ)
+
+    projects = [(pjoin(SAMPLES_DIR, "pkg2"), "buildsys_minimal", None)] * 3
+    with TemporaryDirectory() as wheeldir, TemporaryDirectory() as metadatadir:
+        results = build_projects(
+            projects, wheeldir, metadatadir, max_workers=1, runner=runner
+        )
+        assert [r.dist_info for r in results] == [
+            pjoin(metadatadir, str(i), "pkg2-0.5.dist-info") for i in range(3)
+        ]
+        for result in results:
+            assert_isfile(pjoin(result.dist_info, "METADATA"))
+
+    # One thread for metadata, and one for building wheels
+    assert len(runner_threads) == 2
+
+
+def test_worker_pool():
+    projects = [(pjoin(SAMPLES_DIR, "pkg2"), "buildsys_minimal", None)] * 2
+    with TemporaryDirectory() as wheeldir, HookWorkerPool() as pool:
+        results = build_projects(projects, wheeldir, worker_pool=pool)
+        assert all(r.ok for r in results)
+        assert os.listdir(wheeldir) == ["pkg2-0.5-py2.py3-none-any.whl"]
@@ -0,0 +1,185 @@
+import json
+import os
+from os.path import join as pjoin
+
+import pytest
+from testpath import modified_env
+from testpath.tempdir import TemporaryDirectory
+
+from pyproject_hooks import ChromeTraceExporter, HookMissing, RequiresCache
+from tests.helpers import BUILDSYS_PKGS, SAMPLES_DIR, get_hooks
+
+
+def names(span):
+    return [child.name for child in span.children]
+
+
+def assert_nested(span):
+    for child in span.children:
+        assert child.start >= span.start - 0.001
+        assert child.start + child.duration <= span.start + span.duration + 0.001
+        assert_nested(child)
+
+
+def test_metadata_fallback_spans():
+    spans = []
+    hooks = get_hooks("pkg2", trace_exporter=spans.append)
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        hooks.prepare_metadata_for_build_wheel(td, {})
+
+    (span,) = spans
+    assert span.name == "prepare_metadata_for_build_wheel"
+    assert span.attributes == {
+        "build_backend": "buildsys_minimal",
+        "source_dir": pjoin(SAMPLES_DIR, "pkg2"),
+        "outcome": "ok",
+    }
+    assert names(span) == ["subprocess"]
+    (hook_span,) = span.children[0].children
+    assert hook_span.name == "prepare_metadata_for_build_wheel"
+    assert names(hook_span) == [
+        "import_backend",
+        "build_wheel",
+        "_get_wheel_metadata_from_wheel",
+    ]
+    assert hook_span.children[1].attributes == {"fallback": True}
+    assert_nested(span)
+    assert span.duration > hook_span.duration > 0
+
+
+def test_wheel_handoff_span():
+    spans = []
+    hooks = get_hooks("pkg2", trace_exporter=spans.append)
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        metadata_dir = pjoin(td, "metadata")
+        os.mkdir(metadata_dir)
+        distinfo = hooks.prepare_metadata_for_build_wheel(metadata_dir, {})
+        hooks.build_wheel(td, {}, pjoin(metadata_dir, distinfo))
+
+    # The wheel from the fallback is reused without importing the backend
+    (hook_span,) = spans[1].children[0].children
+    assert names(hook_span) == ["_hand_over_prebuilt_wheel"]
+
+
+def test_error_outcome():
+    spans = []
+    hooks = get_hooks("pkg2", trace_exporter=spans.append)
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        with pytest.raises(HookMissing):
+            hooks.prepare_metadata_for_build_wheel(td, {}, _allow_fallback=False)
+
+    (span,) = spans
+    assert span.attributes["outcome"] == "HookMissing"
+    (hook_span,) = span.children[0].children
+    assert hook_span.attributes == {"error": "HookMissing"}
+
+
+def test_cached_outcome():
+    spans = []
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        hooks = get_hooks(
+            "pkg1", requires_cache=RequiresCache(td), trace_exporter=spans.append
+        )
+        hooks.get_requires_for_build_wheel({})
+        hooks.get_requires_for_build_wheel({})
+
+    assert [s.attributes["outcome"] for s in spans] == ["ok", "cached"]
+    assert names(spans[1]) == []
+
+
+def test_call_hooks_span():
+    spans = []
+    hooks = get_hooks("pkg1", trace_exporter=spans.append)
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}):
+        hooks.call_hooks(
+            [("get_requires_for_build_wheel", {}), ("get_requires_for_build_sdist", {})]
+        )
+
+    (span,) = spans
+    assert span.name == "call_hooks"
+    assert names(span) == ["subprocess"]
+    assert names(span.children[0]) == [
+        "get_requires_for_build_wheel",
+        "get_requires_for_build_sdist",
+    ]
+    assert_nested(span)
+
+
+def test_worker_spans():
+    spans = []
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), get_hooks(
+        "pkg1", persistent_worker=True, trace_exporter=spans.append
+    ) as hooks:
+        hooks.get_requires_for_build_wheel({})
+        hooks.get_requires_for_build_sdist({})
+
+    assert [names(s) for s in spans] == [["worker"], ["worker"]]
+    # The backend is imported before the first call, so it's not in a span
+    assert names(spans[1].children[0]) == ["get_requires_for_build_sdist"]
+
+
+def read_text(path):
+    with open(path) as f:
+        return f.read()
+
+
+def read_trace(path):
+    # Trace viewers accept a JSON array without the closing bracket
+    return json.loads(read_text(path).rstrip().rstrip(",") + "]")
+
+
+def test_chrome_trace_exporter():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        trace_file = pjoin(td, "trace.json")
+        hooks = get_hooks("pkg1", trace_exporter=ChromeTraceExporter(trace_file))
+        hooks.get_requires_for_build_wheel({})
+        first = read_trace(trace_file)
+        hooks.get_requires_for_build_sdist({})
+        events = read_trace(trace_file)
+
+    assert events[: len(first)] == first
+    assert [e["name"] for e in events] == [
+        "get_requires_for_build_wheel",
+        "subprocess",
+        "get_requires_for_build_wheel",
+        "import_backend",
+        "get_requires_for_build_sdist",
+        "subprocess",
+        "get_requires_for_build_sdist",
+        "import_backend",
+    ]
+    for event in events:
+        assert event["ph"] == "X"
+        assert event["dur"] >= 0
+        assert event["pid"] == events[0]["pid"]
+        assert event["tid"] == events[0]["tid"]
+    assert events[0]["args"]["outcome"] == "ok"
+    # Timestamps are in microseconds
+    assert events[1]["ts"] >= events[0]["ts"]
+    assert events[0]["dur"] > 1000
+
+
+def test_chrome_trace_exporter_appends():
+    with modified_env({"PYTHONPATH": BUILDSYS_PKGS}), TemporaryDirectory() as td:
+        trace_file = pjoin(td, "trace.json")
+        with open(trace_file, "w") as f:
+            f.write("old trace")
+        hooks = get_hooks("pkg1", trace_exporter=ChromeTraceExporter(trace_file))
+        # An old file is only replaced once there's a hook call to trace
+        assert read_text(trace_file) == "old trace"
+        hooks.get_requires_for_build_wheel({})
+        first = read_text(trace_file)
+        inode = os.stat(trace_file).st_ino
+        first_lines = first.splitlines()
+        # The start of the array, then one event per line
+        assert first_lines[0] == "["
+        assert len(first_lines) == 1 + len(read_trace(trace_file))
+
+        hooks.get_requires_for_build_sdist({})
+        second = read_text(trace_file)
+        # The second call's events are added to the same file, after the first's
+        assert os.stat(trace_file).st_ino == inode
+        assert second.startswith(first)
+        second_lines = second.splitlines()
+        assert len(second_lines) == len(first_lines) * 2 - 1
+        assert len(second_lines) == 1 + len(read_trace(trace_file))